@@ -1,6 +1,233 @@
-"""Generate heatmaps from demand or coverage metrics."""
+"""Generate heatmaps from demand or coverage metrics.
 
+A Heatmap holds weighted demand points (and optionally the stops, for the
+coverage layers) and renders Web-Mercator z/x/y tiles on demand: points
+falling in the tile plus a kernel margin are binned with a NumPy 2D
+histogram and smoothed with a Gaussian of fixed ground bandwidth, giving a
+kernel density in weight per km². Densities are scaled by one per-heatmap
+maximum, so neighbouring tiles and zoom levels share the same color scale.
 
-def make_heatmap(points, values):
-    """Return a placeholder heatmap object."""
-    return {"points": points, "values": values}
+Layers: "demand" (all weight), "served" / "unserved" (weight within /
+beyond walk_m of the nearest stop).
+"""
+import math
+import struct
+import zlib
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.clustering.stop_index import M_PER_DEG
+
+TILE_SIZE = 256
+# Deeper zooms are upscaled by the map client (Leaflet maxNativeZoom)
+MAX_ZOOM = 16
+# Kernel bandwidth (Gaussian sigma) in meters
+DEFAULT_BANDWIDTH_M = 250.0
+# Kernel resolution: grid cells per sigma when the kernel is wider than that
+KERNEL_CELLS = 4
+# Zoom of the grid used to find the density maximum for color scaling
+REFERENCE_ZOOM = 13
+# Cap on the cells of that grid (very large extents get coarser cells)
+VMAX_MAX_CELLS = 4_000_000
+# Web-Mercator meters per pixel at the equator, zoom 0
+M_PER_PX_Z0 = 2 * math.pi * 6378137.0 / TILE_SIZE
+
+LAYERS = ("demand", "served", "unserved")
+
+
+def lnglat_to_pixels(lng, lat, z: int):
+    """Global Web-Mercator pixel coordinates at zoom z."""
+    scale = TILE_SIZE * (1 << z)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878)
+    px = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * scale
+    py = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0 * scale
+    return px, py
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """(west, south, east, north) of a tile in degrees."""
+    n = 1 << z
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def density_grid(px, py, weights, origin, shape, m_per_px: float, bandwidth_m: float,
+                 upsample: bool = True, max_cells: int = None):
+    """
+    Kernel density (weight per km²) on a pixel grid.
+
+    px, py: point pixel coordinates; origin: (x0, y0) pixel of the grid's
+    top-left corner; shape: (rows, cols). Wide kernels (deep zooms) are
+    evaluated on a coarser grid with about KERNEL_CELLS cells per sigma and
+    upsampled bilinearly, which is visually identical and far cheaper.
+    upsample=False returns that coarse grid (same maximum, a fraction of
+    the memory); max_cells coarsens it further so it holds at most about
+    that many cells.
+    """
+    from scipy.ndimage import gaussian_filter, map_coordinates
+
+    rows, cols = shape
+    step = max(1, int(bandwidth_m / m_per_px / KERNEL_CELLS))
+    if max_cells:
+        step = max(step, math.ceil(math.sqrt(rows * cols / max_cells)))
+    sigma = bandwidth_m / (m_per_px * step)
+    pad = int(math.ceil(3 * sigma)) if sigma >= 0.5 else 0
+    crows, ccols = -(-rows // step), -(-cols // step)
+    gx, gy = (px - origin[0]) / step, (py - origin[1]) / step
+    sel = (gx >= -pad) & (gx < ccols + pad) & (gy >= -pad) & (gy < crows + pad)
+    if not sel.any():
+        return np.zeros(shape if upsample else (crows, ccols))
+
+    hist, _, _ = np.histogram2d(
+        gy[sel], gx[sel],
+        bins=(crows + 2 * pad, ccols + 2 * pad),
+        range=((-pad, crows + pad), (-pad, ccols + pad)),
+        weights=weights[sel],
+    )
+    if pad:
+        hist = gaussian_filter(hist, sigma, mode="constant")
+    grid = hist[pad:pad + crows, pad:pad + ccols] / (m_per_px * step / 1000.0) ** 2
+    if step == 1 or not upsample:
+        return grid
+    # Coarse cell centers sit at (i + 0.5) * step fine pixels
+    fine_y = (np.arange(rows) + 0.5) / step - 0.5
+    fine_x = (np.arange(cols) + 0.5) / step - 0.5
+    yy, xx = np.meshgrid(fine_y, fine_x, indexing="ij")
+    return np.maximum(map_coordinates(grid, [yy, xx], order=1, mode="nearest"), 0.0)
+
+
+def colorize(levels) -> np.ndarray:
+    """(256, 4) RGBA palette: transparent → blue → lime → red."""
+    t = np.linspace(0.0, 1.0, levels)
+    stops = np.array([0.0, 0.4, 0.65, 1.0])
+    colors = np.array([[0, 0, 255], [0, 0, 255], [0, 255, 0], [255, 0, 0]], dtype=np.float64)
+    rgb = np.column_stack([np.interp(t, stops, colors[:, c]) for c in range(3)])
+    alpha = np.clip(t / 0.4, 0.0, 1.0) * 200
+    return np.column_stack([rgb, alpha]).round().astype(np.uint8)
+
+
+PALETTE = colorize(256)
+
+
+def encode_png(levels: np.ndarray, palette: np.ndarray = PALETTE) -> bytes:
+    """Indexed-color PNG of a 2D uint8 array (stdlib only)."""
+    h, w = levels.shape
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    # Filter type 0 (None) in front of every row
+    raw = np.hstack([np.zeros((h, 1), dtype=np.uint8), levels.astype(np.uint8)]).tobytes()
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 3, 0, 0, 0)),
+        chunk(b"PLTE", palette[:, :3].tobytes()),
+        chunk(b"tRNS", palette[:, 3].tobytes()),
+        chunk(b"IDAT", zlib.compress(raw, 6)),
+        chunk(b"IEND", b""),
+    ])
+
+
+@dataclass
+class Heatmap:
+    lat: np.ndarray
+    lng: np.ndarray
+    weight: np.ndarray
+    stop_lat: np.ndarray = field(default_factory=lambda: np.empty(0))
+    stop_lng: np.ndarray = field(default_factory=lambda: np.empty(0))
+    bandwidth_m: float = DEFAULT_BANDWIDTH_M
+    _vmax: float = None
+    _stop_tree: object = None
+
+    def arrays(self) -> dict:
+        return {
+            "lat": self.lat, "lng": self.lng, "weight": self.weight,
+            "stop_lat": self.stop_lat, "stop_lng": self.stop_lng,
+            "bandwidth_m": np.float64(self.bandwidth_m),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "Heatmap":
+        return cls(
+            arrays["lat"], arrays["lng"], arrays["weight"],
+            arrays["stop_lat"], arrays["stop_lng"], float(arrays["bandwidth_m"]),
+        )
+
+    @property
+    def vmax(self) -> float:
+        """Peak demand density (weight per km²) at REFERENCE_ZOOM, the top of the color scale."""
+        if self._vmax is None:
+            px, py = lnglat_to_pixels(self.lng, self.lat, REFERENCE_ZOOM)
+            if len(px) == 0:
+                self._vmax = 1.0
+            else:
+                x0, y0 = math.floor(px.min()), math.floor(py.min())
+                shape = (int(py.max() - y0) + 1, int(px.max() - x0) + 1)
+                # The bilinear upsample never exceeds the coarse grid's peak
+                grid = density_grid(
+                    px, py, self.weight, (x0, y0), shape, self._m_per_px(REFERENCE_ZOOM), self.bandwidth_m,
+                    upsample=False, max_cells=VMAX_MAX_CELLS,
+                )
+                self._vmax = float(grid.max()) or 1.0
+        return self._vmax
+
+    def _m_per_px(self, z: int) -> float:
+        lat0 = float(np.mean(self.lat)) if len(self.lat) else 0.0
+        return M_PER_PX_Z0 * math.cos(math.radians(lat0)) / (1 << z)
+
+    def layer_weights(self, layer: str, walk_m: float = 500.0) -> np.ndarray:
+        if layer == "demand" or len(self.stop_lat) == 0:
+            return self.weight if layer != "served" else np.zeros_like(self.weight)
+        if layer not in LAYERS:
+            raise ValueError(f"unknown heatmap layer: {layer!r}")
+
+        # Equirectangular meters about the stops' mean latitude
+        cos0 = math.cos(math.radians(float(np.mean(self.stop_lat))))
+        if self._stop_tree is None:
+            from scipy.spatial import cKDTree
+
+            self._stop_tree = cKDTree(np.column_stack([self.stop_lng * cos0, self.stop_lat]) * M_PER_DEG)
+        dist, _ = self._stop_tree.query(np.column_stack([self.lng * cos0, self.lat]) * M_PER_DEG, k=1)
+        served = dist <= walk_m
+        return np.where(served if layer == "served" else ~served, self.weight, 0.0)
+
+    def tile(self, layer: str, z: int, x: int, y: int, walk_m: float = 500.0) -> np.ndarray:
+        """Quantized (TILE_SIZE, TILE_SIZE) uint8 density tile; 0 = no demand."""
+        if not 0 <= z <= MAX_ZOOM or not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValueError(f"tile {z}/{x}/{y} out of range (max zoom {MAX_ZOOM})")
+        px, py = lnglat_to_pixels(self.lng, self.lat, z)
+        grid = density_grid(
+            px, py, self.layer_weights(layer, walk_m),
+            (x * TILE_SIZE, y * TILE_SIZE), (TILE_SIZE, TILE_SIZE),
+            self._m_per_px(z), self.bandwidth_m,
+        )
+        return np.clip(np.round(grid / self.vmax * 255), 0, 255).astype(np.uint8)
+
+
+def make_heatmap(points, values=None, stops=None, bandwidth_m: float = DEFAULT_BANDWIDTH_M) -> Heatmap:
+    """
+    Heatmap of weighted points.
+
+    points: DEMAND_DTYPE array (weights taken from it) or [(lat, lng), ...]
+    with `values` as weights (default 1); stops: [{"lat", "lng"}, ...] for
+    the served / unserved layers.
+    """
+    if isinstance(points, np.ndarray) and points.dtype.names:
+        lat, lng, weight = points["lat"], points["lng"], points["weight"]
+    else:
+        arr = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        lat, lng = arr[:, 0], arr[:, 1]
+        weight = np.ones(len(arr)) if values is None else np.asarray(values, dtype=np.float64)
+    stops = stops or []
+    return Heatmap(
+        np.ascontiguousarray(lat, dtype=np.float64),
+        np.ascontiguousarray(lng, dtype=np.float64),
+        np.ascontiguousarray(weight, dtype=np.float64),
+        np.array([float(s["lat"]) for s in stops]),
+        np.array([float(s["lng"]) for s in stops]),
+        float(bandwidth_m),
+    )
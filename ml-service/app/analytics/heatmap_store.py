@@ -0,0 +1,205 @@
+"""On-disk store of heatmap sources and their rendered tiles.
+
+Layout under Config.heatmap_dir:
+
+    {heatmap_id}/source.npz                      demand points + stops
+    {heatmap_id}/{layer}[-{walk_m}]/{z}/{x}/{y}.{png|bin}
+
+Tiles are rendered on first request and then served from disk; ".bin" is
+the raw quantized uint8 array (TILE_SIZE² bytes). Replacing a source drops
+its rendered tiles. Heatmaps are evicted whole, least recently used first
+(source.npz mtime), once the directory exceeds its byte budget. Sizes are
+tracked per heatmap as sources and tiles are written, so the budget is
+checked on every write without walking the tree; the directory is rescanned
+at startup and every RESCAN_EVERY tile writes to pick up other workers'
+writes. Loaded sources are also kept in a small LRU.
+"""
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from app.analytics.heatmap_generator import LAYERS, Heatmap, encode_png
+from app.core.config import get_config
+from app.core.logging import get_logger
+
+logger = get_logger("analytics.heatmap_store")
+
+FORMATS = ("png", "bin")
+# Tile writes between rescans of the directory
+RESCAN_EVERY = 256
+
+
+def _dir_size(directory: Path) -> int:
+    total = 0
+    for path in directory.rglob("*"):
+        try:
+            if path.is_file():
+                total += path.stat().st_size
+        except FileNotFoundError:  # removed by another worker
+            pass
+    return total
+
+
+class HeatmapStore:
+    def __init__(self, root, max_bytes: int = 128 * 1024 * 1024, memory_items: int = 8):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.memory_items = int(memory_items)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._tile_writes = 0
+        self._sizes = None  # heatmap id -> bytes on disk, from _rescan()
+
+    def _dir(self, heatmap_id: str) -> Path:
+        if not heatmap_id.isalnum():
+            raise ValueError(f"invalid heatmap id: {heatmap_id!r}")
+        return self.root / heatmap_id
+
+    def _remember(self, heatmap_id, heatmap):
+        with self._lock:
+            self._memory[heatmap_id] = heatmap
+            self._memory.move_to_end(heatmap_id)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def exists(self, heatmap_id: str) -> bool:
+        return heatmap_id in self._memory or (self._dir(heatmap_id) / "source.npz").exists()
+
+    def put(self, heatmap_id: str, heatmap: Heatmap) -> bool:
+        """Persist a heatmap source; False if the store directory is unusable."""
+        self._remember(heatmap_id, heatmap)
+        directory = self._dir(heatmap_id)
+        tmp = directory / f"source.{os.getpid()}.{threading.get_ident()}.npz"
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            np.savez(tmp, **heatmap.arrays())
+            os.replace(tmp, directory / "source.npz")
+            # Tiles rendered from the previous source are stale now
+            for child in directory.iterdir():
+                if child.is_dir():
+                    shutil.rmtree(child, ignore_errors=True)
+            self._track(heatmap_id, (directory / "source.npz").stat().st_size, replace=True)
+        except OSError as e:
+            logger.warning("Heatmap %s not stored: %s", heatmap_id, e)
+            tmp.unlink(missing_ok=True)
+            return False
+        return True
+
+    def get(self, heatmap_id: str):
+        with self._lock:
+            if heatmap_id in self._memory:
+                self._memory.move_to_end(heatmap_id)
+                return self._memory[heatmap_id]
+        path = self._dir(heatmap_id) / "source.npz"
+        try:
+            with np.load(path) as npz:
+                heatmap = Heatmap.from_arrays(dict(npz))
+            os.utime(path)  # mtime doubles as last-used time for eviction
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Heatmap %s unreadable, dropping: %s", heatmap_id, e)
+            self._drop(heatmap_id)
+            return None
+        self._remember(heatmap_id, heatmap)
+        return heatmap
+
+    def tile(self, heatmap_id: str, layer: str, z: int, x: int, y: int, fmt: str = "png", walk_m: float = 500.0):
+        """Encoded tile bytes (cached on disk), or None for an unknown heatmap."""
+        if layer not in LAYERS:
+            raise ValueError(f"unknown heatmap layer: {layer!r}")
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown tile format: {fmt!r}")
+        if not (math.isfinite(walk_m) and walk_m > 0):
+            raise ValueError(f"walk_m must be a finite positive number, got {walk_m!r}")
+        layer_dir = layer if layer == "demand" else f"{layer}-{int(round(walk_m))}"
+        path = self._dir(heatmap_id) / layer_dir / str(z) / str(x) / f"{y}.{fmt}"
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            pass
+
+        heatmap = self.get(heatmap_id)
+        if heatmap is None:
+            return None
+        levels = heatmap.tile(layer, z, x, y, walk_m)
+        data = encode_png(levels) if fmt == "png" else levels.tobytes()
+
+        tmp = path.with_name(f"{y}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._tile_writes += 1
+            if self._tile_writes % RESCAN_EVERY == 0:
+                self._sizes = None
+            self._track(heatmap_id, len(data))
+        except OSError as e:
+            logger.warning("Heatmap tile %s not cached: %s", path, e)
+            tmp.unlink(missing_ok=True)
+        return data
+
+    def _rescan(self) -> dict:
+        sizes = {}
+        if not self.root.is_dir():
+            return sizes
+        for directory in self.root.iterdir():
+            if directory.is_dir():
+                sizes[directory.name] = _dir_size(directory)
+        return sizes
+
+    def _track(self, heatmap_id: str, nbytes: int, replace: bool = False):
+        """Record nbytes just written for heatmap_id (replace: its new total), then enforce the budget."""
+        if self._sizes is None:
+            sizes = self._rescan()  # already counts this write
+            with self._lock:
+                self._sizes = sizes
+                over = sum(sizes.values()) > self.max_bytes
+        else:
+            with self._lock:
+                self._sizes[heatmap_id] = nbytes if replace else self._sizes.get(heatmap_id, 0) + nbytes
+                over = sum(self._sizes.values()) > self.max_bytes
+        if over:
+            self._evict()
+
+    def _drop(self, heatmap_id: str):
+        shutil.rmtree(self.root / heatmap_id, ignore_errors=True)
+        with self._lock:
+            self._memory.pop(heatmap_id, None)
+            if self._sizes is not None:
+                self._sizes.pop(heatmap_id, None)
+
+    def _evict(self):
+        with self._lock:
+            sizes = dict(self._sizes or {})
+        entries = []
+        for heatmap_id, size in sizes.items():
+            try:
+                mtime = (self.root / heatmap_id / "source.npz").stat().st_mtime
+            except FileNotFoundError:  # removed, or still being written, by another worker
+                continue
+            entries.append((mtime, size, heatmap_id))
+        total = sum(size for _, size, _ in entries)
+        # The newest heatmap is always kept, even if alone over budget
+        for _, size, heatmap_id in sorted(entries)[:-1]:
+            if total <= self.max_bytes:
+                break
+            self._drop(heatmap_id)
+            total -= size
+
+
+_heatmap_store = None
+
+
+def get_heatmap_store() -> HeatmapStore:
+    """Process-wide heatmap store configured from Config."""
+    global _heatmap_store
+    if _heatmap_store is None:
+        cfg = get_config()
+        _heatmap_store = HeatmapStore(cfg.heatmap_dir, cfg.heatmap_cache_max_bytes)
+    return _heatmap_store
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 
 # CO₂ emissions saved vs car travel (kg CO₂ per passenger-km)
 # Average car: ~0.171 kg CO₂/km. Bus: ~0.089 kg CO₂/pkm. Saving ≈ 0.082 per shift.
@@ -12,10 +14,14 @@ AVG_OCCUPANCY_RATE = 0.55
 AVG_TRIP_DISTANCE_KM = 4.5
 
 
-def compute_metrics(routes, parameters=None):
+def compute_metrics(routes, parameters=None, coverage=None):
     """
     Multi-factor analytics engine using transport planning models.
 
+    coverage: {"stop", "corridor"} polygon fractions from
+    coverage_analyzer.network_coverage; without it coverage is estimated
+    from route length and stop count.
+
     Metrics:
     - coverage: computed from stop walkability radii vs polygon area
     - ridership: frequency-adjusted, peak/off-peak split, density-scaled
@@ -23,12 +29,48 @@ def compute_metrics(routes, parameters=None):
     - avg_wait: harmonic mean of per-route wait times weighted by demand
     - los_score: Level of Service composite index (0-100)
     """
-    if not parameters:
-        parameters = {}
-
     if not routes:
         return {"coverage": 0, "estimated_ridership": 0, "co2_saved_kg_day": 0, "avg_wait_time": 0, "los_score": 0}
 
+    m = network_metrics(
+        distance_km=[r["distance_km"] for r in routes],
+        stop_counts=[r["stops"] for r in routes],
+        demand_scores=[r.get("demand_score", 1) for r in routes],
+        frequency_min=[[r["frequency_min"] for r in routes]],
+        wait_min=[[r["avg_wait_time_min"] for r in routes]],
+        buses=[[r["buses_assigned"] for r in routes]],
+        parameters=parameters,
+        coverage=coverage,
+    )
+    out = {
+        "coverage": float(m["coverage"]),
+        "estimated_ridership": int(m["estimated_ridership"][0]),
+        "co2_saved_kg_day": float(m["co2_saved_kg_day"][0]),
+        "avg_wait_time": float(m["avg_wait_time"][0]),
+        "los_score": float(m["los_score"][0]),
+        "total_routes": len(routes),
+        "total_buses": int(m["total_buses"][0]),
+        "avg_frequency_min": float(m["avg_frequency_min"][0]),
+        "network_km": float(m["network_km"]),
+    }
+    if coverage is not None:
+        out["corridor_coverage"] = round(coverage["corridor"], 2)
+    return out
+
+
+def network_metrics(distance_km, stop_counts, demand_scores, frequency_min, wait_min, buses, parameters=None,
+                    coverage=None):
+    """
+    The compute_metrics formulas vectorized over S scenarios of one network.
+
+    distance_km, stop_counts, demand_scores: (R,) per route (fixed by the
+    network); frequency_min, wait_min, buses: (S, R) per scenario;
+    coverage: optional measured {"stop", "corridor"} fractions.
+    Returns scalars for coverage and network_km, (S,) arrays for the rest.
+    """
+    if not parameters:
+        parameters = {}
+
     max_walk_m = float(parameters.get("max_walk_distance_m", 500))
     pop_density = parameters.get("population_density", "urban")
     c_weight = float(parameters.get("commercial_weight", 1.5))
@@ -43,52 +85,55 @@ def compute_metrics(routes, parameters=None):
     land_use_score = (c_weight * 0.4 + r_weight * 0.35 + s_weight * 0.25) / 1.5
 
     # ── Total route distances ──
-    total_dist_km = sum(r["distance_km"] for r in routes)
-    total_stops = sum(r["stops"] for r in routes)
+    total_dist_km = float(np.sum(distance_km))
+    total_stops = float(np.sum(stop_counts))
 
     # ── Coverage: walkability-based ──
     # Each stop covers a circle of radius max_walk_m
-    # Coverage = min(1, total_stop_area / estimated_service_area)
-    # Estimate service area from total route length (buffer model)
-    walk_radius_km = max_walk_m / 1000.0
-    covered_area_km2 = total_stops * math.pi * walk_radius_km**2
-    service_area_km2 = total_dist_km * (2 * walk_radius_km)  # corridor buffer
-    if service_area_km2 > 0:
-        raw_coverage = covered_area_km2 / service_area_km2
+    if coverage is not None:
+        # Measured share of the service polygon within walking distance of a stop
+        coverage = round(coverage["stop"], 2)
     else:
-        raw_coverage = 0.5
-    coverage = round(min(0.98, 0.35 + raw_coverage * 0.6), 2)
+        # Coverage = min(1, total_stop_area / estimated_service_area)
+        # Estimate service area from total route length (buffer model)
+        walk_radius_km = max_walk_m / 1000.0
+        covered_area_km2 = total_stops * math.pi * walk_radius_km**2
+        service_area_km2 = total_dist_km * (2 * walk_radius_km)  # corridor buffer
+        if service_area_km2 > 0:
+            raw_coverage = covered_area_km2 / service_area_km2
+        else:
+            raw_coverage = 0.5
+        coverage = round(min(0.98, 0.35 + raw_coverage * 0.6), 2)
 
     # ── Daily ridership: frequency-adjusted, peak/off-peak model ──
     # Higher frequency → more spontaneous riders → +30% pickup
-    avg_frequency = sum(r["frequency_min"] for r in routes) / len(routes)
-    frequency_bonus = max(0.5, 1.3 - (avg_frequency / 60))  # better frequency = more riders
+    avg_frequency = np.asarray(frequency_min, dtype=np.float64).mean(axis=1)
+    frequency_bonus = np.maximum(0.5, 1.3 - (avg_frequency / 60))  # better frequency = more riders
 
     base_ridership_per_km = 90  # riders/km/day in standard urban conditions
-    estimated_ridership = int(
+    estimated_ridership = np.trunc(
         total_dist_km * base_ridership_per_km * pop_mult * land_use_score * frequency_bonus
-    )
+    ).astype(np.int64)
 
     # ── CO₂ saved: modal shift model ──
     # Estimate daily passenger-km moved by the network
-    total_buses = sum(r["buses_assigned"] for r in routes)
+    total_buses = np.asarray(buses).sum(axis=1)
     daily_capacity = total_buses * AVG_OCCUPANCY_RATE * 2 * 12 * 50  # 2 directions * 12hrs * 50 cap
-    daily_passenger_km = min(estimated_ridership, daily_capacity) * AVG_TRIP_DISTANCE_KM
-    co2_saved = round(daily_passenger_km * CO2_SAVING_PER_PASSENGER_KM, 1)
+    daily_passenger_km = np.minimum(estimated_ridership, daily_capacity) * AVG_TRIP_DISTANCE_KM
+    co2_saved = np.round(daily_passenger_km * CO2_SAVING_PER_PASSENGER_KM, 1)
 
     # ── Average wait time (demand-weighted harmonic mean) ──
-    demand_scores = [r.get("demand_score", 1) for r in routes]
-    total_demand = sum(demand_scores) or 1
-    wait_times = [r["avg_wait_time_min"] for r in routes]
-    weighted_wait = sum(w * d for w, d in zip(wait_times, demand_scores)) / total_demand
-    avg_wait = round(weighted_wait, 1)
+    demand = np.asarray(demand_scores, dtype=np.float64)
+    total_demand = demand.sum() or 1
+    weighted_wait = (np.asarray(wait_min, dtype=np.float64) * demand).sum(axis=1) / total_demand
+    avg_wait = np.round(weighted_wait, 1)
 
     # ── Level of Service score (0–100 composite index) ──
     # Combines coverage, frequency, and wait time into a single score
-    freq_score = max(0, 100 - avg_frequency * 2)   # 0 min headway = 100, 50 min = 0
-    wait_score = max(0, 100 - avg_wait * 3)         # 0 min wait = 100, 33 min = 0
+    freq_score = np.maximum(0, 100 - avg_frequency * 2)   # 0 min headway = 100, 50 min = 0
+    wait_score = np.maximum(0, 100 - avg_wait * 3)         # 0 min wait = 100, 33 min = 0
     cov_score = coverage * 100
-    los_score = round((freq_score * 0.4 + wait_score * 0.35 + cov_score * 0.25), 1)
+    los_score = np.round((freq_score * 0.4 + wait_score * 0.35 + cov_score * 0.25), 1)
 
     return {
         "coverage": coverage,
@@ -96,8 +141,7 @@ def compute_metrics(routes, parameters=None):
         "co2_saved_kg_day": co2_saved,
         "avg_wait_time": avg_wait,
         "los_score": los_score,
-        "total_routes": len(routes),
         "total_buses": total_buses,
-        "avg_frequency_min": round(avg_frequency, 1),
-        "network_km": round(total_dist_km, 1)
-    }
\ No newline at end of file
+        "avg_frequency_min": np.round(avg_frequency, 1),
+        "network_km": round(total_dist_km, 1),
+    }
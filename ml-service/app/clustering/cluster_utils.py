@@ -1,8 +1,105 @@
-"""Clustering helper functions (stubs)."""
+"""Clustering helper functions.
+
+weighted_kmeans picks between exact KMeans and a streaming mini-batch mode.
+The mini-batch mode only ever touches `batch_size` rows at a time, drawn with
+a seeded RNG, so it works on memmapped inputs with millions of weighted cells
+and gives the same centers for the same input.
+"""
 from typing import List, Tuple
 
+import numpy as np
+
+from app.core.telemetry import span
+
+# Above this many points, "auto" switches to streaming mini-batch k-means
+MINIBATCH_THRESHOLD = 50_000
+
+MINIBATCH_SIZE = 8192
+MINIBATCH_MAX_STEPS = 300
+# Stop once no center moved more than this (degrees, ~0.1 m) for PATIENCE steps
+MINIBATCH_TOL_DEG = 1e-6
+MINIBATCH_PATIENCE = 10
+
+
+def choose_mode(n_points: int, mode: str = "auto") -> str:
+    if mode != "auto":
+        return mode
+    return "minibatch" if n_points > MINIBATCH_THRESHOLD else "kmeans"
+
+
+def _minibatch_centers(points, weights, k, random_state):
+    """Streaming weighted mini-batch k-means over random row batches."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    rng = np.random.default_rng(random_state)
+    n = len(points)
+    batch = max(MINIBATCH_SIZE, 3 * k)
+
+    model = MiniBatchKMeans(n_clusters=k, batch_size=batch, random_state=random_state, n_init=3)
+    prev = None
+    calm = 0
+    for _ in range(MINIBATCH_MAX_STEPS):
+        # Sorted indices keep reads from a memmap sequential
+        idx = np.sort(rng.integers(0, n, size=min(batch, n)))
+        with span("clustering.minibatch_step"):
+            model.partial_fit(np.asarray(points[idx], dtype=np.float64), sample_weight=np.asarray(weights[idx]))
+
+        centers = model.cluster_centers_
+        if prev is not None and np.abs(centers - prev).max() < MINIBATCH_TOL_DEG:
+            calm += 1
+            if calm >= MINIBATCH_PATIENCE:
+                break
+        else:
+            calm = 0
+        prev = centers.copy()
+    return model.cluster_centers_
+
+
+def weighted_kmeans(points, weights, k: int, mode: str = "auto", random_state: int = 42):
+    """
+    Weighted cluster centers, shape (k, 2).
+
+    mode: "kmeans" (exact, n_init=15), "minibatch" (streaming, memory-bounded)
+    or "auto" (minibatch above MINIBATCH_THRESHOLD points).
+    """
+    mode = choose_mode(len(points), mode)
+    if mode == "minibatch":
+        return _minibatch_centers(points, weights, k, random_state)
+    if mode != "kmeans":
+        raise ValueError(f"unknown clustering mode: {mode!r}")
+
+    from sklearn.cluster import KMeans
+
+    model = KMeans(n_clusters=k, n_init=15, random_state=random_state)
+    with span("clustering.kmeans_fit"):
+        model.fit(points, sample_weight=weights)
+    return model.cluster_centers_
+
+
+def center_weights(points, weights, centers, chunk: int = 65536):
+    """Total weight of the points nearest each center, shape (len(centers),); reads points in chunks."""
+    from sklearn.metrics import pairwise_distances_argmin
+
+    totals = np.zeros(len(centers))
+    for start in range(0, len(points), chunk):
+        labels = pairwise_distances_argmin(np.asarray(points[start:start + chunk], dtype=np.float64), centers)
+        totals += np.bincount(labels, weights=np.asarray(weights[start:start + chunk]), minlength=len(centers))
+    return totals
+
+
+def cluster_points(points: List[Tuple[float, float]], k: int = 8, weights=None, mode: str = "auto"):
+    """Cluster points into k groups; returns a list of point lists (empty groups dropped)."""
+    if not len(points):
+        return []
+    arr = np.asarray(points, dtype=np.float64)
+    w = np.ones(len(arr)) if weights is None else np.asarray(weights, dtype=np.float64)
+    k = max(1, min(k, len(arr)))
+
+    from sklearn.metrics import pairwise_distances_argmin
 
-def cluster_points(points: List[Tuple[float, float]], k: int = 8):
-    """Cluster points into k groups (placeholder)."""
-    # Real implementation could use sklearn or scipy
-    return [points]
+    centers = weighted_kmeans(arr, w, k, mode=mode)
+    labels = pairwise_distances_argmin(arr, centers)
+    groups = [[] for _ in range(k)]
+    for p, label in zip(points, labels):
+        groups[label].append(p)
+    return [g for g in groups if g]
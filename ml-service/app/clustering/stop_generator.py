@@ -1,25 +1,39 @@
-import math
 import numpy as np
-from sklearn.cluster import KMeans
+from numpy.lib.recfunctions import structured_to_unstructured
 
+from app.clustering.cluster_utils import center_weights, weighted_kmeans
+from app.clustering.stop_index import dedupe_stops
 
-def generate_bus_stops(points, area_km2=None, min_stop_distance_m=300):
+
+def demand_arrays(demand):
+    """Return (points (N, 2) as [lat, lng], weights (N,)) for any demand input.
+
+    Accepts a DEMAND_DTYPE structured array from simulate_demand or a plain
+    sequence of [lat, lng] points (uniform weights). Structured input is
+    returned as views, so memmapped demand is not copied into memory.
     """
-    Demand-weighted KMeans stop placement with minimum inter-stop distance filter.
+    if isinstance(demand, np.ndarray) and demand.dtype.names:
+        points = structured_to_unstructured(demand[["lat", "lng"]], copy=False)
+        return points, demand["weight"]
+    points = np.asarray(demand, dtype=np.float64).reshape(-1, 2)
+    return points, np.ones(len(points))
 
-    1. Run KMeans with sample_weight from demand (high-demand areas attract more stops)
-    2. Post-filter stops that are too close together (< min_stop_distance_m)
+
+def generate_bus_stops(demand, area_km2=None, min_stop_distance_m=300, mode="auto", merge_close=False):
     """
-    if not points:
-        return []
+    Demand-weighted KMeans stop placement with minimum inter-stop distance filter.
 
-    arr = np.array(points)  # shape: (N, 2) = [(lat, lng), ...]
+    1. Run KMeans with the demand weights as sample_weight (high-demand areas attract more stops)
+    2. Post-filter stops that are too close together (< min_stop_distance_m),
+       dropping them or, with merge_close, merging them into their neighbour
+       weighted by the demand each cluster holds
 
-    # Compute demand weight per point (gravity: closer to centroid = higher weight)
-    centroid = arr.mean(axis=0)
-    dists = np.linalg.norm(arr - centroid, axis=1)
-    max_d = dists.max() or 1.0
-    weights = np.exp(-2.5 * (dists / max_d))  # same gravity model as demand simulator
+    mode selects exact or streaming mini-batch clustering (see cluster_utils);
+    "auto" switches to mini-batch for large demand inputs.
+    """
+    arr, weights = demand_arrays(demand)  # shape: (N, 2) = [(lat, lng), ...]
+    if len(arr) == 0:
+        return []
 
     # Dynamic k from area
     if area_km2 and area_km2 > 0:
@@ -27,30 +41,11 @@ def generate_bus_stops(points, area_km2=None, min_stop_distance_m=300):
     else:
         k = 20
 
-    if len(points) < k:
-        k = max(2, len(points) // 2)
-
-    model = KMeans(n_clusters=k, n_init=15, random_state=42)
-    model.fit(arr, sample_weight=weights)
-
-    centers = model.cluster_centers_  # shape: (k, 2)
-
-    # --- Minimum distance deduplication ---
-    # Haversine-based filter: remove stops closer than min_stop_distance_m
-    R_m = 6371000.0  # Earth radius in meters
-    min_dist_deg = min_stop_distance_m / 111000.0  # rough degree equivalent
-
-    accepted = []
-    for c in centers:
-        lat, lng = float(c[0]), float(c[1])
-        too_close = False
-        for a in accepted:
-            dlat = lat - a["lat"]
-            dlng = (lng - a["lng"]) * math.cos(math.radians((lat + a["lat"]) / 2))
-            if math.sqrt(dlat**2 + dlng**2) < min_dist_deg:
-                too_close = True
-                break
-        if not too_close:
-            accepted.append({"id": len(accepted) + 1, "lat": lat, "lng": lng})
-
-    return accepted
\ No newline at end of file
+    if len(arr) < k:
+        k = max(2, len(arr) // 2)
+
+    centers = weighted_kmeans(arr, weights, k, mode=mode)  # shape: (k, 2)
+
+    # --- Minimum distance deduplication (grid-hash index, O(k)) ---
+    sizes = center_weights(arr, weights, centers) if merge_close else None
+    return dedupe_stops(centers, min_stop_distance_m, weights=sizes, merge=merge_close)
@@ -0,0 +1,144 @@
+"""Minimum-distance stop index backed by a uniform grid hash.
+
+Stops are projected to local meters (equirectangular about the first stop)
+and bucketed into square cells of side min_distance_m, so a proximity check
+only looks at the 3x3 neighbouring cells: O(1) per stop instead of a scan of
+every accepted stop.
+"""
+import math
+
+# Meters per degree of latitude on the mean Earth sphere
+M_PER_DEG = math.radians(1) * 6371000.0
+
+
+class StopIndex:
+    """Accepted stops with O(1) "is anything within min_distance_m?" queries.
+
+    add_stop() drops (merge=False) or merges (merge=True) a candidate that is
+    too close to an existing stop; the merged stop moves to the weighted mean
+    of both positions, and absorbs any stop that move brings within
+    min_distance_m in turn.
+    """
+
+    def __init__(self, min_distance_m: float = 300, stops=None):
+        self.min_distance_m = float(min_distance_m)
+        self.cell_m = max(self.min_distance_m, 1.0)
+        self.stops = []
+        self._xy = []
+        self._weights = []
+        self._cells = {}
+        self._origin = None
+        stops = [dict(s) for s in stops or []]
+        self._next_id = max((int(s["id"]) for s in stops if "id" in s), default=0) + 1
+        for s in stops:
+            if "id" not in s:  # numbered after the given ids
+                s["id"] = self._next_id
+                self._next_id += 1
+            self._insert(s, 1.0)
+
+    def _project(self, lat, lng):
+        if self._origin is None:
+            self._origin = (lat, lng, math.cos(math.radians(lat)))
+        lat0, lng0, cos0 = self._origin
+        return (lng - lng0) * cos0 * M_PER_DEG, (lat - lat0) * M_PER_DEG
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_m), math.floor(y / self.cell_m))
+
+    def _insert(self, stop, weight):
+        x, y = self._project(stop["lat"], stop["lng"])
+        i = len(self.stops)
+        self.stops.append(stop)
+        self._xy.append((x, y))
+        self._weights.append(weight)
+        self._cells.setdefault(self._cell(x, y), []).append(i)
+        return i
+
+    def _move(self, i, lat, lng):
+        stop = self.stops[i]
+        stop["lat"], stop["lng"] = lat, lng
+        self._cells[self._cell(*self._xy[i])].remove(i)
+        x, y = self._project(lat, lng)
+        self._xy[i] = (x, y)
+        self._cells.setdefault(self._cell(x, y), []).append(i)
+
+    def _remove(self, i):
+        del self.stops[i], self._xy[i], self._weights[i]
+        self._cells = {}
+        for j, (x, y) in enumerate(self._xy):
+            self._cells.setdefault(self._cell(x, y), []).append(j)
+
+    def nearest_within(self, lat, lng, radius_m=None, exclude=None):
+        """(index, distance_m) of the closest stop within radius (default min distance), else (None, inf)."""
+        radius = self.min_distance_m if radius_m is None else float(radius_m)
+        x, y = self._project(lat, lng)
+        cx, cy = self._cell(x, y)
+        reach = max(1, math.ceil(radius / self.cell_m))
+        best, best_d = None, math.inf
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                for i in self._cells.get((gx, gy), ()):
+                    if i == exclude:
+                        continue
+                    sx, sy = self._xy[i]
+                    d = math.hypot(sx - x, sy - y)
+                    if d < radius and d < best_d:
+                        best, best_d = i, d
+        return best, best_d
+
+    def add_stop(self, lat, lng, weight: float = 1.0, merge: bool = False):
+        """
+        Try to add a stop at (lat, lng).
+
+        Returns {"action": "added" | "merged" | "rejected", "stop": stop_dict}.
+        For "rejected" and "merged", stop is the existing neighbour; "merged"
+        also lists under "absorbed" the ids of stops removed because the
+        moved stop came within min_distance_m of them.
+        """
+        lat, lng = float(lat), float(lng)
+        i, _ = self.nearest_within(lat, lng)
+        if i is None:
+            stop = {"id": self._next_id, "lat": lat, "lng": lng}
+            self._next_id += 1
+            self._insert(stop, float(weight))
+            return {"action": "added", "stop": stop}
+
+        if not merge:
+            return {"action": "rejected", "stop": self.stops[i]}
+
+        stop = self.stops[i]
+        absorbed = []
+        while True:
+            w_new = self._weights[i] + float(weight)
+            share = float(weight) / w_new if w_new > 0 else 0.5
+            self._move(i, stop["lat"] + (lat - stop["lat"]) * share, stop["lng"] + (lng - stop["lng"]) * share)
+            self._weights[i] = w_new
+            # The move can bring the stop too close to another one: absorb it
+            # the same way until the spacing holds (each pass removes a stop)
+            j, _ = self.nearest_within(stop["lat"], stop["lng"], exclude=i)
+            if j is None:
+                break
+            other = self.stops[j]
+            lat, lng, weight = other["lat"], other["lng"], self._weights[j]
+            absorbed.append(other.get("id"))
+            self._remove(j)
+            i = i - 1 if j < i else i
+        return {"action": "merged", "stop": stop, "absorbed": absorbed}
+
+
+def dedupe_stops(centers, min_distance_m: float = 300, weights=None, merge: bool = False):
+    """
+    Greedy minimum-distance filter over candidate (lat, lng) centers, in order.
+
+    weights: per-center weight (e.g. the demand each cluster holds) for the
+    weighted mean when merge=True. Returns the accepted stops as
+    [{"id", "lat", "lng"}, ...] with ids 1..n.
+    """
+    index = StopIndex(min_distance_m)
+    for j, c in enumerate(centers):
+        w = 1.0 if weights is None else float(weights[j])
+        index.add_stop(c[0], c[1], weight=w, merge=merge)
+    # Merges can absorb earlier stops; renumber so ids stay contiguous
+    for n, stop in enumerate(index.stops, 1):
+        stop["id"] = n
+    return index.stops
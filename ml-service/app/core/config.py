@@ -1,14 +1,119 @@
 """Configuration helpers for ml-service."""
+import os
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional, Tuple
 
 
 @dataclass
 class Config:
     data_dir: Path = Path("/data")
     tmp_dir: Path = Path("/tmp")
+    # Persistent road-graph store (see routing.graph_store)
+    graph_cache_max_bytes: int = 512 * 1024 * 1024
+    graph_cache_memory_items: int = 4
+    # Optional local .osm / .osm.pbf extract used instead of the Overpass API
+    osm_file: Optional[Path] = None
+    # Landmarks for the ALT routing index (0 = plain Dijkstra sweeps)
+    alt_landmarks: int = 0
+    # Stops / demand points farther than this from the road graph stay unsnapped
+    max_snap_distance_m: float = 1000.0
+    # Processes ordering and road-snapping route groups (0 or 1 = in-process).
+    # Job workers do not nest a full pool each: every one gets
+    # route_workers // job_workers (see core.jobs), so about
+    # job_workers + 2 * route_workers processes run at most
+    route_workers: int = 0
+    # Background /optimize jobs (see core.jobs): concurrent workers, accepted
+    # unfinished jobs, and how long (and how many) finished jobs stay queryable
+    job_workers: int = 2
+    job_max_pending: int = 32
+    job_ttl_s: float = 3600.0
+    job_max_finished: int = 1000
+    # Profile every /optimize run into tmp_dir: "cprofile", "pyinstrument" or
+    # None (off; a request can still opt in with parameters["profile"])
+    profile: Optional[str] = None
+    # /optimize result cache (see core.result_cache): in-memory entries and
+    # on-disk budget under result_cache_dir (0 = memory only)
+    result_cache_items: int = 64
+    result_cache_disk_bytes: int = 0
+    # Scenario sessions (see core.sessions): count, estimated size and idle TTL
+    session_max_items: int = 64
+    session_max_bytes: int = 256 * 1024 * 1024
+    session_ttl_s: float = 1800.0
+    # Demand heatmap sources and rendered tiles under heatmap_dir
+    heatmap_cache_max_bytes: int = 128 * 1024 * 1024
+    # Raster demand sources (see preprocessing.demand_sources): cells read
+    # from a raster are block-summed down to about this many per request
+    demand_max_cells: int = 200_000
+    # Start-up warm-up (see core.warmup): run it before /ready passes, and
+    # the (west, south, east, north) areas whose graphs it pre-loads
+    warmup: bool = False
+    warmup_bboxes: Tuple[Tuple[float, float, float, float], ...] = ()
+
+    @property
+    def graph_dir(self) -> Path:
+        return self.data_dir / "graphs"
+
+    @property
+    def result_cache_dir(self) -> Path:
+        return self.data_dir / "results"
+
+    @property
+    def heatmap_dir(self) -> Path:
+        return self.data_dir / "heatmaps"
+
+    @property
+    def demand_dir(self) -> Path:
+        return self.data_dir / "demand"
 
 
 def get_config() -> Config:
-    """Return a default config instance. Extend to load from env/files."""
-    return Config()
+    """Return a config instance with ML_* environment overrides applied."""
+    cfg = Config()
+    env = os.environ
+    if env.get("ML_DATA_DIR"):
+        cfg.data_dir = Path(env["ML_DATA_DIR"])
+    if env.get("ML_TMP_DIR"):
+        cfg.tmp_dir = Path(env["ML_TMP_DIR"])
+    if env.get("ML_GRAPH_CACHE_MAX_MB"):
+        cfg.graph_cache_max_bytes = int(float(env["ML_GRAPH_CACHE_MAX_MB"]) * 1024 * 1024)
+    if env.get("ML_OSM_FILE"):
+        cfg.osm_file = Path(env["ML_OSM_FILE"])
+    if env.get("ML_ALT_LANDMARKS"):
+        cfg.alt_landmarks = int(env["ML_ALT_LANDMARKS"])
+    if env.get("ML_MAX_SNAP_DISTANCE_M"):
+        cfg.max_snap_distance_m = float(env["ML_MAX_SNAP_DISTANCE_M"])
+    if env.get("ML_ROUTE_WORKERS"):
+        cfg.route_workers = int(env["ML_ROUTE_WORKERS"])
+    if env.get("ML_JOB_WORKERS"):
+        cfg.job_workers = int(env["ML_JOB_WORKERS"])
+    if env.get("ML_JOB_MAX_PENDING"):
+        cfg.job_max_pending = int(env["ML_JOB_MAX_PENDING"])
+    if env.get("ML_JOB_TTL_S"):
+        cfg.job_ttl_s = float(env["ML_JOB_TTL_S"])
+    if env.get("ML_JOB_MAX_FINISHED"):
+        cfg.job_max_finished = int(env["ML_JOB_MAX_FINISHED"])
+    if env.get("ML_PROFILE"):
+        cfg.profile = env["ML_PROFILE"]
+    if env.get("ML_RESULT_CACHE_ITEMS"):
+        cfg.result_cache_items = int(env["ML_RESULT_CACHE_ITEMS"])
+    if env.get("ML_RESULT_CACHE_DISK_MB"):
+        cfg.result_cache_disk_bytes = int(float(env["ML_RESULT_CACHE_DISK_MB"]) * 1024 * 1024)
+    if env.get("ML_SESSION_MAX_ITEMS"):
+        cfg.session_max_items = int(env["ML_SESSION_MAX_ITEMS"])
+    if env.get("ML_SESSION_MAX_MB"):
+        cfg.session_max_bytes = int(float(env["ML_SESSION_MAX_MB"]) * 1024 * 1024)
+    if env.get("ML_SESSION_TTL_S"):
+        cfg.session_ttl_s = float(env["ML_SESSION_TTL_S"])
+    if env.get("ML_HEATMAP_CACHE_MAX_MB"):
+        cfg.heatmap_cache_max_bytes = int(float(env["ML_HEATMAP_CACHE_MAX_MB"]) * 1024 * 1024)
+    if env.get("ML_DEMAND_MAX_CELLS"):
+        cfg.demand_max_cells = int(env["ML_DEMAND_MAX_CELLS"])
+    if env.get("ML_WARMUP"):
+        cfg.warmup = env["ML_WARMUP"].lower() in ("1", "true", "yes")
+    if env.get("ML_WARMUP_BBOXES"):
+        # "west,south,east,north;west,south,east,north"
+        cfg.warmup_bboxes = tuple(
+            tuple(float(v) for v in part.split(",")) for part in env["ML_WARMUP_BBOXES"].split(";") if part.strip()
+        )
+    return cfg
@@ -0,0 +1,251 @@
+"""Background job manager for long-running /optimize requests.
+
+Jobs run app.pipeline.run_optimize in a bounded ProcessPoolExecutor, so
+CPU-heavy requests neither block the event loop nor each other. Worker
+processes push stage progress onto a managed queue; a listener thread folds
+it into the job state that the GET and Server-Sent-Events endpoints read.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import get_config
+from app.core.logging import get_logger
+from app.core.telemetry import registry
+from app.pipeline import STAGES, PipelineCancelled, run_optimize
+
+logger = get_logger("core.jobs")
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Raised when the number of unfinished jobs reaches the configured limit."""
+
+
+def _init_worker(route_workers: int):
+    """Job-worker initializer: the route pools nested in job workers split Config.route_workers."""
+    os.environ["ML_ROUTE_WORKERS"] = str(route_workers)
+
+
+def _run_job(job_id, payload, queue, cancel_event, run=run_optimize):
+    """
+    Worker-process entry point; progress goes back over `queue`. Returns
+    (result, the span histograms this job added to the worker's registry).
+    """
+    def progress(stage, status, elapsed_s):
+        queue.put((job_id, stage, status, elapsed_s))
+
+    before = registry.snapshot()
+    result = run(payload, progress=progress, should_cancel=cancel_event.is_set)
+    return result, registry.delta(before)
+
+
+class Job:
+    def __init__(self, job_id: str, payload: dict):
+        self.id = job_id
+        self.payload = payload
+        self.status = QUEUED
+        self.stages = {name: {"status": "pending", "elapsed_s": None} for name in STAGES}
+        self.current_stage = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.version = 0  # bumped on every change, for SSE streaming
+        self.future = None
+        self.cancel_event = None
+
+    def snapshot(self, include_result: bool = True) -> dict:
+        out = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.current_stage,
+            "stages": {k: dict(v) for k, v in self.stages.items()},
+            "created": self.created,
+            "finished": self.finished,
+        }
+        if self.error is not None:
+            out["error"] = self.error
+        if include_result and self.result is not None:
+            out["result"] = self.result
+        return out
+
+
+class JobManager:
+    """Submits, tracks and cancels optimize jobs.
+
+    max_workers bounds how many jobs run at once; max_pending bounds how many
+    unfinished (queued + running) jobs are accepted; finished jobs are kept
+    for ttl_s seconds, at most max_finished of them. run replaces
+    run_optimize (a module-level function, so spawned workers can import it).
+    A pool broken by a crashed worker is replaced on the next submit.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int = 32, ttl_s: float = 3600, run=None,
+                 max_finished: int = 1000):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = int(max_pending)
+        self.ttl_s = float(ttl_s)
+        self.max_finished = int(max_finished)
+        self._run = run or run_optimize
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._manager = None
+        self._queue = None
+        self._listener = None
+        self._broken = False
+
+    def _new_executor(self):
+        # spawn: workers must not inherit this process's threads and locks
+        route_share = get_config().route_workers // self.max_workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(route_share,),
+        )
+        self._broken = False
+
+    def _ensure_started(self):
+        if self._executor is not None:
+            if self._broken:
+                logger.warning("Job worker pool broken, starting a new one")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._new_executor()
+            return
+        self._manager = multiprocessing.get_context("spawn").Manager()
+        self._queue = self._manager.Queue()
+        self._new_executor()
+        self._listener = threading.Thread(target=self._listen, name="job-progress", daemon=True)
+        self._listener.start()
+
+    def warm_up(self, task):
+        """Start the worker processes now and run `task` (a picklable callable) once per worker slot."""
+        with self._lock:
+            self._ensure_started()
+            futures = [self._executor.submit(task) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    def _listen(self):
+        while True:
+            try:
+                msg = self._queue.get()
+            except (EOFError, OSError):
+                return
+            if msg is None:
+                return
+            job_id, stage, status, elapsed_s = msg
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                # Late progress after completion still fills in stage timings
+                if job.status not in FINISHED:
+                    job.status = RUNNING
+                    job.current_stage = stage
+                job.stages[stage] = {
+                    "status": status,
+                    "elapsed_s": round(elapsed_s, 3) if status == "done" else None,
+                }
+                job.version += 1
+
+    def _purge(self):
+        now = time.time()
+        finished = sorted((j.finished, j.id) for j in self._jobs.values() if j.finished)
+        expired = sum(1 for t, _ in finished if now - t > self.ttl_s)
+        for _, job_id in finished[:max(expired, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        job.version += 1
+
+    def submit(self, payload: dict) -> Job:
+        with self._lock:
+            self._purge()
+            pending = sum(1 for j in self._jobs.values() if j.status not in FINISHED)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"{pending} jobs already pending (limit {self.max_pending})")
+
+            self._ensure_started()
+            job = Job(uuid.uuid4().hex, payload)
+            job.cancel_event = self._manager.Event()
+            self._jobs[job.id] = job
+            executor = self._executor
+
+        try:
+            job.future = executor.submit(_run_job, job.id, payload, self._queue, job.cancel_event, self._run)
+        except RuntimeError as e:  # BrokenProcessPool, or a pool shut down under us
+            with self._lock:
+                self._broken = self._broken or isinstance(e, BrokenProcessPool)
+                self._finish(job, FAILED, f"{type(e).__name__}: {e}")
+            return job
+        job.future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+        return job
+
+    def _on_done(self, job: Job, future):
+        with self._lock:
+            try:
+                job.result, histograms = future.result()
+                # Spans were timed in the worker; surface them on this process's /metrics
+                registry.merge(histograms)
+                self._finish(job, COMPLETED)
+            except (CancelledError, PipelineCancelled):
+                self._finish(job, CANCELLED)
+            except BrokenProcessPool as e:
+                self._broken = True
+                self._finish(job, FAILED, f"worker process died: {e}")
+            except Exception as e:
+                self._finish(job, FAILED, f"{type(e).__name__}: {e}")
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        """Cancel a job: queued jobs never start, running jobs stop at the next stage."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancel_event.set()
+            future = job.future
+        if future is not None:
+            future.cancel()
+        return job
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        try:
+            self._queue.put(None)
+        except (EOFError, OSError):
+            pass
+        self._manager.shutdown()
+        self._executor = None
+
+
+_job_manager = None
+
+
+def get_job_manager() -> JobManager:
+    """Process-wide job manager configured from Config."""
+    global _job_manager
+    if _job_manager is None:
+        cfg = get_config()
+        _job_manager = JobManager(cfg.job_workers, cfg.job_max_pending, cfg.job_ttl_s, max_finished=cfg.job_max_finished)
+    return _job_manager
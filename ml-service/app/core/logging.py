@@ -11,3 +11,9 @@ def setup_logger(name: str = "ml_service") -> logging.Logger:
         logger.addHandler(handler)
     logger.setLevel(logging.INFO)
     return logger
+
+
+def get_logger(module: str) -> logging.Logger:
+    """Child of the ml_service logger, e.g. get_logger("routing") -> "ml_service.routing"."""
+    setup_logger()
+    return logging.getLogger(f"ml_service.{module}")
@@ -0,0 +1,239 @@
+"""Negotiated encodings of the /optimize result for large networks.
+
+The default response repeats every stop inside each route's stops_list and
+spells out each road node of a path as a {"lat", "lng"} object. Formats:
+
+    json     the default response, unchanged
+    compact  stops listed once as columns; routes reference them by id
+             (stop_ids) and their road geometry through the result's shared
+             edge table (segments), or else carry their path as a
+             polyline6 string (Google encoded polyline, 1e-6 degrees)
+    geojson  a FeatureCollection of stop Points and route LineStrings
+             (GeoFeature shape), streamed feature by feature
+    msgpack  the compact layout with coordinates as little-endian float32
+             [lat, lng, ...] byte strings (needs the msgpack package)
+
+Chosen with ?format= or the Accept header (see negotiate()). orjson is used
+for encoding when installed, stdlib json otherwise.
+"""
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional format
+    msgpack = None
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "compact": "application/vnd.smarttransit.compact+json",
+    "geojson": "application/geo+json",
+    "msgpack": "application/x-msgpack",
+}
+POLYLINE_PRECISION = 6
+# Per-route fields replaced by stop_ids / encoded path
+GEOMETRY_FIELDS = ("stops_list", "path")
+
+
+class UnknownFormat(ValueError):
+    """?format= names no known format (a bad request)."""
+
+
+class NotAcceptable(ValueError):
+    """No format the client accepts can be produced."""
+
+
+def _accept_ranges(accept: str):
+    """[(media range, q)] of an Accept header; malformed q values count as 1."""
+    ranges = []
+    for part in accept.split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        if not media:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        ranges.append((media.lower(), q))
+    return ranges
+
+
+def _quality(media_type: str, ranges):
+    """(q, specificity) of the most specific range matching media_type, or None."""
+    kind = media_type.split("/")[0]
+    best = None
+    for media, q in ranges:
+        specificity = 2 if media == media_type else 1 if media == f"{kind}/*" else 0 if media == "*/*" else None
+        if specificity is not None and (best is None or specificity > best[1]):
+            best = (q, specificity)
+    return best
+
+
+def negotiate(format_param=None, accept: str = None) -> str:
+    """
+    Format name from an explicit ?format= value, else the Accept header
+    (highest q, then the most specific match, then MEDIA_TYPES order; q=0
+    refuses a type); default "json". Raises UnknownFormat for a bad
+    ?format= and NotAcceptable when nothing acceptable can be produced.
+    """
+    available = [n for n in MEDIA_TYPES if n != "msgpack" or msgpack is not None]
+    if format_param:
+        if format_param not in MEDIA_TYPES:
+            raise UnknownFormat(f"unknown format {format_param!r}; expected one of {', '.join(MEDIA_TYPES)}")
+        if format_param not in available:
+            raise NotAcceptable("msgpack format needs the msgpack package")
+        return format_param
+    ranges = _accept_ranges(accept or "")
+    if not ranges:
+        return "json"
+    scored = []
+    for order, name in enumerate(available):
+        quality = _quality(MEDIA_TYPES[name], ranges)
+        if quality is not None and quality[0] > 0:
+            scored.append((quality[0], quality[1], -order, name))
+    if not scored:
+        raise NotAcceptable(f"none of {', '.join(MEDIA_TYPES[n] for n in available)} is acceptable")
+    return max(scored)[3]
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def encode_polyline(lat, lng, precision: int = POLYLINE_PRECISION) -> str:
+    """Google encoded polyline of coordinate arrays, vectorized over points."""
+    return encode_polylines(lat, lng, [len(lat)], precision)[0]
+
+
+def encode_polylines(lat, lng, lengths, precision: int = POLYLINE_PRECISION):
+    """One polyline per consecutive run of `lengths` points, encoded in a single pass."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    coords = np.round(np.column_stack([lat, lng]) * 10 ** precision).astype(np.int64).reshape(-1, 2)
+    if len(coords) == 0:
+        return [""] * len(lengths)
+    deltas = np.diff(coords, axis=0, prepend=0)
+    starts = (np.cumsum(lengths) - lengths)[lengths > 0]
+    deltas[starts] = coords[starts]  # every polyline starts from absolute coordinates
+    deltas = deltas.ravel()
+    values = (deltas << 1) ^ (deltas >> 63)  # zigzag
+    # 5-bit chunks, least significant first; 7 chunks cover 35 bits
+    chunks = (values[:, None] >> (5 * np.arange(7))) & 31
+    nchunks = np.maximum(1, 7 - np.argmax(chunks[:, ::-1] != 0, axis=1))
+    nchunks[(chunks == 0).all(axis=1)] = 1
+    used = np.arange(7) < nchunks[:, None]
+    more = np.arange(7) < (nchunks - 1)[:, None]
+    text = ((chunks | (more * 0x20)) + 63)[used].astype(np.uint8).tobytes().decode("ascii")
+    # Characters per polyline: sum of chunk counts over its points' lat and lng values
+    ends = np.cumsum(nchunks.reshape(-1, 2).sum(axis=1))
+    bounds = np.concatenate([[0], ends])[np.concatenate([[0], np.cumsum(lengths)])]
+    return [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def decode_polyline(text: str, precision: int = POLYLINE_PRECISION):
+    """Inverse of encode_polyline: [(lat, lng), ...]."""
+    values, shift, acc = [], 0, 0
+    for byte in text.encode("ascii"):
+        chunk = byte - 63
+        acc |= (chunk & 31) << shift
+        shift += 5
+        if chunk < 0x20:
+            values.append((acc >> 1) ^ -(acc & 1))
+            shift = acc = 0
+    coords = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return [tuple(p) for p in coords.tolist()]
+
+
+def _coords(points):
+    return np.array([p["lat"] for p in points], dtype=np.float64), np.array([p["lng"] for p in points], dtype=np.float64)
+
+
+def _float32_bytes(lat, lng) -> bytes:
+    return np.column_stack([lat, lng]).astype("<f4").tobytes()
+
+
+def compact_result(result: dict, binary: bool = False) -> dict:
+    """
+    The compact layout of an optimize result. binary=True gives float32
+    coordinate bytes (for msgpack) instead of JSON lists / polylines.
+    """
+    stops = result.get("stops") or []
+    lat, lng = _coords(stops)
+    if binary:
+        stop_table = {"id": [s["id"] for s in stops], "coords_f32": _float32_bytes(lat, lng)}
+    else:
+        stop_table = {"id": [s["id"] for s in stops], "lat": np.round(lat, 6).tolist(), "lng": np.round(lng, 6).tolist()}
+
+    has_edges = bool((result.get("geometry") or {}).get("edges"))
+    routes = []
+    for r in result.get("routes") or []:
+        route = {k: v for k, v in r.items() if k not in GEOMETRY_FIELDS}
+        route["stop_ids"] = [s["id"] for s in r.get("stops_list", [])]
+        if has_edges and r.get("segments"):
+            routes.append(route)
+            continue
+        plat, plng = _coords(r.get("path", []))
+        if binary:
+            route["path_f32"] = _float32_bytes(plat, plng)
+        else:
+            route["path"] = encode_polyline(plat, plng)
+        routes.append(route)
+
+    return {
+        **{k: v for k, v in result.items() if k not in ("stops", "routes")},
+        "encoding": "float32" if binary else f"polyline{POLYLINE_PRECISION}",
+        "stops": stop_table,
+        "routes": routes,
+    }
+
+
+def geojson_features(result: dict):
+    """GeoFeature dicts: one Point per stop, then one LineString per route."""
+    for s in result.get("stops") or []:
+        yield {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [s["lng"], s["lat"]]},
+            "properties": {"kind": "stop", **{k: v for k, v in s.items() if k not in ("lat", "lng")}},
+        }
+    for r in result.get("routes") or []:
+        props = {k: v for k, v in r.items() if k not in GEOMETRY_FIELDS}
+        props["stop_ids"] = [s["id"] for s in r.get("stops_list", [])]
+        yield {
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [[p["lng"], p["lat"]] for p in r.get("path", [])]},
+            "properties": {"kind": "route", **props},
+        }
+
+
+def geojson_chunks(result: dict):
+    """
+    FeatureCollection bytes, one feature per chunk; other top-level fields
+    (except the edge table, which the LineStrings replace) go in "properties".
+    """
+    props = {k: v for k, v in result.items() if k not in ("stops", "routes", "geometry")}
+    yield b'{"type":"FeatureCollection","properties":' + dumps(props) + b',"features":['
+    for i, feature in enumerate(geojson_features(result)):
+        yield (b"," if i else b"") + dumps(feature)
+    yield b"]}"
+
+
+def encode_result(result: dict, fmt: str):
+    """(body, media_type) for a non-default format; body is bytes or, for geojson, an iterator of bytes."""
+    if fmt == "compact":
+        return dumps(compact_result(result)), MEDIA_TYPES[fmt]
+    if fmt == "geojson":
+        return geojson_chunks(result), MEDIA_TYPES[fmt]
+    if fmt == "msgpack":
+        return msgpack.packb(compact_result(result, binary=True), use_bin_type=True), MEDIA_TYPES[fmt]
+    return dumps(result), MEDIA_TYPES["json"]
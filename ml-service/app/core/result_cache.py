@@ -0,0 +1,240 @@
+"""Cache of /optimize results and intermediate artifacts.
+
+Keys are fingerprints of the canonical request (see fingerprint()), so
+rotated, reversed or float-noisy copies of the same boundary hit the same
+entry. Three kinds of value are cached:
+
+    "result"  the full response, keyed on everything that affects it
+    "stops"   generated stops, keyed on boundary + STOP_PARAMS + STOP_CONFIG
+    "routes"  ordered, road-snapped, simplified route groups and their edge
+              table, keyed on the stops key, route count + ROUTE_PARAMS
+              + ROUTE_CONFIG
+
+so a request that only changes avg_speed_kmph (or num_buses, as long as the
+route count stays the same) goes straight to frequency and metrics.
+
+Values live in a bounded in-memory LRU and, when a disk budget is
+configured, as JSON files under Config.result_cache_dir shared by every
+worker process. The disk tier's size is tracked as entries are written and
+rescanned every RESCAN_EVERY writes to pick up other workers' writes; once
+over budget the least recently used files go until it is back under
+EVICT_TO of the budget.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.core.config import get_config
+from app.core.logging import get_logger
+from app.preprocessing.polygon_processor import normalize_polygon
+
+logger = get_logger("core.result_cache")
+
+# Parameters that change generated stops / route groups
+STOP_PARAMS = (
+    "min_stop_distance_m", "merge_close_stops", "snap_demand_m",
+    "demand_source", "demand_samples", "sampling_method", "sampling_seed",
+)
+ROUTE_PARAMS = ("ordering_time_budget_ms", "path_tolerance_m", "max_snap_distance_m")
+# Config values that change generated stops / route groups
+STOP_CONFIG = ("demand_max_cells", "osm_file")
+ROUTE_CONFIG = ("alt_landmarks", "max_snap_distance_m", "osm_file")
+# Parameters that never change the result
+IGNORED_PARAMS = ("profile", "cache")
+# Disk writes between rescans of the cache directory
+RESCAN_EVERY = 256
+# Eviction frees space down to this fraction of the disk budget
+EVICT_TO = 0.9
+
+
+def fingerprint(*parts) -> str:
+    """sha256 over the canonical JSON of parts."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def canonical_boundary(boundary):
+    """[{lat, lng}, ...] -> canonical [(lng, lat), ...] ring."""
+    return normalize_polygon([(p["lng"], p["lat"]) for p in boundary])
+
+
+def request_keys(boundary, num_buses, avg_speed_kmph, parameters, route_count=None) -> dict:
+    """Fingerprints for each cache kind; "routes" needs the route count."""
+    ring = canonical_boundary(boundary)
+    params = {k: v for k, v in parameters.items() if k not in IGNORED_PARAMS}
+    cfg = get_config()
+    stop_config = {k: getattr(cfg, k) for k in STOP_CONFIG}
+    route_config = {k: getattr(cfg, k) for k in ROUTE_CONFIG}
+    stops_key = fingerprint("stops", ring, {k: params.get(k) for k in STOP_PARAMS}, stop_config)
+    keys = {
+        "result": fingerprint(
+            "result", ring, int(num_buses), float(avg_speed_kmph), params, {**stop_config, **route_config},
+        ),
+        "stops": stops_key,
+    }
+    if route_count is not None:
+        keys["routes"] = fingerprint(
+            "routes", stops_key, int(route_count), {k: params.get(k) for k in ROUTE_PARAMS}, route_config,
+        )
+    return keys
+
+
+class ResultCache:
+    """LRU of JSON-serialisable values with an optional size-bounded disk tier."""
+
+    def __init__(self, max_items: int = 64, root=None, max_disk_bytes: int = 0):
+        self.max_items = int(max_items)
+        self.root = Path(root) if root is not None and max_disk_bytes > 0 else None
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [lock, holders and waiters]
+        self._disk_bytes = None  # bytes under root, from _rescan_disk()
+        self._disk_writes = 0
+
+        if self.root is not None:
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.warning("Result cache disabled on disk (%s): %s", self.root, e)
+                self.root = None
+
+    def get(self, kind: str, key: str):
+        with self._lock:
+            mem_key = (kind, key)
+            if mem_key in self._memory:
+                self._memory.move_to_end(mem_key)
+                return self._memory[mem_key]
+        if self.root is None:
+            return None
+
+        path = self.root / f"{kind}-{key}.json"
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)  # mtime doubles as last-used time for eviction
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Result cache entry %s unreadable, dropping: %s", path.name, e)
+            path.unlink(missing_ok=True)
+            return None
+        self._remember((kind, key), value)
+        return value
+
+    def put(self, kind: str, key: str, value):
+        self._remember((kind, key), value)
+        if self.root is None:
+            return
+        path = self.root / f"{kind}-{key}.json"
+        tmp = self.root / f"{kind}-{key}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(value, f, separators=(",", ":"))
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, path)
+            self._track_disk(path.stat().st_size - replaced)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Result cache write failed for %s: %s", path.name, e)
+            tmp.unlink(missing_ok=True)
+
+    @contextmanager
+    def key_lock(self, key: str):
+        """
+        Hold the lock for key, so concurrent identical requests (client
+        retries) compute once while other keys go ahead. A key's lock only
+        exists while someone holds or waits for it.
+        """
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.root is not None:
+            for path in self.root.glob("*.json"):
+                path.unlink(missing_ok=True)
+            with self._lock:
+                self._disk_bytes = None
+
+    def _remember(self, mem_key, value):
+        with self._lock:
+            self._memory[mem_key] = value
+            self._memory.move_to_end(mem_key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _track_disk(self, nbytes: int):
+        """Record nbytes just written, then enforce the disk budget."""
+        with self._lock:
+            self._disk_writes += 1
+            if self._disk_writes % RESCAN_EVERY == 0:
+                self._disk_bytes = None
+            if self._disk_bytes is not None:
+                self._disk_bytes += nbytes
+            total = self._disk_bytes
+        if total is None:
+            total = self._rescan_disk()  # already counts this write
+        if total > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _rescan_disk(self) -> int:
+        total = 0
+        for path in self.root.glob("*.json"):
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:  # removed by another worker
+                pass
+        with self._lock:
+            self._disk_bytes = total
+        return total
+
+    def _evict_disk(self):
+        files = []
+        for path in self.root.glob("*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:  # removed by another worker
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes * EVICT_TO:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+
+def cache_for(parameters):
+    """The process-wide cache, or None when the request opts out with "cache": false."""
+    return get_result_cache() if parameters.get("cache", True) is not False else None
+
+
+_result_cache = None
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide result cache configured from Config."""
+    global _result_cache
+    if _result_cache is None:
+        cfg = get_config()
+        _result_cache = ResultCache(cfg.result_cache_items, cfg.result_cache_dir, cfg.result_cache_disk_bytes)
+    return _result_cache
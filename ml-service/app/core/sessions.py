@@ -0,0 +1,154 @@
+"""Scenario sessions: build a network once, then re-evaluate what-if changes.
+
+A session keeps the stops and ordered, road-snapped route groups of one
+optimize run. Fleet size, speed and metric parameters only feed
+calculate_frequency and compute_metrics, so updates rerun just those two
+stages against the stored network.
+
+Sessions expire ttl_s after their last use; the store also caps the number
+of sessions and their estimated total size, evicting least recently used.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app.core.config import get_config
+from app.core.result_cache import ROUTE_PARAMS, STOP_PARAMS, cache_for
+from app.pipeline import build_network, evaluate_network, measure_coverage
+
+# Per-route fields that do not change between scenarios (sent once, on create)
+GEOMETRY_FIELDS = ("path", "stops_list", "segments", "leg_km")
+
+
+class NetworkParameterChange(ValueError):
+    """Raised when an update touches a parameter the stored network was built with."""
+
+
+class ScenarioSession:
+    def __init__(self, session_id, city, stops, routes, num_buses, avg_speed_kmph, parameters, polygon=None):
+        self.id = session_id
+        self.city = city
+        self.stops = stops
+        self.routes = routes
+        self.polygon = polygon
+        self._coverage = {}  # max_walk_distance_m -> measured coverage
+        self.num_buses = int(num_buses)
+        self.avg_speed_kmph = float(avg_speed_kmph)
+        self.parameters = dict(parameters)
+        self.nbytes = len(json.dumps([stops, routes], separators=(",", ":")))
+        self.created = time.time()
+        self.last_used = self.created
+        self.lock = threading.Lock()
+
+    def scenario(self, num_buses=None, avg_speed_kmph=None, parameters=None):
+        """
+        Apply changes to the session's current scenario and re-evaluate it.
+
+        Unset arguments keep their previous value; parameters are merged.
+        Returns (routes, metrics) with per-route geometry stripped.
+        """
+        parameters = parameters or {}
+        with self.lock:
+            changed = [k for k in STOP_PARAMS + ROUTE_PARAMS if k in parameters and parameters[k] != self.parameters.get(k)]
+            if changed:
+                raise NetworkParameterChange(f"{', '.join(changed)} changes the network; create a new session")
+            if num_buses is not None:
+                self.num_buses = int(num_buses)
+            if avg_speed_kmph is not None:
+                self.avg_speed_kmph = float(avg_speed_kmph)
+            self.parameters.update(parameters)
+            routes, metrics = evaluate_network(
+                self.routes, self.num_buses, self.avg_speed_kmph, self.parameters, coverage=self._measured_coverage(),
+            )
+        return [{k: v for k, v in r.items() if k not in GEOMETRY_FIELDS} for r in routes], metrics
+
+    def coverage(self):
+        """Measured coverage at the current walk distance (None without a polygon), memoized."""
+        with self.lock:
+            return self._measured_coverage()
+
+    def _measured_coverage(self):
+        if self.polygon is None or not self.routes:
+            return None
+        walk = float(self.parameters.get("max_walk_distance_m", 500))
+        if walk not in self._coverage:
+            self._coverage[walk] = measure_coverage(self.polygon, self.routes, self.parameters)
+        return self._coverage[walk]
+
+
+class SessionStore:
+    """Scenario sessions bounded by count, estimated bytes and idle TTL."""
+
+    def __init__(self, max_items: int = 64, max_bytes: int = 256 * 1024 * 1024, ttl_s: float = 1800):
+        self.max_items = int(max_items)
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, city, stops, routes, num_buses, avg_speed_kmph, parameters, polygon=None) -> ScenarioSession:
+        session = ScenarioSession(uuid.uuid4().hex, city, stops, routes, num_buses, avg_speed_kmph, parameters, polygon)
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict()
+        return session
+
+    def get(self, session_id: str):
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.time()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(s.nbytes for s in self._sessions.values())
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_s
+        for session_id in [s.id for s in self._sessions.values() if s.last_used < cutoff]:
+            del self._sessions[session_id]
+
+    def _evict(self):
+        # The newest session is last and always kept, even if alone over budget
+        self._expire()
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_items or self.total_bytes > self.max_bytes
+        ):
+            self._sessions.popitem(last=False)
+
+
+def create_session(req):
+    """
+    Build the network for an OptimizeRequest (through the result cache) and
+    store it; returns (session, routes, metrics) for the request's own scenario.
+    """
+    network = build_network(req, cache=cache_for(req.parameters))
+    session = get_session_store().create(
+        req.city_name, network["stops"], network["routes"], req.num_buses, req.avg_speed_kmph, req.parameters,
+        polygon=network["polygon"],
+    )
+    routes, metrics = evaluate_network(
+        network["routes"], req.num_buses, req.avg_speed_kmph, req.parameters, coverage=session.coverage(),
+    )
+    return session, routes, metrics
+
+
+_session_store = None
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store configured from Config."""
+    global _session_store
+    if _session_store is None:
+        cfg = get_config()
+        _session_store = SessionStore(cfg.session_max_items, cfg.session_max_bytes, cfg.session_ttl_s)
+    return _session_store
@@ -0,0 +1,206 @@
+"""Lightweight spans, latency histograms and opt-in profiling.
+
+    with span("routes.dijkstra"):
+        ...
+
+Each span is added to the current request's Trace (a contextvar, set by
+run_optimize) and to a process-wide Prometheus-style histogram rendered by
+the /metrics endpoint. Spans are cheap enough for inner loops: two
+perf_counter calls and a dict update.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Histogram bucket upper bounds in seconds (+Inf is implicit)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_NAME = "ml_span_duration_seconds"
+
+_current_trace = contextvars.ContextVar("ml_trace", default=None)
+_profiling = contextvars.ContextVar("ml_profiling", default=False)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Registry:
+    """Process-wide histograms keyed by span name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def snapshot(self) -> dict:
+        """{name: (bucket counts, sum, count)}, a copy for delta() / merge()."""
+        with self._lock:
+            return {name: (list(h.counts), h.sum, h.count) for name, h in self._histograms.items()}
+
+    def delta(self, before: dict) -> dict:
+        """Observations made since `before` (a snapshot()), in snapshot form."""
+        out = {}
+        for name, (counts, total, count) in self.snapshot().items():
+            prev_counts, prev_total, prev_count = before.get(name, ([0] * len(counts), 0.0, 0))
+            if count != prev_count:
+                out[name] = ([c - p for c, p in zip(counts, prev_counts)], total - prev_total, count - prev_count)
+        return out
+
+    def merge(self, snapshot: dict):
+        """Add histograms recorded elsewhere (e.g. a worker process's delta())."""
+        with self._lock:
+            for name, (counts, total, count) in snapshot.items():
+                hist = self._histograms.get(name)
+                if hist is None:
+                    hist = self._histograms[name] = Histogram()
+                hist.counts = [c + n for c, n in zip(hist.counts, counts)]
+                hist.sum += total
+                hist.count += count
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = [
+            f"# HELP {METRIC_NAME} Duration of optimize pipeline spans.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._histograms):
+                hist = self._histograms[name]
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_bucket{{span="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'{METRIC_NAME}_sum{{span="{name}"}} {hist.sum:.6f}')
+                lines.append(f'{METRIC_NAME}_count{{span="{name}"}} {hist.count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class Trace:
+    """Per-request span totals: name -> [total seconds, calls]."""
+
+    def __init__(self):
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.spans.get(name)
+            if entry is None:
+                self.spans[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def summary(self) -> dict:
+        """{"stages": {stage: ms}, "spans": {name: {"total_ms", "calls"}}} for the response."""
+        with self._lock:
+            items = list(self.spans.items())
+        return {
+            "stages": {
+                name[len("stage."):]: round(total * 1000, 2)
+                for name, (total, _) in items if name.startswith("stage.")
+            },
+            "spans": {
+                name: {"total_ms": round(total * 1000, 2), "calls": calls}
+                for name, (total, calls) in items if not name.startswith("stage.")
+            },
+        }
+
+
+@contextmanager
+def trace_request():
+    """Bind a fresh Trace to the current context for the duration of a request."""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block into the current Trace (if any) and the global histograms."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+        registry.observe(name, elapsed)
+
+
+@contextmanager
+def profile_to(directory, tag: str, mode: str = "cprofile"):
+    """
+    Profile the block and write the result into `directory`.
+
+    mode "cprofile" writes a pstats .prof file; "pyinstrument" writes an HTML
+    report (optional dependency, falls back to cProfile when missing).
+    Yields a dict whose "path" is filled in once the block finishes.
+    """
+    out = {"path": None}
+    directory = Path(directory)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    # Profilers only see the thread that started them (see profiling_active)
+    token = _profiling.set(True)
+
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            mode = "cprofile"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield out
+            finally:
+                profiler.stop()
+                _profiling.reset(token)
+                path = directory / f"optimize-{stamp}-{tag}.html"
+                path.write_text(profiler.output_html())
+                out["path"] = str(path)
+            return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield out
+    finally:
+        profiler.disable()
+        _profiling.reset(token)
+        path = directory / f"optimize-{stamp}-{tag}.prof"
+        profiler.dump_stats(path)
+        out["path"] = str(path)
+
+
+def profiling_active() -> bool:
+    """True inside profile_to(): work meant for other threads should stay in this one."""
+    return _profiling.get()
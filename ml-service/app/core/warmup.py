@@ -0,0 +1,186 @@
+"""Start-up warm-up: heavy imports, first-call costs and city graphs.
+
+The stage modules import sklearn, scipy, osmnx and pyproj on first use,
+so the service starts fast. warm_up() pays those costs before traffic
+arrives:
+- imports HEAVY_MODULES;
+- runs every hot path once on a tiny synthetic city (clustering, spectral
+  grouping, Dijkstra, KD-tree snapping, simplification, coverage,
+  heatmap tiles, encoding);
+- loads the graph and its snap / ALT indexes for every
+  Config.warmup_bboxes area;
+- starts the route and job worker pools, which do the same imports.
+
+main runs it in a background thread at startup when Config.warmup is on;
+/ready answers 503 until it has finished.
+"""
+import importlib
+import threading
+import time
+
+import numpy as np
+
+from app.core.config import get_config
+from app.core.logging import get_logger
+
+logger = get_logger("core.warmup")
+
+HEAVY_MODULES = (
+    "scipy.sparse.csgraph",
+    "scipy.spatial",
+    "scipy.ndimage",
+    "sklearn.cluster",
+    "sklearn.metrics",
+    "pyproj",
+    "networkx",
+    "osmnx",
+)
+
+# Synthetic city for touching the hot paths: GRID_SIDE^2 nodes, GRID_STEP degrees apart
+GRID_SIDE = 20
+GRID_STEP = 0.001
+ORIGIN = (72.82, 18.93)  # (lng, lat)
+
+_state = {"status": "idle", "elapsed_s": None, "errors": []}
+_lock = threading.Lock()
+
+
+def import_heavy_modules() -> float:
+    """Import HEAVY_MODULES; returns the seconds taken. Also the worker-pool warm-up task."""
+    t0 = time.perf_counter()
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Warm-up import of %s failed: %s", name, e)
+    return time.perf_counter() - t0
+
+
+def _synthetic_city():
+    from app.routing.graph_builder import from_edge_arrays
+
+    idx = np.arange(GRID_SIDE * GRID_SIDE).reshape(GRID_SIDE, GRID_SIDE)
+    u = np.concatenate([idx[:, :-1].ravel(), idx[:-1, :].ravel()])
+    v = np.concatenate([idx[:, 1:].ravel(), idx[1:, :].ravel()])
+    ys, xs = np.divmod(np.arange(GRID_SIDE * GRID_SIDE), GRID_SIDE)
+    return from_edge_arrays(
+        np.arange(GRID_SIDE * GRID_SIDE),
+        ORIGIN[0] + xs * GRID_STEP,
+        ORIGIN[1] + ys * GRID_STEP,
+        np.concatenate([u, v]),
+        np.concatenate([v, u]),
+        np.full(2 * len(u), GRID_STEP * 111_000),
+    )
+
+
+def touch_hot_paths():
+    """Run each pipeline stage once on the synthetic city (nothing is cached or stored)."""
+    from app.analytics.coverage_analyzer import network_coverage
+    from app.analytics.heatmap_generator import lnglat_to_pixels, make_heatmap, TILE_SIZE
+    from app.analytics.metrics_engine import compute_metrics
+    from app.clustering.stop_generator import generate_bus_stops
+    from app.core.response_format import encode_result
+    from app.optimization.frequency_calculator import calculate_frequency
+    from app.preprocessing.demand_simulator import simulate_demand
+    from app.preprocessing.grid_generator import generate_grid
+    from app.preprocessing.polygon_processor import coords_to_polygon
+    from app.routing.path_geometry import simplify_network
+    from app.routing.route_builder import build_routes
+    from app.routing.spatial_index import index_for
+
+    span_deg = (GRID_SIDE - 1) * GRID_STEP
+    west, south = ORIGIN
+    boundary = [
+        {"lat": south, "lng": west}, {"lat": south, "lng": west + span_deg},
+        {"lat": south + span_deg, "lng": west + span_deg}, {"lat": south + span_deg, "lng": west},
+    ]
+    graph = _synthetic_city()
+    index_for(graph).snap_edges([west + span_deg / 2], [south + span_deg / 2])
+
+    demand = simulate_demand(generate_grid(boundary))
+    stops = generate_bus_stops(demand, area_km2=4.0)
+    routes_raw, _ = simplify_network(build_routes(stops, 3, G=graph, time_budget_s=0.01))
+    routes = calculate_frequency(routes_raw, 6, 20.0)
+    coverage = network_coverage(coords_to_polygon(boundary), routes_raw, 500.0)
+    metrics = compute_metrics(routes, {}, coverage)
+
+    heatmap = make_heatmap(demand, stops=stops)
+    px, py = lnglat_to_pixels(west, south, 14)
+    heatmap.tile("unserved", 14, int(px // TILE_SIZE), int(py // TILE_SIZE))
+    encode_result({"stops": stops, "routes": routes, "metrics": metrics}, "compact")
+
+
+def preload_graphs(bboxes) -> int:
+    """Load the graph (plus snap and ALT indexes) of each (west, south, east, north) bbox; returns how many loaded."""
+    from shapely.geometry import box
+
+    from app.routing.osm_loader import load_compact_graph, load_landmarks, load_snap_index
+
+    alt_count = get_config().alt_landmarks
+    loaded = 0
+    for bbox in bboxes:
+        polygon = box(*bbox)
+        try:
+            graph = load_compact_graph(polygon)
+            if graph.num_nodes > 0:
+                load_snap_index(polygon, graph)
+                if alt_count > 0:
+                    load_landmarks(polygon, graph, alt_count)
+            loaded += 1
+        except Exception as e:
+            logger.warning("Warm-up graph load for %s failed: %s", bbox, e)
+            _state["errors"].append(f"graph {bbox}: {e}")
+    return loaded
+
+
+def start_pools():
+    """Spawn the route and job worker processes and have each import the heavy modules."""
+    cfg = get_config()
+    if cfg.route_workers > 1:
+        from app.routing.parallel_routes import get_route_pool
+
+        pool = get_route_pool(cfg.route_workers)
+        for f in [pool.submit(import_heavy_modules) for _ in range(cfg.route_workers)]:
+            f.result()
+    from app.core.jobs import get_job_manager
+
+    get_job_manager().warm_up(import_heavy_modules)
+
+
+def warm_up(bboxes=None, pools: bool = True) -> dict:
+    """Run every warm-up step; failures are logged and recorded, never raised. Returns per-step seconds."""
+    with _lock:
+        _state.update(status="warming", elapsed_s=None, errors=[])
+    bboxes = get_config().warmup_bboxes if bboxes is None else bboxes
+    steps = [("imports", import_heavy_modules), ("hot_paths", touch_hot_paths), ("graphs", lambda: preload_graphs(bboxes))]
+    if pools:
+        steps.append(("pools", start_pools))
+
+    timings = {}
+    t_all = time.perf_counter()
+    for name, fn in steps:
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            _state["errors"].append(f"{name}: {e}")
+        timings[name] = round(time.perf_counter() - t0, 3)
+    with _lock:
+        _state.update(status="ready", elapsed_s=round(time.perf_counter() - t_all, 3))
+    logger.info("Warm-up finished in %.2fs: %s", _state["elapsed_s"], timings)
+    return timings
+
+
+def start_background_warm_up() -> threading.Thread:
+    with _lock:
+        _state["status"] = "warming"
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_state() -> dict:
+    """{"status": "idle" | "warming" | "ready", "elapsed_s", "errors"}."""
+    with _lock:
+        return {**_state, "errors": list(_state["errors"])}
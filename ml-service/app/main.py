@@ -1,19 +1,45 @@
-from fastapi import FastAPI
+import asyncio
+import json
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from app.schemas.request_schema import OptimizeRequest
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from app.schemas.request_schema import (
+    AddStopRequest,
+    OptimizeRequest,
+    OptimizeSweepRequest,
+    ScenarioUpdate,
+    SweepSpec,
+)
+
+from app.analytics.heatmap_store import get_heatmap_store
+from app.clustering.stop_index import StopIndex
+from app.core.config import get_config
+from app.core.jobs import FINISHED, JobQueueFull, get_job_manager
+from app.core.response_format import NotAcceptable, UnknownFormat, dumps, encode_result, negotiate
+from app.core.result_cache import cache_for
+from app.core.sessions import NetworkParameterChange, create_session, get_session_store
+from app.core.telemetry import registry
+from app.core.warmup import start_background_warm_up, warmup_state
+from app.preprocessing.demand_sources import DemandSourceError, list_sources
+from app.optimization.scenario_sweep import sweep_scenarios, sweep_values
+from app.pipeline import build_network, measure_coverage, run_optimize
+
 
-from app.preprocessing.grid_generator import generate_grid
-from app.preprocessing.demand_simulator import simulate_demand
-from app.clustering.stop_generator import generate_bus_stops
-from app.routing.route_builder import build_routes
-from app.optimization.frequency_calculator import calculate_frequency
-from app.analytics.metrics_engine import compute_metrics
-from app.optimization.route_estimator import estimate_route_count
-from app.preprocessing.spatial_utils import estimate_area_km2
-from app.routing.osm_loader import load_graph_from_polygon
-from app.preprocessing.polygon_processor import coords_to_polygon
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if get_config().warmup:
+        start_background_warm_up()
+    yield
+    get_job_manager().shutdown()
 
-app = FastAPI(title="SmartTransit AI")
+
+app = FastAPI(title="SmartTransit AI", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,41 +49,239 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(DemandSourceError)
+def demand_source_error(request: Request, exc: DemandSourceError):
+    return JSONResponse({"detail": str(exc)}, status_code=400)
+
+
+def _check_parameters(parameters: dict):
+    """400 unless parameters["max_walk_distance_m"] (if given) is a finite positive number."""
+    walk = parameters.get("max_walk_distance_m", 500)
+    try:
+        valid = math.isfinite(float(walk)) and float(walk) > 0
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail=f"max_walk_distance_m must be a finite positive number, got {walk!r}")
+
+
 @app.post("/optimize")
-def optimize(req: OptimizeRequest):
+def optimize(req: OptimizeRequest, request: Request, fmt: Optional[str] = Query(None, alias="format")):
+    """
+    Run the pipeline. ?format= (or the Accept header) selects compact,
+    geojson (streamed) or msgpack encodings; see core.response_format.
+    The default JSON is encoded directly (orjson), skipping jsonable_encoder.
+    """
+    _check_parameters(req.parameters)
+    try:
+        name = negotiate(fmt, request.headers.get("accept"))
+    except UnknownFormat as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    body, media_type = encode_result(run_optimize(req), name)
+    if name == "geojson":
+        return StreamingResponse(body, media_type=media_type)
+    return Response(body, media_type=media_type)
+
 
-    # 1. Geometry processing
-    polygon = coords_to_polygon([p.model_dump() for p in req.boundary])
-    area = estimate_area_km2([p.model_dump() for p in req.boundary])
-    
-    # 2. Load Real Road Network using OSMnx!
+def _sweep_values(spec: SweepSpec, num_buses, avg_speed_kmph):
+    """(fleet sizes, speeds) of the spec; 400 when it is invalid or too large."""
     try:
-        G = load_graph_from_polygon(polygon)
-    except Exception as e:
-        print(f"OSM network routing failed: {e}")
-        G = None # fallback
+        return sweep_values(
+            jsonable_encoder(spec.num_buses), jsonable_encoder(spec.avg_speed_kmph), num_buses, avg_speed_kmph,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _run_sweep(routes, spec: SweepSpec, values, parameters, coverage=None):
+    t0 = time.perf_counter()
+    fleet, speeds = values
+    try:
+        scenarios = sweep_scenarios(routes, fleet, speeds, {**parameters, **spec.parameters}, coverage)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"scenarios": scenarios, "count": len(scenarios), "execution_time_s": round(time.perf_counter() - t0, 4)}
+
+
+@app.post("/optimize/sweep")
+def optimize_sweep(req: OptimizeSweepRequest):
+    """Build the network once and evaluate every num_buses × avg_speed_kmph combination."""
+    params = {**req.parameters, **req.sweep.parameters}
+    _check_parameters(params)
+    values = _sweep_values(req.sweep, req.num_buses, req.avg_speed_kmph)
+    network = build_network(req, cache=cache_for(req.parameters))
+    coverage = measure_coverage(network["polygon"], network["routes"], params) if network["routes"] else None
+    return {
+        "city": req.city_name,
+        **_run_sweep(network["routes"], req.sweep, values, req.parameters, coverage),
+    }
+
+
+@app.post("/optimize/jobs", status_code=202)
+def submit_optimize_job(req: OptimizeRequest):
+    """Queue an optimize run in the worker pool and return its job id."""
+    _check_parameters(req.parameters)
+    try:
+        job = get_job_manager().submit(req.model_dump())
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job.status}
+
+
+def _get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+
+@app.get("/optimize/jobs/{job_id}")
+def get_optimize_job(job_id: str):
+    """Job status, per-stage progress and, once completed, the optimize result."""
+    return _get_job(job_id).snapshot()
 
-    # 3. demand & stops
-    grid = generate_grid([p.model_dump() for p in req.boundary])
-    demand = simulate_demand(grid)
-    stops = generate_bus_stops(demand, area_km2=area)
 
-    # 4. routes
-    route_count = estimate_route_count(req.num_buses, area)
-    
-    # We pass G down so build_routes can use real network paths
-    routes_raw = build_routes(stops, route_count, G=G)
+@app.get("/optimize/jobs/{job_id}/events")
+async def stream_optimize_job(job_id: str):
+    """Server-Sent-Events stream: a "progress" event per change, then "done"."""
+    job = _get_job(job_id)
 
-    # 5. scheduling & analytics 
-    routes = calculate_frequency(routes_raw, req.num_buses, req.avg_speed_kmph)
+    async def events():
+        seen = -1
+        idle = 0.0
+        while True:
+            if job.version != seen:
+                seen = job.version
+                finished = job.status in FINISHED
+                snap = jsonable_encoder(job.snapshot(include_result=finished))
+                yield f"event: {'done' if finished else 'progress'}\ndata: {json.dumps(snap)}\n\n"
+                if finished:
+                    return
+                idle = 0.0
+            elif idle >= 15.0:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            await asyncio.sleep(0.2)
+            idle += 0.2
 
-    # 5 analytics
-    metrics = compute_metrics(routes, req.parameters)
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
+
+@app.delete("/optimize/jobs/{job_id}")
+def cancel_optimize_job(job_id: str):
+    """Cancel a queued or running job; running jobs stop before their next stage."""
+    _get_job(job_id)
+    return get_job_manager().cancel(job_id).snapshot(include_result=False)
+
+
+@app.post("/scenarios", status_code=201)
+def create_scenario(req: OptimizeRequest):
+    """Build a network once and return a session handle for what-if updates."""
+    _check_parameters(req.parameters)
+    session, routes, metrics = create_session(req)
     return {
-        "status":"completed",
-        "city":req.city_name,
-        "stops":stops,
-        "routes":routes,
-        "metrics":metrics
-    }
\ No newline at end of file
+        "session_id": session.id,
+        "expires_in_s": get_session_store().ttl_s,
+        "status": "completed",
+        "city": session.city,
+        "stops": session.stops,
+        "routes": routes,
+        "metrics": metrics,
+    }
+
+
+def _get_session(session_id: str):
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="session not found or expired")
+    return session
+
+
+@app.post("/scenarios/{session_id}")
+def update_scenario(session_id: str, update: ScenarioUpdate):
+    """Re-evaluate frequency and metrics for a fleet / speed / parameter change."""
+    session = _get_session(session_id)
+    _check_parameters(update.parameters)
+    t0 = time.perf_counter()
+    try:
+        routes, metrics = session.scenario(update.num_buses, update.avg_speed_kmph, update.parameters)
+    except NetworkParameterChange as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "session_id": session.id,
+        "num_buses": session.num_buses,
+        "avg_speed_kmph": session.avg_speed_kmph,
+        "routes": routes,
+        "metrics": metrics,
+        "execution_time_s": round(time.perf_counter() - t0, 4),
+    }
+
+
+@app.post("/scenarios/{session_id}/sweep")
+def sweep_scenario(session_id: str, spec: SweepSpec):
+    """Sweep fleet sizes / speeds against a session's stored network."""
+    session = _get_session(session_id)
+    params = {**session.parameters, **spec.parameters}
+    _check_parameters(params)
+    values = _sweep_values(spec, session.num_buses, session.avg_speed_kmph)
+    if params.get("max_walk_distance_m") == session.parameters.get("max_walk_distance_m"):
+        coverage = session.coverage()
+    else:
+        coverage = measure_coverage(session.polygon, session.routes, params) if session.routes else None
+    return {
+        "session_id": session.id,
+        **_run_sweep(session.routes, spec, values, session.parameters, coverage),
+    }
+
+
+@app.delete("/scenarios/{session_id}", status_code=204)
+def delete_scenario(session_id: str):
+    if not get_session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail="session not found or expired")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus histograms of pipeline stage and hot-loop span durations."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/demand-sources")
+def demand_sources():
+    """Names accepted by parameters["demand_source"] (see preprocessing.demand_sources)."""
+    return {"sources": list_sources()}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 while the start-up warm-up (Config.warmup) is still running."""
+    state = warmup_state()
+    if state["status"] == "warming":
+        return Response(dumps(state), status_code=503, media_type="application/json")
+    return state
+
+
+@app.get("/heatmap/{heatmap_id}/{layer}/{z}/{x}/{y}.{fmt}")
+def heatmap_tile(heatmap_id: str, layer: str, z: int, x: int, y: int, fmt: str, walk_m: float = 500.0):
+    """
+    Demand heatmap tile (Web-Mercator z/x/y) as an indexed PNG or, with fmt
+    "bin", the raw 256×256 uint8 density levels.
+    """
+    try:
+        data = get_heatmap_store().tile(heatmap_id, layer, z, x, y, fmt, walk_m)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if data is None:
+        raise HTTPException(status_code=404, detail="heatmap not found or expired")
+    media_type = "image/png" if fmt == "png" else "application/octet-stream"
+    return Response(data, media_type=media_type, headers={"Cache-Control": "public, max-age=86400"})
+
+
+@app.post("/stops/add")
+def add_stop(req: AddStopRequest):
+    """Interactive stop editing: add one stop subject to the minimum spacing rule."""
+    index = StopIndex(req.min_stop_distance_m, stops=[s.model_dump(exclude_none=True) for s in req.stops])
+    result = index.add_stop(req.point.lat, req.point.lng, merge=req.merge)
+    return {**result, "stops": index.stops}
@@ -1,23 +1,25 @@
 import math
 
-KM_PER_DEGREE = 111.0
+import numpy as np
+
+from app.preprocessing.spatial_utils import (
+    haversine_pairwise_km,
+    path_cumulative_km,
+    stop_coords,
+    stop_distance_km,
+)
 
+KM_PER_DEGREE = 111.0
 
-def haversine_km(a, b):
-    """Haversine distance between two points in km."""
-    R = 6371.0
-    lat1, lat2 = math.radians(a["lat"]), math.radians(b["lat"])
-    dlat = lat2 - lat1
-    dlng = math.radians(b["lng"] - a["lng"])
-    h = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-    return R * 2 * math.asin(math.sqrt(min(1.0, h)))
+# Kept for callers of the old helper; the kernel lives in spatial_utils
+haversine_km = stop_distance_km
 
 
 def route_distance(route):
     """Total route length in km using Haversine distances."""
     if len(route) < 2:
         return 0.8
-    return sum(haversine_km(route[i], route[i + 1]) for i in range(len(route) - 1))
+    return float(path_cumulative_km(*stop_coords(route))[-1])
 
 
 def compute_stop_demand(stops, all_stops):
@@ -50,12 +52,8 @@ def compute_stop_demand(stops, all_stops):
 
     # Cluster tightness: how close together are stops in this route
     if len(stops) > 1:
-        intra_distances = [
-            haversine_km(stops[i], stops[j])
-            for i in range(len(stops))
-            for j in range(i+1, len(stops))
-        ]
-        avg_intra = sum(intra_distances) / len(intra_distances) if intra_distances else 1.0
+        D = haversine_pairwise_km(*stop_coords(stops))
+        avg_intra = float(D[np.triu_indices(len(stops), k=1)].mean())
         tightness = max(0.1, 1.0 / (1.0 + avg_intra))  # tighter = higher
     else:
         tightness = 0.5
@@ -66,19 +64,29 @@ def compute_stop_demand(stops, all_stops):
     return max(1.0, demand)
 
 
-def calculate_frequency(routes, total_buses, avg_speed_kmph):
+def route_statistics(routes):
     """
-    Demand-proportional bus allocation with minimum service guarantee.
-    Each route gets at least 2 buses regardless of demand share.
+    Scenario-independent per-route figures: stops, path, ordering, length
+    (km), demand and allocation score. Accepts route dicts or stop lists;
+    a route's "length_km" (road length from routing, see
+    path_geometry.simplify_network) is used instead of the haversine length
+    of its path when present.
     """
     # Flatten all stops across routes for global centroid calculation
     all_stops = []
     route_stats = []
 
     for r in routes:
+        ordering = segments = length = legs = None
         if isinstance(r, dict) and "stops" in r:
             stops_list = r["stops"]
             path_list = r["path"]
+            ordering = r.get("ordering")
+            segments = r.get("segments")
+            legs = r.get("leg_km")
+            length = r.get("length_km")
+            if length is None and r.get("cum_km") and len(path_list) >= 2:
+                length = float(r["cum_km"][-1])
         else:
             stops_list = r
             path_list = r
@@ -87,51 +95,96 @@ def calculate_frequency(routes, total_buses, avg_speed_kmph):
         route_stats.append({
             "stops_list": stops_list,
             "path": path_list,
+            "ordering": ordering,
+            "segments": segments,
+            "leg_km": legs,
+            "length": length,
         })
 
     # Compute demand scores with global context
     for r in route_stats:
-        r["length"] = route_distance(r["path"])
+        if r["length"] is None:
+            r["length"] = route_distance(r["path"])
         r["demand"] = compute_stop_demand(r["stops_list"], all_stops)
         r["score"] = r["demand"] * 1.5 + r["length"]
+    return route_stats
 
-    total_score = sum(r["score"] for r in route_stats) or 1.0
 
-    # First pass: proportional allocation
-    allocations = []
-    for r in route_stats:
-        share = r["score"] / total_score
-        buses = max(2, round(total_buses * share))  # MINIMUM 2 buses per route
-        allocations.append(buses)
+def allocate_buses(scores, total_buses):
+    """
+    Demand-proportional allocation, vectorized over scenarios.
 
-    # Rescale if total exceeds fleet (due to minimum guarantees)
-    allocated_total = sum(allocations)
-    if allocated_total > total_buses:
-        scale = total_buses / allocated_total
-        allocations = [max(2, round(b * scale)) for b in allocations]
+    scores: (R,) route scores; total_buses: scalar or (S,) fleet sizes.
+    Returns (S, R) integer bus counts, at least 2 per route.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    total = np.atleast_1d(np.asarray(total_buses, dtype=np.float64))[:, None]
+    share = scores / (scores.sum() or 1.0)
 
-    results = []
-    for i, r in enumerate(route_stats):
-        buses = allocations[i]
+    # First pass: proportional allocation, MINIMUM 2 buses per route
+    alloc = np.maximum(2, np.round(total * share))
 
-        round_trip_time = (r["length"] / max(1, avg_speed_kmph)) * 60 * 2
-        dwell_delay = len(r["stops_list"]) * 0.5
-        cycle_time = round_trip_time + dwell_delay
+    # Rescale where the total exceeds the fleet (due to minimum guarantees)
+    allocated = alloc.sum(axis=1, keepdims=True)
+    over = allocated > total
+    scale = np.where(over, total / allocated, 1.0)
+    alloc = np.where(over, np.maximum(2, np.round(alloc * scale)), alloc)
+    return alloc.astype(np.int64)
 
-        headway = cycle_time / buses if buses else 0
-        avg_wait = headway / 2
 
-        results.append({
+def service_levels(lengths_km, stop_counts, buses, avg_speed_kmph):
+    """
+    One-way travel time, headway and average wait (minutes), shape (S, R).
+
+    lengths_km, stop_counts: (R,); buses: (S, R); avg_speed_kmph: scalar or (S,).
+    """
+    speed = np.maximum(1, np.atleast_1d(np.asarray(avg_speed_kmph, dtype=np.float64)))[:, None]
+    round_trip_time = (np.asarray(lengths_km, dtype=np.float64) / speed) * 60 * 2
+    dwell_delay = np.asarray(stop_counts, dtype=np.float64) * 0.5
+    cycle_time = round_trip_time + dwell_delay
+
+    headway = np.where(buses > 0, cycle_time / np.maximum(buses, 1), 0.0)
+    return round_trip_time / 2, headway, headway / 2
+
+
+def calculate_frequency(routes, total_buses, avg_speed_kmph):
+    """
+    Demand-proportional bus allocation with minimum service guarantee.
+    Each route gets at least 2 buses regardless of demand share.
+    """
+    route_stats = route_statistics(routes)
+    if not route_stats:
+        return []
+
+    lengths = np.array([r["length"] for r in route_stats])
+    counts = np.array([len(r["stops_list"]) for r in route_stats])
+    allocations = allocate_buses([r["score"] for r in route_stats], total_buses)
+    travel, headway, wait = service_levels(lengths, counts, allocations, avg_speed_kmph)
+    # np.round throughout, so scenario sweeps reproduce these figures exactly
+    distance = np.round(lengths, 2)
+    demand = np.round([r["demand"] for r in route_stats], 1)
+    travel, headway, wait = np.round(travel, 1), np.round(headway, 1), np.round(wait, 1)
+
+    results = []
+    for i, r in enumerate(route_stats):
+        result = {
             "route_id": f"R{i+1}",
             "stops": len(r["stops_list"]),
             "stops_list": r["stops_list"],
-            "distance_km": round(r["length"], 2),
-            "travel_time_min": round(round_trip_time / 2, 1),
-            "buses_assigned": buses,
-            "frequency_min": round(headway, 1),
-            "avg_wait_time_min": round(avg_wait, 1),
-            "demand_score": round(r["demand"], 1),
+            "distance_km": float(distance[i]),
+            "travel_time_min": float(travel[0, i]),
+            "buses_assigned": int(allocations[0, i]),
+            "frequency_min": float(headway[0, i]),
+            "avg_wait_time_min": float(wait[0, i]),
+            "demand_score": float(demand[i]),
             "path": r["path"]
-        })
-
-    return results
\ No newline at end of file
+        }
+        if r["ordering"] is not None:
+            result["ordering"] = r["ordering"]
+        if r["segments"] is not None:
+            result["segments"] = r["segments"]
+        if r["leg_km"] is not None:
+            result["leg_km"] = r["leg_km"]
+        results.append(result)
+
+    return results
@@ -0,0 +1,113 @@
+"""Evaluate many fleet-size / speed scenarios of one network in a single pass.
+
+Route lengths, demand and allocation scores are computed once; allocation,
+headways and network metrics are then NumPy arrays over the scenario grid,
+so a sweep costs about as much as a handful of calculate_frequency calls.
+Each row matches what calculate_frequency + compute_metrics would return
+for that scenario.
+"""
+import numpy as np
+
+from app.analytics.metrics_engine import network_metrics
+from app.optimization.frequency_calculator import allocate_buses, route_statistics, service_levels
+
+# Upper bound on num_buses × avg_speed_kmph combinations per sweep
+MAX_SWEEP_POINTS = 100_000
+
+
+def value_count(spec) -> int:
+    """How many values expand_values(spec) gives, without building them."""
+    if spec is None:
+        return 1
+    if isinstance(spec, dict):
+        start, stop, step = float(spec["start"]), float(spec["stop"]), float(spec.get("step", 1))
+        if not (np.isfinite(start) and np.isfinite(stop) and np.isfinite(step)):
+            raise ValueError("range start, stop and step must be finite")
+        if step <= 0:
+            raise ValueError("range step must be positive")
+        return max(0, int(np.floor((stop - start) / step + 1e-9)) + 1)
+    return len(spec)
+
+
+def expand_values(spec, default, limit: int = MAX_SWEEP_POINTS):
+    """
+    A list of values, a {"start", "stop", "step"} range (stop inclusive) or
+    None for [default]. Raises ValueError above `limit` values, before
+    expanding anything.
+    """
+    count = value_count(spec)
+    if count > limit:
+        raise ValueError(f"{count} sweep values requested (limit {limit})")
+    if spec is None:
+        return [default]
+    if isinstance(spec, dict):
+        start, step = float(spec["start"]), float(spec.get("step", 1))
+        return (start + np.arange(count) * step).tolist()
+    return list(spec)
+
+
+def sweep_values(num_buses_spec, speed_spec, num_buses, avg_speed_kmph):
+    """
+    (fleet sizes, speeds) of a sweep spec. The MAX_SWEEP_POINTS check runs
+    on the counts first, so an oversized range is rejected before anything
+    is allocated (or a network built).
+    """
+    n_points = value_count(num_buses_spec) * value_count(speed_spec)
+    if n_points > MAX_SWEEP_POINTS:
+        raise ValueError(f"{n_points} scenarios requested (limit {MAX_SWEEP_POINTS})")
+    fleet = [int(round(v)) for v in expand_values(num_buses_spec, num_buses)]
+    return fleet, expand_values(speed_spec, avg_speed_kmph)
+
+
+def sweep_scenarios(routes, num_buses_values, speed_values, parameters=None, coverage=None):
+    """
+    Every num_buses × avg_speed_kmph combination for the given route groups.
+
+    Returns a list of {num_buses, avg_speed_kmph, total_buses, avg_headway_min,
+    avg_wait_time, los_score, co2_saved_kg_day, estimated_ridership} rows,
+    speed varying fastest. coverage: measured {"stop", "corridor"} fractions
+    (see compute_metrics), shared by every scenario.
+    """
+    buses = np.asarray(num_buses_values, dtype=np.int64)
+    speeds = np.asarray(speed_values, dtype=np.float64)
+    n_points = len(buses) * len(speeds)
+    if n_points == 0:
+        return []
+    if n_points > MAX_SWEEP_POINTS:
+        raise ValueError(f"{n_points} scenarios requested (limit {MAX_SWEEP_POINTS})")
+
+    stats = route_statistics(routes)
+    if not stats:
+        return []
+    fleet = np.repeat(buses, len(speeds))
+    speed = np.tile(speeds, len(buses))
+
+    lengths = np.array([r["length"] for r in stats])
+    counts = np.array([len(r["stops_list"]) for r in stats])
+    alloc = allocate_buses([r["score"] for r in stats], fleet)
+    _, headway, wait = service_levels(lengths, counts, alloc, speed)
+
+    # Same per-route rounding as calculate_frequency's output
+    m = network_metrics(
+        distance_km=np.round(lengths, 2),
+        stop_counts=counts,
+        demand_scores=np.round([r["demand"] for r in stats], 1),
+        frequency_min=np.round(headway, 1),
+        wait_min=np.round(wait, 1),
+        buses=alloc,
+        parameters=parameters,
+        coverage=coverage,
+    )
+
+    columns = {
+        "num_buses": fleet.tolist(),
+        "avg_speed_kmph": speed.tolist(),
+        "total_buses": m["total_buses"].tolist(),
+        "avg_headway_min": m["avg_frequency_min"].tolist(),
+        "avg_wait_time": m["avg_wait_time"].tolist(),
+        "los_score": m["los_score"].tolist(),
+        "co2_saved_kg_day": m["co2_saved_kg_day"].tolist(),
+        "estimated_ridership": m["estimated_ridership"].tolist(),
+    }
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
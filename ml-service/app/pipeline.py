@@ -0,0 +1,332 @@
+"""The /optimize pipeline as a plain function with per-stage progress hooks.
+
+Used inline by the synchronous /optimize endpoint and inside worker
+processes by the job API (core.jobs). Stages:
+geometry, graph, demand, stops, routes, simplify, frequency, metrics.
+graph (road network fetch) runs in a thread alongside demand and stops
+(core.stage_graph); routes start once both branches are done.
+Results and the stops / routes intermediates go through core.result_cache;
+stages served from it are reported as "cached".
+"""
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+from app.schemas.request_schema import OptimizeRequest
+from app.preprocessing.demand_sources import load_demand, sampling_options
+from app.clustering.stop_generator import generate_bus_stops
+from app.routing.route_builder import build_routes
+from app.routing.path_geometry import DEFAULT_TOLERANCE_M, simplify_network
+from app.optimization.frequency_calculator import calculate_frequency
+from app.analytics.metrics_engine import compute_metrics
+from app.analytics.coverage_analyzer import network_coverage
+from app.analytics.heatmap_generator import LAYERS as HEATMAP_LAYERS, make_heatmap
+from app.analytics.heatmap_store import get_heatmap_store
+from app.optimization.route_estimator import estimate_route_count
+from app.preprocessing.spatial_utils import estimate_area_km2
+from app.routing.osm_loader import load_compact_graph, load_landmarks, load_snap_index
+from app.routing.spatial_index import snap_demand
+from app.core.config import get_config
+from app.core.result_cache import cache_for, request_keys
+from app.core.stage_graph import Task, run_graph
+from app.core.logging import get_logger
+from app.core.telemetry import profile_to, profiling_active, span, trace_request
+from app.preprocessing.polygon_processor import coords_to_polygon
+
+logger = get_logger("pipeline")
+
+STAGES = ("geometry", "graph", "demand", "stops", "routes", "simplify", "frequency", "metrics")
+# Heatmaps are keyed on the stops fingerprint: same demand and stops
+HEATMAP_ID_LEN = 24
+
+
+class PipelineCancelled(Exception):
+    """Raised between stages when the caller asked to stop."""
+
+
+class StageReporter:
+    """Reports stage start/finish to a progress callback and checks for cancellation.
+
+    progress(stage, status, elapsed_s) is called with status "running" then "done".
+    Each stage is also recorded as a "stage.<name>" telemetry span.
+    """
+
+    def __init__(self, progress=None, should_cancel=None):
+        self.progress = progress
+        self.should_cancel = should_cancel
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.should_cancel is not None and self.should_cancel():
+            raise PipelineCancelled(name)
+        if self.progress is not None:
+            self.progress(name, "running", 0.0)
+        t0 = time.perf_counter()
+        with span(f"stage.{name}"):
+            yield
+        if self.progress is not None:
+            self.progress(name, "done", time.perf_counter() - t0)
+
+    def skip(self, name: str):
+        """Mark a stage whose output came from the result cache."""
+        if self.should_cancel is not None and self.should_cancel():
+            raise PipelineCancelled(name)
+        if self.progress is not None:
+            self.progress(name, "cached", 0.0)
+
+
+def _profile_mode(req):
+    """parameters["profile"] (true, "cprofile" or "pyinstrument") or Config.profile."""
+    mode = req.parameters.get("profile") or get_config().profile
+    if mode is True:
+        return "cprofile"
+    return mode or None
+
+
+def run_optimize(req, progress=None, should_cancel=None) -> dict:
+    """
+    Run the full optimize pipeline for an OptimizeRequest (or its dict form).
+
+    The result carries execution_time_s, per-stage / hot-loop timings and
+    "cache" (the deepest cached artifact reused: result, routes, stops or
+    none); with profiling on it also names the profile written to
+    Config.tmp_dir. parameters["cache"] = false bypasses the cache.
+    """
+    if not isinstance(req, OptimizeRequest):
+        req = OptimizeRequest(**req)
+
+    mode = _profile_mode(req)
+    cache = cache_for(req.parameters)
+    t0 = time.perf_counter()
+    with trace_request() as trace:
+        profiler = profile_to(get_config().tmp_dir, uuid.uuid4().hex[:8], mode) if mode else nullcontext()
+        with profiler as prof:
+            with span("optimize"):
+                result = _run_cached(req, StageReporter(progress, should_cancel), cache)
+
+    result["execution_time_s"] = round(time.perf_counter() - t0, 3)
+    result["timings"] = trace.summary()
+    if prof is not None:
+        result["profile_path"] = prof["path"]
+        logger.info("Profile for %s written to %s", req.city_name, prof["path"])
+    return result
+
+
+def _run_cached(req: OptimizeRequest, reporter: StageReporter, cache) -> dict:
+    if cache is None:
+        return _run_stages(req, reporter, None)
+
+    boundary = [p.model_dump() for p in req.boundary]
+    key = request_keys(boundary, req.num_buses, req.avg_speed_kmph, req.parameters)["result"]
+    # Identical concurrent requests (client retries) wait for the first one
+    with cache.key_lock(key):
+        with span("cache.lookup"):
+            cached = cache.get("result", key)
+        if cached is not None:
+            for name in STAGES:
+                reporter.skip(name)
+            return {**cached, "city": req.city_name, "cache": "result"}
+
+        return _run_stages(req, reporter, cache)
+
+
+def build_network(req: OptimizeRequest, reporter: StageReporter = None, cache=None) -> dict:
+    """
+    Stages geometry .. simplify: everything that does not depend on the
+    fleet size or speed once the route count is fixed.
+
+    Returns {"stops", "routes" (ordered, road-snapped, simplified groups),
+    "geometry" (shared-segment edge table, see routing.path_geometry), "polygon",
+    "keys", "reused" (cache tier used), "road_graph" (False on straight-line
+    fallback), "heatmap_id" (demand heatmap in the heatmap store, or None)}.
+    """
+    reporter = reporter or StageReporter()
+    boundary = [p.model_dump() for p in req.boundary]
+    reused = "none"
+
+    # 1. Geometry processing
+    with reporter.stage("geometry"):
+        polygon = coords_to_polygon(boundary)
+        area = estimate_area_km2(boundary)
+        route_count = estimate_route_count(req.num_buses, area)
+        keys = request_keys(boundary, req.num_buses, req.avg_speed_kmph, req.parameters, route_count)
+
+    routes_raw = stops = geometry = None
+    if cache is not None:
+        with span("cache.lookup"):
+            stops = cache.get("stops", keys["stops"])
+            network = cache.get("routes", keys["routes"]) if stops is not None else None
+        if isinstance(network, dict):
+            routes_raw, geometry = network["routes"], network["geometry"]
+        if stops is not None:
+            reused = "routes" if routes_raw is not None else "stops"
+
+    # 2-4. The road graph loads while demand and stops are generated; routes
+    #      wait for both (see core.stage_graph)
+    params = req.parameters
+    snap_demand_m = float(params.get("snap_demand_m", 0))
+    heatmap_id = keys["stops"][:HEATMAP_ID_LEN]
+
+    def graph_stage():
+        graph = {"G": None, "landmarks": None, "snap_index": None}
+        with reporter.stage("graph"):
+            try:
+                G = load_compact_graph(polygon)
+                if G.num_nodes > 0:
+                    graph["snap_index"] = load_snap_index(polygon, G)
+                alt_count = get_config().alt_landmarks
+                if alt_count > 0 and G.num_nodes > 0:
+                    graph["landmarks"] = load_landmarks(polygon, G, alt_count)
+                graph["G"] = G
+            except Exception as e:
+                logger.warning("OSM network routing failed: %s", e)
+        return graph
+
+    def demand_stage(graph=None):
+        with reporter.stage("demand"):
+            demand = load_demand(params.get("demand_source"), boundary, polygon, sampling=sampling_options(params))
+            snap_index = graph["snap_index"] if graph is not None else None
+            if snap_index is not None:
+                demand = snap_demand(snap_index, demand, snap_demand_m)
+        return {"points": demand, "snapped": snap_index is not None}
+
+    def stops_stage(demand):
+        with reporter.stage("stops"):
+            stops = generate_bus_stops(
+                demand["points"],
+                area_km2=area,
+                min_stop_distance_m=float(params.get("min_stop_distance_m", 300)),
+                merge_close=bool(params.get("merge_close_stops", False)),
+            )
+        # Stops from unsnapped demand (graph unavailable) are not cached under a snapping key
+        if cache is not None and (snap_demand_m <= 0 or demand["snapped"]):
+            cache.put("stops", keys["stops"], stops)
+        return stops
+
+    def heatmap_stage(demand, stops):
+        store = get_heatmap_store()
+        # The id fingerprints demand and stops, so a stored source is already
+        # this one; replacing it would only throw away its rendered tiles
+        if store.exists(heatmap_id):
+            return heatmap_id
+        with span("heatmap.save"):
+            saved = store.put(heatmap_id, make_heatmap(demand["points"], stops=stops))
+        return heatmap_id if saved else None
+
+    def routes_stage(stops, graph):
+        with reporter.stage("routes"):
+            # We pass G down so build_routes can use real network paths
+            return build_routes(
+                stops, route_count, G=graph["G"], landmarks=graph["landmarks"],
+                time_budget_s=float(params.get("ordering_time_budget_ms", 50)) / 1000.0,
+                max_snap_distance_m=float(params.get("max_snap_distance_m", get_config().max_snap_distance_m)),
+                workers=get_config().route_workers,
+            )
+
+    def simplify_stage(routes, graph):
+        with reporter.stage("simplify"):
+            network = simplify_network(routes, float(params.get("path_tolerance_m", DEFAULT_TOLERANCE_M)))
+        # Straight-line fallbacks (no road graph) are not cached
+        if cache is not None and graph["G"] is not None:
+            cache.put("routes", keys["routes"], {"routes": network[0], "geometry": network[1]})
+        return network
+
+    tasks, done = [], {}
+    if routes_raw is not None:
+        reporter.skip("graph")
+    else:
+        tasks.append(Task("graph", graph_stage))
+    if stops is not None:
+        reporter.skip("demand")
+        reporter.skip("stops")
+        done["stops"] = stops
+        done["heatmap"] = heatmap_id if get_heatmap_store().exists(heatmap_id) else None
+    else:
+        tasks += [
+            # Demand snapped onto roads needs the graph first
+            Task("demand", demand_stage, ("graph",) if snap_demand_m > 0 else ()),
+            Task("stops", stops_stage, ("demand",)),
+            Task("heatmap", heatmap_stage, ("demand", "stops")),
+        ]
+    if routes_raw is not None:
+        reporter.skip("routes")
+        reporter.skip("simplify")
+        done["simplify"] = (routes_raw, geometry)
+    else:
+        tasks += [
+            Task("routes", routes_stage, ("stops", "graph")),
+            Task("simplify", simplify_stage, ("routes", "graph")),
+        ]
+    done = run_graph(tasks, done, concurrent=not profiling_active())
+    stops, heatmap_id = done["stops"], done["heatmap"]
+    routes_raw, geometry = done["simplify"]
+    G = done["graph"]["G"] if "graph" in done else None
+
+    return {
+        "stops": stops,
+        "routes": routes_raw,
+        "geometry": geometry,
+        "polygon": polygon,
+        "keys": keys,
+        "reused": reused,
+        "road_graph": G is not None or reused == "routes",
+        "heatmap_id": heatmap_id,
+    }
+
+
+def heatmap_info(heatmap_id):
+    """Response block pointing the client at the heatmap tile endpoint."""
+    if heatmap_id is None:
+        return None
+    return {
+        "id": heatmap_id,
+        "layers": list(HEATMAP_LAYERS),
+        "tiles": f"/heatmap/{heatmap_id}/{{layer}}/{{z}}/{{x}}/{{y}}.png",
+    }
+
+
+def measure_coverage(polygon, routes_raw, parameters) -> dict:
+    """Stop / corridor coverage of the service polygon at the request's walk distance."""
+    with span("metrics.coverage"):
+        return network_coverage(polygon, routes_raw, float(parameters.get("max_walk_distance_m", 500)))
+
+
+def evaluate_network(routes_raw, num_buses, avg_speed_kmph, parameters, reporter: StageReporter = None,
+                     polygon=None, coverage=None):
+    """
+    Stages frequency and metrics for a built network: returns (routes, metrics).
+
+    Coverage is measured against `polygon` unless a precomputed `coverage`
+    (from measure_coverage) is passed; with neither it is estimated.
+    """
+    reporter = reporter or StageReporter()
+    with reporter.stage("frequency"):
+        routes = calculate_frequency(routes_raw, num_buses, avg_speed_kmph)
+
+    with reporter.stage("metrics"):
+        if coverage is None and polygon is not None and routes_raw:
+            coverage = measure_coverage(polygon, routes_raw, parameters)
+        metrics = compute_metrics(routes, parameters, coverage)
+    return routes, metrics
+
+
+def _run_stages(req: OptimizeRequest, reporter: StageReporter, cache) -> dict:
+    network = build_network(req, reporter, cache)
+
+    # 5. scheduling & analytics
+    routes, metrics = evaluate_network(
+        network["routes"], req.num_buses, req.avg_speed_kmph, req.parameters, reporter, polygon=network["polygon"],
+    )
+
+    result = {
+        "status":"completed",
+        "city":req.city_name,
+        "stops":network["stops"],
+        "routes":routes,
+        "metrics":metrics,
+        "geometry":network["geometry"],
+        "heatmap":heatmap_info(network["heatmap_id"]),
+    }
+    if cache is not None and network["road_graph"]:
+        cache.put("result", network["keys"]["result"], result)
+    return {**result, "cache": network["reused"]}
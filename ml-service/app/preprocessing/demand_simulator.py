@@ -1,35 +1,32 @@
-import math
+import numpy as np
+
+# One row per demand point; weight is the relative trip demand at that point
+DEMAND_DTYPE = np.dtype([("lat", np.float64), ("lng", np.float64), ("weight", np.float64)])
+
 
 def simulate_demand(points):
     """
     Urban Gravity Model: assigns demand weights using spatial distance falloff 
     from the geographic centroid (simulates urban core density patterns).
     Points closer to the center get exponentially higher demand.
-    """
-    if not points:
-        return []
 
-    # Compute geographic centroid
-    lat_c = sum(p[0] for p in points) / len(points)
-    lng_c = sum(p[1] for p in points) / len(points)
-
-    # Compute max distance for normalization
-    def dist(p):
-        return math.sqrt((p[0] - lat_c)**2 + (p[1] - lng_c)**2)
-
-    max_d = max(dist(p) for p in points) or 1.0
+    Returns a DEMAND_DTYPE structured array (lat, lng, weight), one row per
+    input point, so downstream stages weight points instead of repeating them.
+    """
+    demand = np.zeros(len(points), dtype=DEMAND_DTYPE)
+    if len(points) == 0:
+        return demand
 
-    weighted = []
-    for p in points:
-        d = dist(p)
-        # Gravity falloff: weight = e^(-2 * normalized_distance)
-        # Results in ~7x more demand at center vs boundary
-        normalized = d / max_d
-        gravity_weight = math.exp(-2.5 * normalized)
+    arr = np.asarray(points, dtype=np.float64)  # shape: (N, 2) = [(lat, lng), ...]
+    demand["lat"] = arr[:, 0]
+    demand["lng"] = arr[:, 1]
 
-        # Convert to integer repetitions (1 to 10 scale)
-        repeat = max(1, round(gravity_weight * 10))
-        for _ in range(repeat):
-            weighted.append(p)
+    # Distance from geographic centroid, normalized by the farthest point
+    centroid = arr.mean(axis=0)
+    dists = np.linalg.norm(arr - centroid, axis=1)
+    max_d = dists.max() or 1.0
 
-    return weighted
\ No newline at end of file
+    # Gravity falloff: weight = e^(-2.5 * normalized_distance)
+    # Results in ~12x more demand at center vs boundary
+    demand["weight"] = np.exp(-2.5 * (dists / max_d))
+    return demand
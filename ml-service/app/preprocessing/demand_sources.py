@@ -0,0 +1,238 @@
+"""Named demand sources: synthetic gravity demand or local population rasters.
+
+A request picks one with parameters["demand_source"]:
+- "synthetic" (default): generate_grid + simulate_demand, with the
+  sampling options of sampling_options();
+- any other name: the raster described by Config.demand_dir/<name>.json.
+
+The JSON header points at the raster and describes its grid:
+
+    {"path": "ind_ppp_2020.bin",            # relative to the header
+     "format": "raw",                       # raw | npy | geotiff (default from suffix)
+     "dtype": "<f4", "shape": [rows, cols], "offset": 0,   # raw only
+     "geotransform": [west, cell_w, 0, north, 0, -cell_h], # raw / npy (GDAL order)
+     "nodata": -99999, "weight_scale": 1.0}
+
+raw and npy rasters are read through numpy.memmap, GeoTIFFs with windowed
+rasterio reads (optional dependency). Only the window covering the polygon's
+bounding box is read, about STRIP_CELLS source cells at a time, each strip
+through its own short-lived mapping. A window larger
+than max_cells is block-summed by an integer factor so the output stays
+below it, so memory follows the request area (and max_cells), not the size
+of the raster. Cells whose centre falls outside the polygon, nodata and
+non-positive cells are dropped.
+
+Cached stops and results are keyed on the source name, so a re-exported
+raster should get a new name (or the result cache be cleared).
+"""
+import json
+import math
+import re
+
+import numpy as np
+
+from app.core.config import get_config
+from app.core.telemetry import span
+from app.preprocessing.demand_simulator import DEMAND_DTYPE, simulate_demand
+from app.preprocessing.grid_generator import METHODS, generate_grid
+
+SYNTHETIC = "synthetic"
+# Source cells read per strip (before block-summing)
+STRIP_CELLS = 4_000_000
+_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+
+
+class DemandSourceError(ValueError):
+    """Unknown or unreadable demand source."""
+
+
+def _int_param(params: dict, name: str, default, minimum: int):
+    value = params.get(name, default)
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError
+        number = int(value)
+    except (TypeError, ValueError):
+        raise DemandSourceError(f"{name} must be an integer, got {value!r}") from None
+    if number < minimum:
+        raise DemandSourceError(f"{name} must be at least {minimum}, got {number}")
+    return number
+
+
+def sampling_options(params: dict) -> dict:
+    """generate_grid keyword arguments from request parameters (demand_samples, sampling_method, sampling_seed)."""
+    method = params.get("sampling_method", "halton")
+    if method not in METHODS:
+        raise DemandSourceError(f"unknown sampling method {method!r}; expected one of {METHODS}")
+    return {
+        "samples": _int_param(params, "demand_samples", None, 1),
+        "method": method,
+        "seed": _int_param(params, "sampling_seed", 0, 0),
+    }
+
+
+def list_sources() -> list:
+    """Names accepted by load_demand: "synthetic" plus every header in Config.demand_dir."""
+    demand_dir = get_config().demand_dir
+    names = sorted(p.stem for p in demand_dir.glob("*.json")) if demand_dir.is_dir() else []
+    return [SYNTHETIC] + names
+
+
+def read_header(name: str) -> dict:
+    """Parse Config.demand_dir/<name>.json; "path" is resolved against the header's directory."""
+    if not _NAME.fullmatch(name) or ".." in name:
+        raise DemandSourceError(f"invalid demand source name {name!r}")
+    path = get_config().demand_dir / f"{name}.json"
+    if not path.is_file():
+        raise DemandSourceError(f"unknown demand source {name!r}")
+    try:
+        header = json.loads(path.read_text())
+        header["path"] = path.parent / header["path"]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise DemandSourceError(f"demand source {name!r} has an unreadable header: {e}") from e
+    header.setdefault("format", {".npy": "npy", ".tif": "geotiff", ".tiff": "geotiff"}.get(header["path"].suffix.lower(), "raw"))
+    return header
+
+
+class _Raster:
+    """Row/column window reads over one raster file (raw, npy or GeoTIFF)."""
+
+    def __init__(self, header: dict):
+        fmt = header["format"]
+        self.path = header["path"]
+        self.nodata = header.get("nodata")
+        self._dataset = None
+        if fmt == "raw":
+            self.dtype = np.dtype(header["dtype"])
+            self.shape = tuple(header["shape"])
+            self.offset = int(header.get("offset", 0))
+        elif fmt == "npy":
+            array = np.load(self.path, mmap_mode="r")
+            if array.ndim != 2 or not array.flags.c_contiguous:
+                raise DemandSourceError(f"raster {self.path.name} is not a 2-D C-ordered array")
+            self.dtype, self.shape, self.offset = array.dtype, array.shape, array.offset
+            del array
+        elif fmt == "geotiff":
+            try:
+                import rasterio
+            except ImportError as e:
+                raise DemandSourceError("GeoTIFF demand sources need rasterio installed") from e
+            self._dataset = rasterio.open(self.path)
+            self.shape = (self._dataset.height, self._dataset.width)
+            if self.nodata is None:
+                self.nodata = self._dataset.nodata
+        else:
+            raise DemandSourceError(f"unsupported raster format {fmt!r}")
+
+        if self._dataset is not None and not header.get("geotransform"):
+            self.geotransform = tuple(self._dataset.transform.to_gdal())
+        else:
+            self.geotransform = tuple(header["geotransform"])
+        if self.geotransform[2] or self.geotransform[4]:
+            raise DemandSourceError("rotated rasters are not supported")
+
+    def read(self, r0, r1, c0, c1) -> np.ndarray:
+        """Copy of rows r0:r1, columns c0:c1 as float64."""
+        if self._dataset is not None:
+            from rasterio.windows import Window
+
+            return self._dataset.read(1, window=Window(c0, r0, c1 - c0, r1 - r0)).astype(np.float64)
+        # Map just these rows and drop the mapping afterwards: pages touched
+        # through one long-lived map would stay resident for the whole read
+        rows = np.memmap(
+            self.path, dtype=self.dtype, mode="r", shape=(r1 - r0, self.shape[1]),
+            offset=self.offset + r0 * self.shape[1] * self.dtype.itemsize,
+        )
+        try:
+            return np.array(rows[:, c0:c1], dtype=np.float64)
+        finally:
+            del rows
+
+    def close(self):
+        if self._dataset is not None:
+            self._dataset.close()
+
+
+def _window(geotransform, shape, bounds):
+    """(r0, r1, c0, c1) of the cells overlapping bounds = (west, south, east, north), clipped to the raster."""
+    x0, dx, _, y0, _, dy = geotransform
+    west, south, east, north = bounds
+    cols = sorted(((west - x0) / dx, (east - x0) / dx))
+    rows = sorted(((north - y0) / dy, (south - y0) / dy))
+    r0, r1 = max(0, math.floor(rows[0])), min(shape[0], math.ceil(rows[1]))
+    c0, c1 = max(0, math.floor(cols[0])), min(shape[1], math.ceil(cols[1]))
+    return r0, max(r0, r1), c0, max(c0, c1)
+
+
+def _block_sum(values: np.ndarray, factor: int) -> np.ndarray:
+    rows, cols = values.shape
+    pad_r, pad_c = -rows % factor, -cols % factor
+    if pad_r or pad_c:
+        values = np.pad(values, ((0, pad_r), (0, pad_c)))
+    return values.reshape(values.shape[0] // factor, factor, values.shape[1] // factor, factor).sum(axis=(1, 3))
+
+
+def raster_demand(header: dict, polygon, max_cells: int) -> np.ndarray:
+    """DEMAND_DTYPE cells of the raster inside polygon, at most about max_cells of them."""
+    import shapely
+
+    raster = _Raster(header)
+    try:
+        x0, dx, _, y0, _, dy = raster.geotransform
+        r0, r1, c0, c1 = _window(raster.geotransform, raster.shape, polygon.bounds)
+        width = c1 - c0
+        if r1 <= r0 or width <= 0:
+            return np.zeros(0, dtype=DEMAND_DTYPE)
+        factor = max(1, math.ceil(math.sqrt((r1 - r0) * width / max(1, max_cells))))
+        # Source rows per strip: whole blocks, about STRIP_CELLS cells
+        batch = max(1, STRIP_CELLS // (width * factor)) * factor
+        col_mid = (np.arange(c0, c1, factor) + np.minimum(np.arange(c0, c1, factor) + factor, c1)) / 2.0
+        lng_cols = x0 + col_mid * dx
+        shapely.prepare(polygon)
+        scale = float(header.get("weight_scale", 1.0))
+
+        parts = []
+        for start in range(r0, r1, batch):
+            stop = min(r1, start + batch)
+            values = raster.read(start, stop, c0, c1)
+            invalid = ~np.isfinite(values) | (values <= 0)
+            if raster.nodata is not None:
+                invalid |= values == raster.nodata
+            values[invalid] = 0.0
+            weights = _block_sum(values, factor) if factor > 1 else values
+
+            row_starts = np.arange(start, stop, factor)
+            lat_rows = y0 + (row_starts + np.minimum(row_starts + factor, stop)) / 2.0 * dy
+            lng, lat = np.meshgrid(lng_cols, lat_rows)
+            keep = (weights > 0) & shapely.contains_xy(polygon, lng, lat)
+            part = np.zeros(int(keep.sum()), dtype=DEMAND_DTYPE)
+            part["lat"], part["lng"], part["weight"] = lat[keep], lng[keep], weights[keep] * scale
+            parts.append(part)
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=DEMAND_DTYPE)
+    finally:
+        raster.close()
+
+
+def load_demand(name: str, boundary, polygon, max_cells: int = None, sampling: dict = None) -> np.ndarray:
+    """
+    Demand cells (DEMAND_DTYPE) of the named source over the request area.
+    sampling: generate_grid keyword arguments for the synthetic source.
+    """
+    name = name or SYNTHETIC
+    if name == SYNTHETIC:
+        try:
+            grid = generate_grid(boundary, polygon=polygon, **(sampling or {}))
+        except ValueError as e:
+            raise DemandSourceError(str(e)) from e
+        return simulate_demand(grid)
+    header = read_header(name)
+    max_cells = get_config().demand_max_cells if max_cells is None else max_cells
+    with span("demand.raster"):
+        try:
+            return raster_demand(header, polygon, max_cells)
+        except DemandSourceError:
+            raise
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            raise DemandSourceError(f"demand source {name!r} is unreadable: {e}") from e
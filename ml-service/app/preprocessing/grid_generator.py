@@ -1,18 +1,89 @@
-import random
+"""Synthetic demand sample points inside the request polygon.
+
+generate_grid draws a low-discrepancy (or regular / random) point set over
+the polygon's bounding box in one vectorized call, and keeps the points
+inside the polygon (shapely.contains_xy). The bbox draw is enlarged by the
+polygon's fill ratio, so about `samples` points land inside, even for
+concave or diagonal boundaries. Draws are seeded, so the same request
+always gives the same points (and can be cached).
+"""
+import math
+
+import numpy as np
+import shapely
+
+from app.preprocessing.polygon_processor import coords_to_polygon
+from app.preprocessing.spatial_utils import estimate_area_km2
+
+METHODS = ("halton", "sobol", "grid", "random")
+# Adaptive density when samples is None: points per km², clamped
+POINTS_PER_KM2 = 25
+MIN_SAMPLES = 400
+MAX_SAMPLES = 10_000
+# Upper bound on bbox draws for very thin polygons
+MAX_DRAWS = 1_000_000
 
-def generate_grid(boundary, samples=400):
-    if not boundary:
-        return []
 
-    lat_max = max(p["lat"] for p in boundary)
-    lat_min = min(p["lat"] for p in boundary)
-    lng_max = max(p["lng"] for p in boundary)
-    lng_min = min(p["lng"] for p in boundary)
+def _radical_inverse(n: int, base: int) -> np.ndarray:
+    """Van der Corput sequence 1..n in `base`."""
+    idx = np.arange(1, n + 1)
+    out = np.zeros(n)
+    scale = 1.0 / base
+    while idx.any():
+        idx, digit = np.divmod(idx, base)
+        out += digit * scale
+        scale /= base
+    return out
 
-    points = []
-    for _ in range(samples):
-        lat = random.uniform(lat_min, lat_max)
-        lng = random.uniform(lng_min, lng_max)
-        points.append([lat, lng])
 
-    return points
\ No newline at end of file
+def unit_points(n: int, method: str = "halton", seed: int = 0, aspect: float = 1.0) -> np.ndarray:
+    """
+    n points in the unit square, shape (n, 2). Halton and grid are shifted
+    by a seeded random offset (mod 1); aspect (width / height) shapes the
+    grid's columns and rows.
+    """
+    rng = np.random.default_rng(seed)
+    if method == "random":
+        return rng.random((n, 2))
+    if method == "sobol":
+        from scipy.stats import qmc
+
+        return qmc.Sobol(d=2, scramble=True, seed=rng).random_base2(max(0, math.ceil(math.log2(max(n, 1)))))[:n]
+    if method == "halton":
+        pts = np.column_stack([_radical_inverse(n, 2), _radical_inverse(n, 3)])
+    elif method == "grid":
+        cols = max(1, round(math.sqrt(n * aspect)))
+        rows = max(1, math.ceil(n / cols))
+        ys, xs = np.divmod(np.arange(rows * cols), cols)
+        pts = np.column_stack([(xs + 0.5) / cols, (ys + 0.5) / rows])
+    else:
+        raise ValueError(f"unknown sampling method {method!r}; expected one of {METHODS}")
+    return (pts + rng.random(2)) % 1.0
+
+
+def generate_grid(boundary, samples=None, method="halton", seed=0, polygon=None):
+    """
+    About `samples` points inside the boundary polygon, as an (N, 2) array
+    of [lat, lng]. samples=None scales with the area (POINTS_PER_KM2,
+    clamped to MIN_SAMPLES..MAX_SAMPLES); method is one of METHODS.
+    """
+    if not boundary:
+        return np.zeros((0, 2))
+    polygon = coords_to_polygon(boundary) if polygon is None else polygon
+    if not polygon.is_valid:
+        polygon = polygon.buffer(0)
+    west, south, east, north = polygon.bounds
+    bbox_area = (east - west) * (north - south)
+    if bbox_area <= 0 or polygon.area <= 0:
+        return np.zeros((0, 2))
+    if samples is None:
+        samples = min(MAX_SAMPLES, max(MIN_SAMPLES, int(estimate_area_km2(boundary) * POINTS_PER_KM2)))
+
+    draws = min(MAX_DRAWS, math.ceil(samples * bbox_area / polygon.area))
+    aspect = (east - west) * math.cos(math.radians((south + north) / 2)) / (north - south)
+    unit = unit_points(draws, method, seed, aspect)
+    lng = west + unit[:, 0] * (east - west)
+    lat = south + unit[:, 1] * (north - south)
+    shapely.prepare(polygon)
+    inside = shapely.contains_xy(polygon, lng, lat)
+    return np.column_stack([lat[inside], lng[inside]])
@@ -10,8 +10,32 @@ def coords_to_polygon(boundary: List[dict]) -> Polygon:
 from typing import List, Tuple
 
 
-def normalize_polygon(coords: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
-    """Return coordinates in a normalized order (placeholder)."""
-    if not coords:
-        return []
-    return coords
+# Rounding applied by normalize_polygon (6 decimals of a degree ≈ 0.1 m)
+COORD_DIGITS = 6
+
+
+def normalize_polygon(coords: List[Tuple[float, float]], ndigits: int = COORD_DIGITS) -> List[Tuple[float, float]]:
+    """
+    Canonical form of a polygon ring: the same shape always gives the same list.
+
+    Coordinates are rounded to `ndigits`, the closing point and repeated
+    vertices are dropped, the ring is oriented counter-clockwise and rotated
+    to start at its smallest vertex.
+    """
+    ring = []
+    for x, y in coords:
+        p = (round(float(x), ndigits), round(float(y), ndigits))
+        if not ring or ring[-1] != p:
+            ring.append(p)
+    while len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        return ring
+
+    # Shoelace signed area: negative means clockwise
+    area2 = sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))
+    if area2 < 0:
+        ring.reverse()
+
+    start = ring.index(min(ring))
+    return ring[start:] + ring[:start]
@@ -1,6 +1,10 @@
 import math
 from math import sqrt
 
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
 def estimate_area_km2(boundary):
     """
     Computes the true geodesic area of the polygon using the Shoelace formula
@@ -37,12 +41,61 @@ def compute_centroid(boundary):
     return {"lat": lat, "lng": lng}
 
 
+def stop_coords(stops):
+    """Split [{lat, lng}, ...] into float64 (lat, lng) arrays."""
+    lat = np.fromiter((s["lat"] for s in stops), dtype=np.float64, count=len(stops))
+    lng = np.fromiter((s["lng"] for s in stops), dtype=np.float64, count=len(stops))
+    return lat, lng
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    """Broadcasting haversine on radian arrays, in km."""
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def haversine_one_to_many_km(lat0, lng0, lat, lng):
+    """Distance in km from one point (degrees) to each of lat/lng (degree arrays)."""
+    return _haversine(
+        math.radians(lat0), math.radians(lng0),
+        np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lng, dtype=np.float64)),
+    )
+
+
+def haversine_pairwise_km(lat, lng):
+    """Symmetric NxN distance matrix in km for degree arrays lat/lng."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    # Angle-difference identities keep the trig calls O(n); only products are O(n²)
+    s_lat, c_lat = np.sin(lat / 2), np.cos(lat / 2)
+    s_lng, c_lng = np.sin(lng / 2), np.cos(lng / 2)
+    cos_lat = np.cos(lat)
+
+    h = np.multiply.outer(s_lat, c_lat)
+    h -= np.multiply.outer(c_lat, s_lat)
+    h *= h
+    t = np.multiply.outer(s_lng, c_lng)
+    t -= np.multiply.outer(c_lng, s_lng)
+    t *= t
+    t *= np.multiply.outer(cos_lat, cos_lat)
+    h += t
+    np.clip(h, 0.0, 1.0, out=h)
+    np.sqrt(h, out=h)
+    np.arcsin(h, out=h)
+    h *= 2 * EARTH_RADIUS_KM
+    return h
+
+
+def path_cumulative_km(lat, lng):
+    """Cumulative distance in km along a polyline; element 0 is 0.0."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    out = np.zeros(len(lat))
+    if len(lat) > 1:
+        np.cumsum(_haversine(lat[:-1], lng[:-1], lat[1:], lng[1:]), out=out[1:])
+    return out
+
+
 def stop_distance_km(a, b):
     """Haversine distance between two stops in km."""
-    import math
-    R = 6371.0
-    lat1, lat2 = math.radians(a["lat"]), math.radians(b["lat"])
-    dlat = lat2 - lat1
-    dlng = math.radians(b["lng"] - a["lng"])
-    h = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-    return R * 2 * math.asin(math.sqrt(h))
\ No newline at end of file
+    return float(haversine_one_to_many_km(a["lat"], a["lng"], b["lat"], b["lng"]))
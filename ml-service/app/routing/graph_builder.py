@@ -1,6 +1,177 @@
-"""Graph builder utilities for routing."""
+"""Graph builder utilities for routing.
 
+The road network is kept as a ``CompactGraph``: flat node coordinate arrays
+plus a CSR adjacency weighted by edge length in meters. It is much cheaper to
+store, load and clip than an OSMnx ``MultiDiGraph``.
+"""
+from dataclasses import dataclass
 
-def build_graph(osm_data):
-    """Build a routing graph from OSM data (placeholder)."""
-    return {"nodes": [], "edges": []}
+import numpy as np
+
+
+@dataclass
+class CompactGraph:
+    """Directed road graph in CSR form.
+
+    node_ids: OSM node id per node index (int64)
+    x, y:     lng / lat per node index (float64)
+    indptr, indices, length_m: CSR adjacency, one entry per directed edge
+    """
+    node_ids: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    length_m: np.ndarray
+
+    @property
+    def num_nodes(self) -> int:
+        return int(self.node_ids.shape[0])
+
+    @property
+    def num_edges(self) -> int:
+        return int(self.indices.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in self.arrays().values()))
+
+    @property
+    def bounds(self):
+        """(west, south, east, north) of the node extent."""
+        if self.num_nodes == 0:
+            return (0.0, 0.0, 0.0, 0.0)
+        return (float(self.x.min()), float(self.y.min()), float(self.x.max()), float(self.y.max()))
+
+    def arrays(self) -> dict:
+        return {
+            "node_ids": self.node_ids,
+            "x": self.x,
+            "y": self.y,
+            "indptr": self.indptr,
+            "indices": self.indices,
+            "length_m": self.length_m,
+        }
+
+    def to_csr(self):
+        """Return the adjacency as a scipy.sparse CSR matrix (no copy)."""
+        from scipy.sparse import csr_matrix
+
+        n = self.num_nodes
+        return csr_matrix((self.length_m, self.indices, self.indptr), shape=(n, n))
+
+    def edge_length_m(self, u, v) -> np.ndarray:
+        """Length in meters of each directed edge u[i] -> v[i] (nan where there is no such edge)."""
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        out = np.full(len(u), np.nan)
+        if len(u) == 0 or self.num_edges == 0:
+            return out
+        n = self.num_nodes
+        keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr)) * n + self.indices
+        lengths = self.length_m
+        if np.any(keys[1:] < keys[:-1]):  # rows not sorted by target
+            order = np.argsort(keys, kind="stable")
+            keys, lengths = keys[order], lengths[order]
+        valid = (u >= 0) & (v >= 0)
+        query = u[valid] * n + v[valid]
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        found = keys[pos] == query
+        out[np.flatnonzero(valid)[found]] = lengths[pos[found]]
+        return out
+
+    def clip(self, bbox) -> "CompactGraph":
+        """Return the subgraph of nodes inside bbox = (west, south, east, north)."""
+        west, south, east, north = bbox
+        keep = (self.x >= west) & (self.x <= east) & (self.y >= south) & (self.y <= north)
+        return self.subgraph(np.flatnonzero(keep), bbox)
+
+    def subgraph(self, idx, bbox=None) -> "CompactGraph":
+        """Return the subgraph induced by node indices idx (sorted)."""
+        sub = self.to_csr()[idx][:, idx].tocsr()
+        sub.sort_indices()
+        clipped = CompactGraph(
+            node_ids=self.node_ids[idx],
+            x=self.x[idx],
+            y=self.y[idx],
+            indptr=sub.indptr.astype(np.int64),
+            indices=sub.indices.astype(np.int32),
+            length_m=sub.data.astype(np.float32),
+        )
+        # (original graph, node indices in it, bbox): clips of clips point at
+        # the original, so indexes built for it can be sliced for any clip
+        root, base, _ = self.clip_source
+        clipped._clip_source = (root, idx if base is None else base[idx], None if bbox is None else tuple(bbox))
+        return clipped
+
+    @property
+    def clip_source(self):
+        """(graph this one was clipped from, node indices in it, clip bbox), or (self, None, None)."""
+        return getattr(self, "_clip_source", (self, None, None))
+
+    def to_networkx(self):
+        """Rebuild an OSMnx-compatible MultiDiGraph (node x/y, edge length)."""
+        import networkx as nx
+
+        G = nx.MultiDiGraph(crs="epsg:4326")
+        ids = self.node_ids.tolist()
+        G.add_nodes_from(
+            (nid, {"x": float(x), "y": float(y)})
+            for nid, x, y in zip(ids, self.x.tolist(), self.y.tolist())
+        )
+        src = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        G.add_edges_from(
+            (ids[u], ids[v], {"length": float(w)})
+            for u, v, w in zip(src.tolist(), self.indices.tolist(), self.length_m.tolist())
+        )
+        return G
+
+
+def from_edge_arrays(node_ids, x, y, u, v, length_m) -> CompactGraph:
+    """Build a CompactGraph from parallel edge arrays of node indices.
+
+    Parallel edges are collapsed to the shortest one, since routing only ever
+    uses the minimum-length edge between two nodes.
+    """
+    n = len(node_ids)
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    w = np.asarray(length_m, dtype=np.float64)
+
+    # Zero-length edges would disappear from a sparse matrix; keep them routable
+    w = np.maximum(w, 1e-3)
+
+    order = np.lexsort((w, v, u))
+    u, v, w = u[order], v[order], w[order]
+    if len(u):
+        first = np.ones(len(u), dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v, w = u[first], v[first], w[first]
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u, minlength=n), out=indptr[1:])
+
+    return CompactGraph(
+        node_ids=np.asarray(node_ids, dtype=np.int64),
+        x=np.asarray(x, dtype=np.float64),
+        y=np.asarray(y, dtype=np.float64),
+        indptr=indptr,
+        indices=v.astype(np.int32),
+        length_m=w.astype(np.float32),
+    )
+
+
+def build_graph(G) -> CompactGraph:
+    """Build a CompactGraph from an OSMnx MultiDiGraph (node x/y, edge length)."""
+    node_ids = list(G.nodes)
+    pos = {nid: i for i, nid in enumerate(node_ids)}
+    x = [G.nodes[nid]["x"] for nid in node_ids]
+    y = [G.nodes[nid]["y"] for nid in node_ids]
+
+    u, v, w = [], [], []
+    for a, b, length in G.edges(data="length", default=0.0):
+        u.append(pos[a])
+        v.append(pos[b])
+        w.append(length)
+
+    return from_edge_arrays(node_ids, x, y, u, v, w)
@@ -0,0 +1,272 @@
+"""Persistent store of simplified road graphs keyed by bbox tile.
+
+Each graph is saved as an uncompressed ``.npz`` of CompactGraph arrays under
+``Config.graph_dir``. Requests are snapped outward to a tile grid so that
+nearby boundaries share an entry, and any stored graph whose bbox covers the
+request is clipped instead of downloading again. Entries are evicted least
+recently used first once the on-disk size budget is exceeded.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from app.core.logging import get_logger
+from app.routing.graph_builder import CompactGraph
+
+logger = get_logger("routing.graph_store")
+
+# Tile size in degrees (~1.1 km of latitude)
+TILE_DEG = 0.01
+
+INDEX_FILE = "index.json"
+# Cache hits only refresh last_used; the index is rewritten for them at most this often
+INDEX_FLUSH_S = 30.0
+
+
+def snap_bbox(bbox, tile_deg: float = TILE_DEG):
+    """Expand (west, south, east, north) outward to the tile grid."""
+    west, south, east, north = bbox
+    return (
+        round(math.floor(west / tile_deg) * tile_deg, 6),
+        round(math.floor(south / tile_deg) * tile_deg, 6),
+        round(math.ceil(east / tile_deg) * tile_deg, 6),
+        round(math.ceil(north / tile_deg) * tile_deg, 6),
+    )
+
+
+def bbox_key(bbox, network_type: str = "drive") -> str:
+    """Stable hash of a bbox and network type."""
+    raw = f"{network_type}:" + ",".join(f"{v:.6f}" for v in bbox)
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def bbox_covers(outer, inner) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def _bbox_area(b) -> float:
+    return (b[2] - b[0]) * (b[3] - b[1])
+
+
+class GraphStore:
+    """LRU graph store with an on-disk tier and a small in-memory tier.
+
+    If ``root`` cannot be created the store degrades to memory only.
+    """
+
+    def __init__(self, root, max_bytes: int, memory_items: int = 4):
+        self.root = Path(root) if root is not None else None
+        self.max_bytes = int(max_bytes)
+        self.memory_items = int(memory_items)
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._index = {}
+        self._index_dirty = False
+        self._index_written = 0.0
+
+        if self.root is not None:
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self._index = self._read_index()
+            except OSError as e:
+                logger.warning("Graph store disabled on disk (%s): %s", self.root, e)
+                self.root = None
+
+    # ── public API ──
+
+    def get(self, bbox, network_type: str = "drive"):
+        """
+        Return a graph covering bbox, clipped to it, or None on a miss.
+        Stored graphs carry their entry's bbox as graph.store_bbox; clips
+        reach theirs through graph.clip_source.
+        """
+        with self._lock:
+            key = bbox_key(bbox, network_type)
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key][0]
+
+            candidates = [
+                (k, e) for k, e in self._index.items()
+                if e.get("kind", "graph") == "graph"
+                and e["network_type"] == network_type and bbox_covers(e["bbox"], bbox)
+            ]
+            mem_hits = [
+                (k, e) for k, e in self._memory_entries()
+                if e["network_type"] == network_type and bbox_covers(e["bbox"], bbox)
+            ]
+            if not candidates and not mem_hits:
+                return None
+
+            # Smallest covering graph is the cheapest to clip
+            k, entry = min(candidates + mem_hits, key=lambda ke: _bbox_area(ke[1]["bbox"]))
+            graph = self._load(k)
+            if graph is None:
+                return None
+            if tuple(entry["bbox"]) != tuple(bbox):
+                graph = graph.clip(bbox)
+                self._remember(key, graph, {"bbox": list(bbox), "network_type": network_type})
+            return graph
+
+    def put(self, bbox, graph: CompactGraph, network_type: str = "drive") -> str:
+        """Store graph under bbox and evict old entries past the size budget."""
+        with self._lock:
+            key = bbox_key(bbox, network_type)
+            entry = {"bbox": list(bbox), "network_type": network_type}
+            graph.store_bbox = tuple(bbox)
+            self._remember(key, graph, entry)
+
+            if self.root is None:
+                return key
+            try:
+                path = self.root / f"{key}.npz"
+                tmp = self.root / f"{key}.tmp.npz"
+                np.savez(tmp, **graph.arrays())
+                os.replace(tmp, path)
+                entry.update({"bytes": path.stat().st_size, "last_used": time.time()})
+                self._index[key] = entry
+                self._evict(keep=key)
+                self._write_index()
+            except OSError as e:
+                logger.warning("Graph store write failed for %s: %s", key, e)
+            return key
+
+    def get_aux(self, bbox, name: str, network_type: str = "drive"):
+        """Return arrays stored next to the graph for bbox (e.g. a routing index), or None."""
+        with self._lock:
+            key = f"{bbox_key(bbox, network_type)}.{name}"
+            if self.root is None or key not in self._index:
+                return None
+            try:
+                with np.load(self.root / f"{key}.npz") as data:
+                    arrays = {k: data[k] for k in data.files}
+            except (OSError, ValueError) as e:
+                logger.warning("Graph store entry %s unreadable, dropping: %s", key, e)
+                self._drop(key)
+                self._write_index()
+                return None
+            self._touch(key)
+            return arrays
+
+    def put_aux(self, bbox, name: str, arrays: dict, network_type: str = "drive"):
+        """Persist auxiliary arrays for the graph at bbox under the same LRU budget."""
+        with self._lock:
+            key = f"{bbox_key(bbox, network_type)}.{name}"
+            if self.root is None:
+                return key
+            try:
+                path = self.root / f"{key}.npz"
+                tmp = self.root / f"{key}.tmp.npz"
+                np.savez(tmp, **arrays)
+                os.replace(tmp, path)
+                self._index[key] = {
+                    "bbox": list(bbox), "network_type": network_type, "kind": name,
+                    "bytes": path.stat().st_size, "last_used": time.time(),
+                }
+                self._evict(keep=key)
+                self._write_index()
+            except OSError as e:
+                logger.warning("Graph store write failed for %s: %s", key, e)
+            return key
+
+    def flush(self):
+        """Write pending last_used updates to the index file."""
+        with self._lock:
+            if self.root is not None and self._index_dirty:
+                self._write_index()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._drop(key)
+            self._memory.clear()
+            if self.root is not None:
+                self._write_index()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(e["bytes"] for e in self._index.values())
+
+    # ── internals ──
+
+    def _memory_entries(self):
+        for key, (_, entry) in self._memory.items():
+            yield key, entry
+
+    def _remember(self, key, graph, entry):
+        self._memory[key] = (graph, entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _load(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            graph = self._memory[key][0]
+        else:
+            try:
+                with np.load(self.root / f"{key}.npz") as data:
+                    graph = CompactGraph(**{name: data[name] for name in data.files})
+                graph.store_bbox = tuple(self._index[key]["bbox"])
+            except (OSError, KeyError, ValueError) as e:
+                logger.warning("Graph store entry %s unreadable, dropping: %s", key, e)
+                self._drop(key)
+                self._write_index()
+                return None
+            self._remember(key, graph, {
+                "bbox": self._index[key]["bbox"],
+                "network_type": self._index[key]["network_type"],
+            })
+
+        if key in self._index:
+            self._touch(key)
+        return graph
+
+    def _touch(self, key):
+        self._index[key]["last_used"] = time.time()
+        self._index_dirty = True
+        if time.monotonic() - self._index_written >= INDEX_FLUSH_S:
+            self._write_index()
+
+    def _evict(self, keep=None):
+        total = self.total_bytes
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._index[key]["bytes"]
+            self._drop(key)
+
+    def _drop(self, key):
+        self._index.pop(key, None)
+        try:
+            (self.root / f"{key}.npz").unlink()
+        except OSError:
+            pass
+
+    def _read_index(self) -> dict:
+        path = self.root / INDEX_FILE
+        if not path.exists():
+            return {}
+        try:
+            index = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return {}
+        # Forget entries whose file has gone missing
+        return {k: e for k, e in index.items() if (self.root / f"{k}.npz").exists()}
+
+    def _write_index(self):
+        path = self.root / INDEX_FILE
+        tmp = self.root / (INDEX_FILE + ".tmp")
+        tmp.write_text(json.dumps(self._index))
+        os.replace(tmp, path)
+        self._index_dirty = False
+        self._index_written = time.monotonic()
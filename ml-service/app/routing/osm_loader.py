@@ -1,10 +1,44 @@
-import osmnx as ox
+import atexit
+from pathlib import Path
 from shapely.geometry import Polygon
 
-def load_graph_from_polygon(polygon: Polygon, network_type: str = "drive"):
-    """Load a smaller, optimized road network graph for the area."""
-    bounds = polygon.bounds  # (minx, miny, maxx, maxy) = (west, south, east, north)
-    
+from app.core.config import get_config
+from app.core.logging import get_logger
+from app.core.telemetry import span
+from app.routing.graph_builder import CompactGraph, build_graph
+from app.routing.graph_store import GraphStore, snap_bbox
+from app.routing.path_solver import LandmarkIndex, build_landmarks
+from app.routing.spatial_index import SnapIndex, attach as attach_snap_index
+
+# highway=* values OSMnx excludes from its "drive" network
+_NON_DRIVE_HIGHWAYS = {
+    "abandoned", "bridleway", "bus_guideway", "construction", "corridor", "cycleway",
+    "elevator", "escalator", "footway", "no", "path", "pedestrian", "planned", "platform",
+    "proposed", "raceway", "razed", "rest_area", "services", "steps", "track",
+}
+_NON_DRIVE_SERVICE = {"alley", "driveway", "emergency_access", "parking", "parking_aisle", "private"}
+
+logger = get_logger("routing.osm_loader")
+
+_store = None
+_imported_files = set()
+
+
+def get_graph_store() -> GraphStore:
+    """Process-wide graph store configured from Config."""
+    global _store
+    if _store is None:
+        cfg = get_config()
+        _store = GraphStore(cfg.graph_dir, cfg.graph_cache_max_bytes, cfg.graph_cache_memory_items)
+        atexit.register(_store.flush)
+    return _store
+
+
+def _download_graph(polygon: Polygon, bounds, network_type: str):
+    """Fetch a simplified OSMnx graph for bounds = (west, south, east, north)."""
+    # osmnx (and its geopandas stack) is only imported when a download is needed
+    import osmnx as ox
+
     try:
         # Modern OSMnx API (>=2.0): graph_from_bbox takes a single (left, bottom, right, top) bbox tuple
         bbox = (bounds[0], bounds[1], bounds[2], bounds[3])
@@ -16,11 +50,219 @@ def load_graph_from_polygon(polygon: Polygon, network_type: str = "drive"):
             G = ox.graph_from_bbox(bounds[3], bounds[1], bounds[2], bounds[0], network_type=network_type)
             return G
         except Exception as e:
-            print(f"OSMnx bbox load failed, falling back to pure polygon: {e}")
+            logger.warning("OSMnx bbox load failed, falling back to pure polygon: %s", e)
             G = ox.graph_from_polygon(polygon, network_type=network_type)
             return G
 
 
-def load_osm(source: str):
-    """Load OSM data from `source` (file path or URL)."""
-    return {}
+def load_compact_graph(polygon: Polygon, network_type: str = "drive") -> CompactGraph:
+    """
+    Road network for the polygon's bbox as a CompactGraph.
+
+    Lookup order: graph store (exact or covering entry, clipped), the
+    configured local OSM extract, then the Overpass API. Downloads are made
+    for the tile-snapped bbox so neighbouring requests reuse them.
+    """
+    bounds = polygon.bounds  # (minx, miny, maxx, maxy) = (west, south, east, north)
+    store = get_graph_store()
+
+    with span("graph.store_lookup"):
+        graph = store.get(bounds, network_type)
+    if graph is not None:
+        return graph
+
+    osm_file = get_config().osm_file
+    if osm_file is not None and (str(osm_file), network_type) not in _imported_files:
+        try:
+            with span("graph.import_osm"):
+                full = load_osm(osm_file, network_type=network_type)
+            store.put(full.bounds, full, network_type)
+        except (OSError, ImportError, ValueError) as e:
+            logger.warning("Local OSM extract %s unusable: %s", osm_file, e)
+        _imported_files.add((str(osm_file), network_type))
+        graph = store.get(bounds, network_type)
+        if graph is not None:
+            return graph
+
+    tile = snap_bbox(bounds)
+    with span("graph.download"):
+        graph = build_graph(_download_graph(polygon, tile, network_type))
+    store.put(tile, graph, network_type)
+    return graph.clip(bounds)
+
+
+def stored_source(graph: CompactGraph, bounds):
+    """
+    (stored graph, its store bbox, node indices of graph in it) for a
+    graph from load_compact_graph; indices are None when graph is the
+    stored graph itself. Graphs that did not come from the store are
+    their own source, keyed on `bounds`.
+    """
+    root, idx, _ = graph.clip_source
+    bbox = getattr(root, "store_bbox", None)
+    if bbox is None:
+        return graph, tuple(bounds), None
+    return root, bbox, idx
+
+
+def load_landmarks(polygon: Polygon, graph: CompactGraph, count: int, network_type: str = "drive"):
+    """
+    ALT index for the graph returned by load_compact_graph. It is built
+    once per stored graph and kept beside it; a clip gets a slice of its
+    source graph's index (LandmarkIndex.subset).
+    """
+    cached = getattr(graph, "_landmarks", None)
+    if cached is not None and cached[0] == count:
+        return cached[1]
+
+    root, bbox, idx = stored_source(graph, polygon.bounds)
+    if idx is not None:
+        index = load_landmarks(polygon, root, count, network_type).subset(idx)
+    else:
+        store = get_graph_store()
+        name = f"alt{count}"
+        arrays = store.get_aux(bbox, name, network_type)
+        if arrays is not None and arrays["from_lm"].shape[1] == graph.num_nodes:
+            index = LandmarkIndex(**arrays)
+        else:
+            with span("graph.build_landmarks"):
+                index = build_landmarks(graph, count)
+            store.put_aux(bbox, name, index.arrays(), network_type)
+    graph._landmarks = (count, index)
+    return index
+
+
+def load_snap_index(polygon: Polygon, graph: CompactGraph, network_type: str = "drive") -> SnapIndex:
+    """
+    KD-tree snapping index for the graph returned by load_compact_graph,
+    attached to it (so path_solver.nearest_nodes uses it). It is built once
+    per stored graph and kept beside it; a clip gets a subset of its source
+    graph's index (SnapIndex.subset).
+    """
+    cached = getattr(graph, "_snap_index", None)
+    if cached is not None and cached.num_nodes == graph.num_nodes:
+        return cached
+
+    root, bbox, idx = stored_source(graph, polygon.bounds)
+    if idx is not None:
+        index = load_snap_index(polygon, root, network_type).subset(idx)
+    else:
+        store = get_graph_store()
+        index = None
+        arrays = store.get_aux(bbox, "snap", network_type)
+        if arrays is not None:
+            try:
+                index = SnapIndex.from_arrays(arrays)
+                if index.num_nodes != graph.num_nodes:
+                    raise ValueError("snap index does not match the stored graph")
+            except Exception as e:
+                # Stale or corrupt entry: rebuild, and overwrite it below
+                logger.warning("Stored snap index unusable, rebuilding: %s", e)
+                index = None
+        if index is None:
+            index = SnapIndex.build(graph)
+            store.put_aux(bbox, "snap", index.arrays(), network_type)
+    attach_snap_index(graph, index)
+    return index
+
+
+def load_graph_from_polygon(polygon: Polygon, network_type: str = "drive"):
+    """Load a smaller, optimized road network graph for the area."""
+    return load_compact_graph(polygon, network_type).to_networkx()
+
+
+def _is_routable(tags: dict, network_type: str) -> bool:
+    highway = tags.get("highway")
+    if highway is None:
+        return False
+    if network_type != "drive":
+        return True
+    if highway in _NON_DRIVE_HIGHWAYS or tags.get("area") == "yes":
+        return False
+    if tags.get("service") in _NON_DRIVE_SERVICE:
+        return False
+    if tags.get("access") == "private" or tags.get("motor_vehicle") == "no" or tags.get("motorcar") == "no":
+        return False
+    return True
+
+
+def _iter_osm_xml(path: Path):
+    """Yield ("node", id, lng, lat) and ("way", id, node_refs, tags) from an .osm file."""
+    import xml.etree.ElementTree as ET
+
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "node":
+            yield "node", int(elem.get("id")), float(elem.get("lon")), float(elem.get("lat"))
+            elem.clear()
+        elif elem.tag == "way":
+            refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            yield "way", int(elem.get("id")), refs, tags
+            elem.clear()
+
+
+def _iter_osm_pbf(path: Path):
+    """Same records as _iter_osm_xml, read with pyosmium (optional dependency)."""
+    try:
+        import osmium
+    except ImportError as e:
+        raise ImportError("Reading .osm.pbf files requires the 'osmium' package") from e
+
+    for obj in osmium.FileProcessor(str(path)):
+        if obj.is_node():
+            if obj.location.valid():
+                yield "node", obj.id, obj.location.lon, obj.location.lat
+        elif obj.is_way():
+            yield "way", obj.id, [n.ref for n in obj.nodes], dict(obj.tags)
+
+
+def load_osm(source, network_type: str = "drive") -> CompactGraph:
+    """
+    Load a routable, simplified CompactGraph from a local .osm or .osm.pbf file.
+
+    Ways are filtered with the same highway rules OSMnx uses for the
+    requested network type; oneway tags are honoured for "drive".
+    """
+    import networkx as nx
+    import osmnx as ox
+
+    path = Path(source)
+    if not path.exists():
+        raise OSError(f"OSM file not found: {path}")
+    records = _iter_osm_pbf(path) if path.name.endswith(".pbf") else _iter_osm_xml(path)
+
+    coords = {}
+    ways = []
+    for rec in records:
+        if rec[0] == "node":
+            coords[rec[1]] = (rec[2], rec[3])
+        elif _is_routable(rec[3], network_type):
+            ways.append((rec[1], rec[2], rec[3]))
+
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    for osmid, refs, tags in ways:
+        refs = [r for r in refs if r in coords]
+        if len(refs) < 2:
+            continue
+        oneway = tags.get("oneway", "no")
+        if tags.get("junction") == "roundabout" and oneway == "no":
+            oneway = "yes"
+        if network_type != "drive":
+            oneway = "no"
+        if oneway == "-1":
+            refs = refs[::-1]
+
+        for r in refs:
+            if r not in G:
+                G.add_node(r, x=coords[r][0], y=coords[r][1])
+        for a, b in zip(refs[:-1], refs[1:]):
+            G.add_edge(a, b, osmid=osmid, oneway=oneway in ("yes", "true", "1", "-1"))
+            if oneway not in ("yes", "true", "1", "-1"):
+                G.add_edge(b, a, osmid=osmid, oneway=False)
+
+    if len(G) == 0:
+        raise ValueError(f"No routable ways for network_type={network_type!r} in {path}")
+
+    G = ox.distance.add_edge_lengths(G)
+    G = ox.simplify_graph(G)
+    return build_graph(G)
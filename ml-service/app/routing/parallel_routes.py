@@ -0,0 +1,178 @@
+"""Route groups ordered and road-snapped in a process pool.
+
+build_routes(workers=N) hands each route group to a pool worker. The
+worker runs a Dijkstra sweep from the group's own stops (or ALT queries),
+orders the stops and rebuilds every leg. The graph's CSR arrays, and the
+ALT landmark arrays when used, are copied once into shared memory blocks
+owned by the graph (and landmark) objects. A clip of a stored graph is
+shared as that stored graph plus the clip's node indices, so every clip of
+one stored graph reuses the same blocks; workers rebuild the clip from
+them. Workers map the blocks by name, so no task carries the graph. Tasks
+return node paths only; the main process assembles them in group order,
+so the output does not depend on which worker finishes first.
+"""
+import multiprocessing
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.core.logging import get_logger
+from app.routing.graph_builder import CompactGraph
+from app.routing.path_solver import LandmarkIndex
+
+logger = get_logger("routing.parallel_routes")
+
+# Graphs kept mapped in each worker
+WORKER_GRAPHS = 4
+
+_pool = None
+_pool_workers = 0
+# Worker side: handle key -> (graph, landmarks, shared memory blocks)
+# (clips rebuilt from a mapped source graph are entries of their own)
+_attached = OrderedDict()
+
+
+class SharedArrays:
+    """Copies of named arrays in shared memory blocks, unlinked by close()."""
+
+    def __init__(self, arrays: dict):
+        self._blocks = []
+        self.handle = {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self._blocks.append(shm)
+            self.handle[name] = (shm.name, arr.dtype.str, arr.shape)
+
+    def close(self):
+        for shm in self._blocks:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._blocks = []
+
+
+def _shared(owner, attr: str, arrays) -> SharedArrays:
+    """SharedArrays of arrays() cached on owner, released when owner is garbage collected."""
+    cached = getattr(owner, attr, None)
+    if cached is None:
+        shared = SharedArrays(arrays())
+        cached = (shared, weakref.finalize(owner, shared.close))
+        setattr(owner, attr, cached)
+    return cached[0]
+
+
+def share_graph(graph: CompactGraph, landmarks: LandmarkIndex = None) -> dict:
+    """
+    Shared-memory handle for the graph (and landmarks), created on first use
+    and released when the graph (landmark) object is garbage collected. A
+    clip is shared as its source graph plus its node indices, when its
+    landmarks (if any) are a subset of the source graph's.
+    """
+    root, idx, _ = graph.clip_source
+    root_landmarks = landmarks
+    if idx is not None and landmarks is not None:
+        parent, lm_idx = landmarks.subset_source or (None, None)
+        if lm_idx is idx:
+            root_landmarks = parent
+        else:  # landmarks built for the clip itself
+            root, idx = graph, None
+
+    handle = dict(_shared(root, "_shared", lambda: {f"graph.{k}": v for k, v in root.arrays().items()}).handle)
+    if root_landmarks is not None:
+        handle.update(_shared(
+            root_landmarks, "_shared", lambda: {f"alt.{k}": v for k, v in root_landmarks.arrays().items()},
+        ).handle)
+    if idx is not None:
+        handle.update(_shared(graph, "_shared_clip", lambda: {"clip.idx": idx}).handle)
+    return handle
+
+
+def _attach(handle: dict):
+    """(graph, landmarks) backed by the shared blocks of handle, mapped once per worker."""
+    key = tuple(sorted(name for name, _, _ in handle.values()))
+    if key in _attached:
+        _attached.move_to_end(key)
+        return _attached[key][:2]
+
+    blocks = []
+    if "clip.idx" in handle:
+        graph, landmarks = _attach({k: v for k, v in handle.items() if k != "clip.idx"})
+        name, dtype, shape = handle["clip.idx"]
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            idx = np.array(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+        finally:
+            shm.close()
+        graph = graph.subgraph(idx)
+        # Drop references to the mapped source, so it can be unmapped on its own
+        graph._clip_source = (graph, None, None)
+        if landmarks is not None:
+            landmarks = landmarks.subset(idx)
+            landmarks.subset_source = None
+    else:
+        graph_arrays, alt_arrays = {}, {}
+        for field, (name, dtype, shape) in handle.items():
+            shm = shared_memory.SharedMemory(name=name)
+            blocks.append(shm)
+            arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            kind, attr = field.split(".", 1)
+            (graph_arrays if kind == "graph" else alt_arrays)[attr] = arr
+        graph = CompactGraph(**graph_arrays)
+        landmarks = LandmarkIndex(**alt_arrays) if alt_arrays else None
+
+    while len(_attached) >= WORKER_GRAPHS:
+        # Only the blocks: holding the evicted graph here would keep its buffers exported
+        old = _attached.popitem(last=False)[1][2]
+        for shm in old:
+            shm.close()
+    _attached[key] = (graph, landmarks, blocks)
+    return graph, landmarks
+
+
+def _group_task(handle, group, group_nodes, time_budget_s):
+    from app.routing.route_builder import group_legs
+
+    graph, landmarks = _attach(handle)
+    return group_legs(graph, group, group_nodes, time_budget_s, landmarks=landmarks)
+
+
+def get_route_pool(workers: int) -> ProcessPoolExecutor:
+    """Process-wide pool of `workers` route workers, restarted if the count changes."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        # spawn: workers must not inherit this process's threads and locks
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+def parallel_group_legs(graph, groups, group_nodes, time_budget_s, landmarks=None, workers: int = 2):
+    """
+    group_legs() for every group, spread over the route pool. Results are
+    in group order. A group whose task fails is redone in this process.
+    """
+    from app.routing.route_builder import group_legs
+
+    handle = share_graph(graph, landmarks)
+    pool = get_route_pool(workers)
+    futures = [
+        pool.submit(_group_task, handle, [{"lat": s["lat"], "lng": s["lng"]} for s in group], nodes, time_budget_s)
+        for group, nodes in zip(groups, group_nodes)
+    ]
+    results = []
+    for group, nodes, future in zip(groups, group_nodes, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.warning("Route worker failed, snapping group in-process: %s", e)
+            results.append(group_legs(graph, group, nodes, time_budget_s, landmarks=landmarks))
+    return results
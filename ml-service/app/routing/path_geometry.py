@@ -0,0 +1,214 @@
+"""Route geometry post-processing: shared-segment edge table, simplification, LOD.
+
+Road-snapped routes repeat every OSM node of every shortest path, and
+routes sharing a corridor repeat the same vertices. simplify_network()
+splits the routes' full-resolution paths into segments. A segment is a
+maximal chain of road vertices that no route enters, leaves or turns
+around in the middle of. Each segment is stored once in an edge table,
+and routes reference segments by signed 1-based id, where a negative id
+means the segment is traversed in reverse.
+
+Segments are Douglas–Peucker simplified with their endpoints pinned, so
+simplified routes still join up. This is done once at tolerance_m for the
+route paths returned to clients, and once per LOD_ZOOMS level at about a
+pixel's ground size. Route lengths are measured on the full-resolution
+paths before anything is simplified: road lengths (cum_km) from routing
+when present, haversine otherwise.
+"""
+import math
+
+import numpy as np
+
+from app.clustering.stop_index import M_PER_DEG
+from app.core.response_format import encode_polylines
+from app.preprocessing.spatial_utils import path_cumulative_km, stop_coords
+
+DEFAULT_TOLERANCE_M = 5.0
+# Zoom levels with pre-simplified edge geometry, at LOD_PIXELS px tolerance
+LOD_ZOOMS = (10, 12, 14)
+LOD_PIXELS = 1.0
+# Web-Mercator meters per 256 px tile pixel at the equator, zoom 0
+M_PER_PX_Z0 = 2 * math.pi * 6378137.0 / 256
+
+
+def douglas_peucker(x, y, tolerance: float) -> np.ndarray:
+    """Indices of the vertices kept when simplifying the polyline (x, y) (planar units)."""
+    if len(x) <= 2:
+        return np.arange(len(x))
+    return np.flatnonzero(dp_importance(x, y, [0], [len(x) - 1], tolerance) > tolerance)
+
+
+def dp_importance(x, y, starts, ends, min_tolerance: float) -> np.ndarray:
+    """
+    Douglas–Peucker importance of every vertex of the polylines
+    x[starts[i]:ends[i] + 1], all processed together one recursion level at
+    a time. Simplifying at any tolerance t >= min_tolerance keeps exactly
+    the vertices with importance > t (endpoints are inf, vertices never
+    split off are -1).
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    importance = np.full(len(x), -1.0)
+    lo, hi = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+    importance[lo] = importance[hi] = np.inf
+    parent = np.full(len(lo), np.inf)
+    while True:
+        open_ = hi - lo >= 2
+        lo, hi, parent = lo[open_], hi[open_], parent[open_]
+        if not len(lo):
+            return importance
+        # Interior vertices of every open interval, flattened
+        inner = hi - lo - 1
+        offsets = np.cumsum(inner) - inner
+        owner = np.repeat(np.arange(len(lo)), inner)
+        idx = np.arange(inner.sum()) - offsets[owner] + lo[owner] + 1
+        dx, dy = (x[hi] - x[lo])[owner], (y[hi] - y[lo])[owner]
+        px, py = x[idx] - x[lo][owner], y[idx] - y[lo][owner]
+        seg2 = dx * dx + dy * dy
+        # Distance to the segment (not the infinite line), so loops are kept
+        t = np.clip(np.divide(px * dx + py * dy, seg2, out=np.zeros_like(seg2), where=seg2 > 0), 0.0, 1.0)
+        dist = np.hypot(px - t * dx, py - t * dy)
+
+        peak = np.maximum.reduceat(dist, offsets)
+        at_peak = np.flatnonzero(dist == peak[owner])
+        first = at_peak[np.r_[True, owner[at_peak][1:] != owner[at_peak][:-1]]]
+        split = peak > min_tolerance
+        k, lo, hi = idx[first][split], lo[split], hi[split]
+        level = np.minimum(peak[split], parent[split])
+        importance[k] = level
+        lo, hi, parent = np.concatenate([lo, k]), np.concatenate([k, hi]), np.concatenate([level, level])
+
+
+def lod_tolerance_m(z: int, lat0: float) -> float:
+    """Ground size of LOD_PIXELS pixels at zoom z and latitude lat0."""
+    return LOD_PIXELS * M_PER_PX_Z0 * math.cos(math.radians(lat0)) / (1 << z)
+
+
+def _length_km(path) -> float:
+    """Haversine length of a full-resolution path (0.8 km for a single point, as route_distance)."""
+    if len(path) < 2:
+        return 0.8
+    return float(path_cumulative_km(*stop_coords(path))[-1])
+
+
+def _break_vertices(vertex_paths, n_vertices):
+    """Vertices where segments must start/end: junctions, route ends and U-turns."""
+    edges = set()
+    for vp in vertex_paths:
+        for a, b in zip(vp[:-1], vp[1:]):
+            edges.add((min(a, b), max(a, b)))
+    degree = np.zeros(n_vertices, dtype=np.int64)
+    for a, b in edges:
+        degree[a] += 1
+        degree[b] += 1
+    breaks = degree != 2
+    for vp in vertex_paths:
+        if len(vp):
+            breaks[vp[0]] = breaks[vp[-1]] = True
+        for i in range(1, len(vp) - 1):
+            if vp[i - 1] == vp[i + 1]:
+                breaks[vp[i]] = True
+    return breaks
+
+
+def simplify_network(routes, tolerance_m: float = DEFAULT_TOLERANCE_M, zooms=LOD_ZOOMS):
+    """
+    Returns (routes, geometry). Each route gets "segments" (signed edge
+    ids), "path" rebuilt from the simplified segments, its "cum_km" (road
+    km from routing, if present) sampled at the kept vertices, and
+    "length_km": the road length from cum_km, else the haversine length of
+    the full path. geometry is {"encoding", "tolerance_m", "zooms",
+    "edges": [{"id", "path", "lod"}]}, with paths as polyline6 strings and
+    "lod" aligned with "zooms".
+    """
+    # Vertex ids by exact coordinate; consecutive duplicates dropped.
+    # origins[r][k]: index into route r's path of vertex_paths[r][k]
+    vertex_ids, coords = {}, []
+    vertex_paths, origins = [], []
+    for r in routes:
+        vp, orig = [], []
+        for j, p in enumerate(r["path"]):
+            key = (float(p["lat"]), float(p["lng"]))
+            v = vertex_ids.get(key)
+            if v is None:
+                v = vertex_ids[key] = len(coords)
+                coords.append(key)
+            if not vp or vp[-1] != v:
+                vp.append(v)
+                orig.append(j)
+        vertex_paths.append(vp)
+        origins.append(np.array(orig, dtype=np.int64))
+    lat = np.array([c[0] for c in coords])
+    lng = np.array([c[1] for c in coords])
+    lat0 = float(lat.mean()) if coords else 0.0
+    # Local equirectangular meters (fine for simplification tolerances)
+    x = lng * M_PER_DEG * math.cos(math.radians(lat0))
+    y = lat * M_PER_DEG
+    breaks = _break_vertices(vertex_paths, len(coords))
+
+    segment_ids = {}  # canonical vertex chain -> edge id
+    chains = []
+    route_segments = []  # per route: [(signed edge id, first, last position in vertex path)]
+    for vp in vertex_paths:
+        refs = []
+        start = 0
+        for i in range(1, len(vp)):
+            if breaks[vp[i]]:
+                chain = tuple(vp[start:i + 1])
+                rev = chain[::-1]
+                forward = chain <= rev
+                canonical = chain if forward else rev
+                edge = segment_ids.get(canonical)
+                if edge is None:
+                    edge = segment_ids[canonical] = len(chains) + 1
+                    chains.append(np.array(canonical))
+                refs.append((edge if forward else -edge, start, i))
+                start = i
+        route_segments.append(refs)
+
+    geometry = {"encoding": "polyline6", "tolerance_m": tolerance_m, "zooms": list(zooms), "edges": []}
+    if chains:
+        # Importance of each chain vertex, chains laid end to end
+        sizes = np.array([len(c) for c in chains])
+        flat = np.concatenate(chains)
+        ends = np.cumsum(sizes) - 1
+        starts = ends - sizes + 1
+        importance = dp_importance(x[flat], y[flat], starts, ends, tolerance_m)
+        chain_of = np.repeat(np.arange(len(chains)), sizes)
+
+        def level(tol):
+            """(vertex ids of every chain at tolerance tol, per-chain lengths)."""
+            kept = importance > tol
+            return flat[kept], np.bincount(chain_of[kept], minlength=len(chains))
+
+        base_verts, base_counts = level(tolerance_m)
+        lods = [level(max(tolerance_m, lod_tolerance_m(z, lat0))) for z in zooms]
+        paths = encode_polylines(lat[base_verts], lng[base_verts], base_counts)
+        lod_paths = [encode_polylines(lat[v], lng[v], counts) for v, counts in lods]
+        geometry["edges"] = [
+            {"id": i + 1, "path": paths[i], "lod": [lp[i] for lp in lod_paths]}
+            for i in range(len(chains))
+        ]
+        # Kept positions within each chain, in canonical order
+        kept_local = np.split(np.flatnonzero(importance > tolerance_m) - np.repeat(starts, base_counts),
+                              np.cumsum(base_counts)[:-1])
+
+    out = []
+    for r, refs, vp, orig in zip(routes, route_segments, vertex_paths, origins):
+        route = {**r, "segments": [ref for ref, _, _ in refs]}
+        if refs:
+            positions = []
+            for ref, first, last in refs:
+                local = kept_local[abs(ref) - 1]
+                pos = first + (local if ref > 0 else (last - first) - local[::-1])
+                positions.append(pos if not positions else pos[1:])
+            positions = np.concatenate(positions)
+            verts = np.asarray(vp)[positions]
+            route["path"] = [{"lat": float(lat[v]), "lng": float(lng[v])} for v in verts]
+            if "cum_km" in r:
+                route["cum_km"] = [r["cum_km"][j] for j in orig[positions]]
+        if "cum_km" in r and len(r["path"]) >= 2:
+            route["length_km"] = float(r["cum_km"][-1])
+        else:
+            route["length_km"] = _length_km(r["path"])
+        out.append(route)
+    return out, geometry
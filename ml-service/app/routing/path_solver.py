@@ -1,6 +1,298 @@
-"""Path solving algorithms and wrappers (placeholder)."""
+"""Shortest-path engine on CompactGraph CSR arrays.
+
+All legs that start at the same stop come out of one Dijkstra sweep, and a
+single scipy.sparse.csgraph call covers every stop of the request. For
+repeated point-to-point queries on the same graph, a LandmarkIndex (ALT:
+A*, landmarks, triangle inequality) can be built once and reused.
+"""
+import heapq
+import math
+
+import numpy as np
+from app.core.telemetry import span
+from app.routing.spatial_index import index_for
+
+# Slack subtracted from ALT bounds to absorb float32 rounding (meters)
+ALT_SLACK_M = 0.05
+# ALT bounds are computed lazily for blocks of 2**ALT_BLOCK_SHIFT node indices
+ALT_BLOCK_SHIFT = 10
+
+# Max dense distance-row entries held at once while sweeping (float64)
+SWEEP_CHUNK_ENTRIES = 8_000_000
+
+
+def nearest_nodes(graph, lng, lat, max_distance_m: float = math.inf):
+    """
+    Index of the nearest graph node for each (lng, lat), -1 where none is
+    within max_distance_m. Queries the graph's KD-tree (spatial_index),
+    built once per graph object.
+    """
+    if graph.num_nodes == 0:
+        raise ValueError("graph has no nodes")
+    nodes, _ = index_for(graph).snap_nodes(lng, lat, max_distance_m)
+    return nodes
+
+
+class StopPaths:
+    """Shortest paths between a fixed set of graph nodes (typically snapped stops)."""
+
+    def __init__(self, graph, nodes, dist_m, tree_keys, tree_parent):
+        self.graph = graph
+        self.nodes = np.asarray(nodes, dtype=np.int64)
+        self.dist_m = dist_m              # (k, k) road meters, inf if unreachable
+        # Dijkstra trees pruned to the paths between `nodes` (see _path_trees)
+        self._tree_keys = tree_keys
+        self._tree_parent = tree_parent
+        self._row = {int(n): i for i, n in enumerate(self.nodes)}
+
+    def distance_matrix_km(self, nodes=None) -> np.ndarray:
+        """Road distance in km between `nodes` (default: all), in that order."""
+        if nodes is None:
+            return self.dist_m / 1000.0
+        rows = [self._row[int(n)] for n in nodes]
+        return self.dist_m[np.ix_(rows, rows)] / 1000.0
+
+    def node_path(self, source, target):
+        """Node indices from source to target (both in `nodes`), or None if unreachable."""
+        i = self._row[int(source)]
+        if source == target:
+            return [int(source)]
+        if not np.isfinite(self.dist_m[i, self._row[int(target)]]):
+            return None
+
+        n = self.graph.num_nodes
+        key = i * n + int(target)
+        j = int(np.searchsorted(self._tree_keys, key))
+        if j == len(self._tree_keys) or self._tree_keys[j] != key:
+            return None
+        positions = []
+        parent = self._tree_parent
+        while j >= 0:
+            positions.append(j)
+            j = parent[j]
+        path = (self._tree_keys[positions[::-1]] - i * n).tolist()
+        return path if path[0] == source else None
+
+
+def _path_trees(pred: np.ndarray, frontier: np.ndarray, first_row: int):
+    """
+    Prune Dijkstra predecessor rows (r, N) to the nodes on the paths to
+    `frontier` (flat row * N + target indices into pred). Returns (keys,
+    parent): keys[j] = (first_row + row) * N + node, sorted, and parent[j]
+    the position of that node's predecessor in keys (-1 at the source).
+    """
+    r, n = pred.shape
+    flat = pred.reshape(-1)
+    on_tree = np.zeros(r * n, dtype=bool)
+    while len(frontier):
+        on_tree[frontier] = True
+        p = flat[frontier]
+        ok = p >= 0
+        step = (frontier[ok] // n) * n + p[ok]
+        frontier = np.unique(step[~on_tree[step]])
+
+    local = np.flatnonzero(on_tree)
+    p = flat[local]
+    parent = np.full(len(local), -1, dtype=np.int64)
+    ok = p >= 0
+    parent[ok] = np.searchsorted(local, (local[ok] // n) * n + p[ok])
+    return local + first_row * n, parent
+
+
+def stop_paths(graph, nodes, groups=None) -> StopPaths:
+    """
+    One Dijkstra sweep from every node in `nodes`.
+
+    Returns the node-to-node road distance matrix plus the predecessor trees
+    needed to rebuild legs between them. Sweeps run SWEEP_CHUNK_ENTRIES at
+    a time and each chunk's trees are pruned to the paths node_path() can
+    be asked for: between any two `nodes`, or, with groups (lists of
+    nodes), between two nodes of the same group. Memory then follows those
+    paths rather than k x N.
+    """
+    from scipy.sparse.csgraph import dijkstra
+
+    unique = np.unique(np.asarray(nodes, dtype=np.int64))
+    csr = graph.to_csr()
+    n = graph.num_nodes
+
+    k = len(unique)
+    if groups is None:
+        groups = [unique]
+    # (source row, target node) of every leg node_path() may be asked for
+    pairs = []
+    for group in groups:
+        members = np.unique(np.asarray(group, dtype=np.int64))
+        rows = np.searchsorted(unique, members)
+        pairs.append(np.stack(np.meshgrid(rows, members, indexing="ij"), axis=-1).reshape(-1, 2))
+    pairs = np.unique(np.concatenate(pairs), axis=0) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+    dist_u = np.empty((k, k))
+    keys, parents, offset = [], [], 0
+    step = max(1, SWEEP_CHUNK_ENTRIES // max(1, n))
+    for start in range(0, k, step):
+        rows = unique[start:start + step]
+        with span("routing.dijkstra"):
+            d, p = dijkstra(csr, directed=True, indices=rows, return_predecessors=True)
+        dist_u[start:start + len(rows)] = d[:, unique]
+        chunk = pairs[(pairs[:, 0] >= start) & (pairs[:, 0] < start + len(rows))]
+        chunk_keys, chunk_parent = _path_trees(p, (chunk[:, 0] - start) * n + chunk[:, 1], start)
+        keys.append(chunk_keys)
+        parents.append(np.where(chunk_parent >= 0, chunk_parent + offset, -1))
+        offset += len(chunk_keys)
+
+    empty = np.zeros(0, dtype=np.int64)
+    return StopPaths(graph, unique, dist_u, np.concatenate(keys or [empty]), np.concatenate(parents or [empty]))
 
 
 def shortest_path(graph, source, target):
-    """Return a path between source and target (placeholder)."""
-    return [source, target]
+    """Node indices of the shortest path between two node indices, or None."""
+    return stop_paths(graph, [source, target]).node_path(source, target)
+
+
+class LandmarkIndex:
+    """Landmark distances for ALT A* queries on one graph.
+
+    from_lm[l, v] = d(landmark l -> v), to_lm[l, v] = d(v -> landmark l).
+    """
+
+    def __init__(self, landmarks, from_lm, to_lm):
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        self.from_lm = from_lm
+        self.to_lm = to_lm
+        self._adjacency = None
+        # (parent index, node indices in its graph) when made by subset()
+        self.subset_source = None
+
+    def arrays(self) -> dict:
+        return {"landmarks": self.landmarks, "from_lm": self.from_lm, "to_lm": self.to_lm}
+
+    def target_bounds(self, target):
+        """(d(l -> target), d(target -> l)) for the landmarks that reach and are reached by target."""
+        fl_t = self.from_lm[:, target].astype(np.float64)
+        tl_t = self.to_lm[:, target].astype(np.float64)
+        ok = np.flatnonzero(np.isfinite(fl_t) & np.isfinite(tl_t))
+        return ok, fl_t[ok], tl_t[ok]
+
+    def lower_bounds(self, target_bounds, lo: int, hi: int) -> np.ndarray:
+        """Admissible lower bound on d(v -> target) for nodes lo..hi-1, in meters."""
+        ok, fl_t, tl_t = target_bounds
+        if len(ok) == 0:
+            return np.zeros(hi - lo)
+        fl = self.from_lm[ok, lo:hi]
+        tl = self.to_lm[ok, lo:hi]
+        with np.errstate(invalid="ignore"):
+            h = np.maximum((fl_t[:, None] - fl).max(axis=0), (tl - tl_t[:, None]).max(axis=0))
+        h -= ALT_SLACK_M
+        return np.maximum(h, 0.0, out=h)
+
+    def subset(self, idx) -> "LandmarkIndex":
+        """
+        Index for a subgraph holding nodes idx of this graph (e.g. a clip).
+        Distances in a subgraph are never shorter, so the bounds stay
+        admissible; landmarks outside the subgraph become -1.
+        """
+        source_idx, idx = idx, np.asarray(idx, dtype=np.int64)
+        landmarks = np.full(len(self.landmarks), -1, dtype=np.int64)
+        if len(idx):
+            pos = np.minimum(np.searchsorted(idx, self.landmarks), len(idx) - 1)
+            inside = idx[pos] == self.landmarks
+            landmarks[inside] = pos[inside]
+        sub = LandmarkIndex(landmarks, self.from_lm[:, idx], self.to_lm[:, idx])
+        sub.subset_source = (self, source_idx)
+        return sub
+
+    def adjacency(self, graph):
+        """CSR arrays as Python lists; list indexing is much faster in the A* loop."""
+        if self._adjacency is None:
+            self._adjacency = (
+                graph.indptr.tolist(),
+                graph.indices.tolist(),
+                graph.length_m.astype(np.float64).tolist(),
+            )
+        return self._adjacency
+
+
+def build_landmarks(graph, count: int = 8) -> LandmarkIndex:
+    """
+    Pick `count` landmarks by farthest-point selection and precompute their
+    forward and backward distances to every node.
+    """
+    from scipy.sparse.csgraph import dijkstra
+
+    csr = graph.to_csr()
+    n = graph.num_nodes
+    count = max(1, min(count, n))
+
+    # Farthest-point selection on the undirected graph, seeded from node 0;
+    # `far` is each node's distance to the nearest landmark chosen so far
+    chosen = []
+    far = dijkstra(csr, directed=False, indices=0)
+    for _ in range(count):
+        score = np.where(np.isfinite(far), far, -1.0)
+        score[chosen] = -1.0
+        nxt = int(np.argmax(score))
+        if score[nxt] < 0:
+            break
+        d = dijkstra(csr, directed=False, indices=nxt)
+        far = np.minimum(far, d) if chosen else d
+        chosen.append(nxt)
+
+    from_lm = dijkstra(csr, directed=True, indices=chosen).astype(np.float32)
+    to_lm = dijkstra(csr.T.tocsr(), directed=True, indices=chosen).astype(np.float32)
+    return LandmarkIndex(chosen, from_lm, to_lm)
+
+
+def alt_shortest_path(graph, index: LandmarkIndex, source, target):
+    """
+    A* with landmark lower bounds between two node indices.
+
+    Bounds are computed on first touch for the block of 2**ALT_BLOCK_SHIFT
+    node indices around each reached node, so a query pays for the part of
+    the graph it searches, never more than one pass over all N nodes.
+    Returns (node_path, length_m), or (None, inf) if target is unreachable.
+    """
+    source, target = int(source), int(target)
+    if source == target:
+        return [source], 0.0
+
+    indptr, indices, weights = index.adjacency(graph)
+    target_bounds = index.target_bounds(target)
+    n = graph.num_nodes
+    shift, mask = ALT_BLOCK_SHIFT, (1 << ALT_BLOCK_SHIFT) - 1
+    blocks = {}
+
+    def block(b):
+        lo = b << shift
+        blocks[b] = index.lower_bounds(target_bounds, lo, min(n, lo + mask + 1)).tolist()
+        return blocks[b]
+
+    h_source = block(source >> shift)[source & mask]
+    if h_source == float("inf"):
+        return None, float("inf")
+
+    dist = {source: 0.0}
+    prev = {}
+    heap = [(h_source, 0.0, source)]
+    while heap:
+        _, g, u = heapq.heappop(heap)
+        if u == target:
+            path = [u]
+            while u != source:
+                u = prev[u]
+                path.append(u)
+            path.reverse()
+            return path, g
+        if g > dist[u]:
+            continue
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            ng = g + weights[e]
+            if ng < dist.get(v, float("inf")):
+                hv = (blocks.get(v >> shift) or block(v >> shift))[v & mask]
+                if hv == float("inf"):
+                    continue
+                dist[v] = ng
+                prev[v] = u
+                heapq.heappush(heap, (ng + hv, ng, v))
+    return None, float("inf")
@@ -1,54 +1,113 @@
 import math
-from sklearn.cluster import SpectralClustering
 import numpy as np
 
+from app.core.logging import get_logger
+from app.core.telemetry import span
+from app.preprocessing.spatial_utils import (
+    EARTH_RADIUS_KM,
+    haversine_pairwise_km,
+    path_cumulative_km,
+    stop_coords,
+    stop_distance_km,
+)
+from app.routing.graph_builder import CompactGraph, build_graph
+from app.routing.parallel_routes import parallel_group_legs
+from app.routing.path_solver import alt_shortest_path, nearest_nodes, stop_paths
+from app.routing.route_ordering import DEFAULT_TIME_BUDGET_S, improve_order
 
-def geo_dist(a, b):
-    """Haversine distance between two stops in km."""
-    R = 6371.0
-    lat1, lat2 = math.radians(a["lat"]), math.radians(b["lat"])
-    dlat = lat2 - lat1
-    dlng = math.radians(b["lng"] - a["lng"])
-    h = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
-    return R * 2 * math.asin(math.sqrt(min(1.0, h)))
+
+logger = get_logger("routing.route_builder")
+
+# Above this many stops, spectral clustering switches to a sparse kNN affinity
+SPARSE_AFFINITY_THRESHOLD = 500
+KNN_NEIGHBORS = 10
+
+# Kept for callers of the old helper; the kernel lives in spatial_utils
+geo_dist = stop_distance_km
 
 
 def build_distance_matrix(stops):
     """Build NxN pairwise distance matrix for spectral clustering."""
+    return haversine_pairwise_km(*stop_coords(stops))
+
+
+def _eigen_solver():
+    """"amg" when pyamg is installed (optional), else scipy's "lobpcg"."""
+    try:
+        import pyamg  # noqa: F401
+        return "amg"
+    except ImportError:
+        return "lobpcg"
+
+
+def build_knn_affinity(stops, n_neighbors=KNN_NEIGHBORS):
+    """
+    Sparse symmetric kNN affinity (CSR) with a Gaussian kernel on local-km
+    distances. Memory is O(n * n_neighbors) instead of O(n²).
+    """
+    lat, lng = stop_coords(stops)
+    km_per_deg = math.radians(1) * EARTH_RADIUS_KM
+    xy = np.column_stack([
+        (lng - lng.mean()) * math.cos(math.radians(lat.mean())) * km_per_deg,
+        (lat - lat.mean()) * km_per_deg,
+    ])
+    from scipy.sparse import csr_matrix
+    from scipy.spatial import cKDTree
+
     n = len(stops)
-    D = np.zeros((n, n))
-    for i in range(n):
-        for j in range(i+1, n):
-            d = geo_dist(stops[i], stops[j])
-            D[i][j] = d
-            D[j][i] = d
-    return D
+    k = min(n_neighbors + 1, n)  # +1: each point is its own nearest neighbour
+    dist, idx = cKDTree(xy).query(xy, k=k)
+    dist, idx = dist[:, 1:], idx[:, 1:]
 
+    sigma = dist.mean() or 1.0
+    rows = np.repeat(np.arange(n), k - 1)
+    A = csr_matrix((np.exp(-(dist.ravel() ** 2) / (2 * sigma ** 2)), (rows, idx.ravel())), shape=(n, n))
+    return A.maximum(A.T).tocsr()
 
-def cluster_stops_spectral(stops, route_count):
+
+def cluster_stops_spectral(stops, route_count, affinity_mode="auto"):
     """
     Use Spectral Clustering on a stop affinity matrix to discover
     natural geographic corridor groupings rather than arbitrary stripes.
+
+    affinity_mode: "dense" (full Gaussian RBF), "knn" (sparse kNN graph with
+    an amg/lobpcg eigensolver) or "auto" (knn above SPARSE_AFFINITY_THRESHOLD stops).
     """
     n = len(stops)
     if n <= route_count:
         # Not enough stops for spectral — simple round-robin
         return [[s] for s in stops][:route_count]
 
-    D = build_distance_matrix(stops)
-    # Affinity = Gaussian RBF kernel on distances
-    sigma = D.mean() or 1.0
-    affinity = np.exp(-(D ** 2) / (2 * sigma ** 2))
+    if affinity_mode == "auto":
+        affinity_mode = "knn" if n > SPARSE_AFFINITY_THRESHOLD else "dense"
+
+    from sklearn.cluster import SpectralClustering
 
     try:
-        sc = SpectralClustering(
-            n_clusters=route_count,
-            affinity='precomputed',
-            assign_labels='kmeans',
-            random_state=42,
-            n_init=10
-        )
-        labels = sc.fit_predict(affinity)
+        if affinity_mode == "knn":
+            affinity = build_knn_affinity(stops)
+            sc = SpectralClustering(
+                n_clusters=route_count,
+                affinity='precomputed',
+                eigen_solver=_eigen_solver(),
+                assign_labels='kmeans',
+                random_state=42,
+                n_init=10
+            )
+        else:
+            D = build_distance_matrix(stops)
+            # Affinity = Gaussian RBF kernel on distances
+            sigma = D.mean() or 1.0
+            affinity = np.exp(-(D ** 2) / (2 * sigma ** 2))
+            sc = SpectralClustering(
+                n_clusters=route_count,
+                affinity='precomputed',
+                assign_labels='kmeans',
+                random_state=42,
+                n_init=10
+            )
+        with span(f"clustering.spectral_fit.{affinity_mode}"):
+            labels = sc.fit_predict(affinity)
     except Exception:
         # Fallback: longitude stripe assignment
         stops_sorted = sorted(range(n), key=lambda i: stops[i]["lng"])
@@ -70,82 +129,195 @@ def order_route_nn(stops):
     """
     if not stops:
         return []
-    remaining = list(stops)
+    D = build_distance_matrix(stops)
     # Start from northernmost stop (intuitive for north-south corridors)
-    start = max(remaining, key=lambda s: s["lat"])
-    remaining.remove(start)
-    ordered = [start]
-    while remaining:
-        nxt = min(remaining, key=lambda s: geo_dist(ordered[-1], s))
-        ordered.append(nxt)
-        remaining.remove(nxt)
-    return ordered
+    current = max(range(len(stops)), key=lambda i: stops[i]["lat"])
+    visited = np.zeros(len(stops), dtype=bool)
+    visited[current] = True
+    order = [current]
+    for _ in range(len(stops) - 1):
+        row = np.where(visited, np.inf, D[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        order.append(current)
+    return [stops[i] for i in order]
+
+
+def add_road_lengths(G, snapped):
+    """
+    Set "cum_km" (road km from the first path vertex, one per vertex) and
+    "leg_km" (road km between consecutive stops) on each route.
 
+    snapped: (route, nodes, stop_pos) with the graph node of every path
+    vertex (-1 if off the graph) and the path index of every stop. Steps
+    between adjacent graph nodes use the edge length Dijkstra routed on, in
+    one lookup for all routes; any other step (straight-line fallback) its
+    haversine length.
+    """
+    if not snapped:
+        return
+    nodes = [np.asarray(n, dtype=np.int64) for _, n, _ in snapped]
+    u = np.concatenate([n[:-1] for n in nodes])
+    v = np.concatenate([n[1:] for n in nodes])
+    road_km = G.edge_length_m(u, v) / 1000.0 if G is not None else np.full(len(u), np.nan)
+
+    offset = 0
+    for route, _, stop_pos in snapped:
+        steps = np.diff(path_cumulative_km(*stop_coords(route["path"])))
+        road = road_km[offset:offset + len(steps)]
+        offset += len(steps)
+        cum = np.concatenate([[0.0], np.cumsum(np.where(np.isnan(road), steps, road))])
+        route["cum_km"] = np.round(cum, 4).tolist()
+        route["leg_km"] = np.round(np.diff(cum[stop_pos]), 4).tolist()
+
+
+def group_legs(G, group, group_nodes, time_budget_s, paths=None, landmarks=None):
+    """
+    Order one route group and find the road path of each leg.
+
+    group_nodes: snapped graph node per stop (-1 off the graph), or None
+    without a graph. Legs come from `paths` (a StopPaths covering the
+    group's nodes), from ALT queries when landmarks are given, or else
+    from one Dijkstra sweep over the group's own nodes.
 
-def build_routes(stops, route_count=4, G=None):
+    Returns (order, ordering, legs): legs[i] is the node path from ordered
+    stop i to stop i + 1, or None for a straight segment (off-graph stop,
+    unreachable or failed leg).
+    """
+    D = build_distance_matrix(group)
+    nodes = None if group_nodes is None else np.asarray(group_nodes, dtype=np.int64)
+    on_graph = np.flatnonzero(nodes >= 0) if nodes is not None else []
+    if len(on_graph) and paths is None and landmarks is None:
+        paths = stop_paths(G, nodes[on_graph])
+    if len(on_graph) and paths is not None:
+        road = paths.distance_matrix_km(nodes[on_graph])
+        sub = D[np.ix_(on_graph, on_graph)]
+        D[np.ix_(on_graph, on_graph)] = np.where(np.isfinite(road), road, sub)
+    start = max(range(len(group)), key=lambda i: group[i]["lat"])
+    with span("routing.ordering"):
+        order, ordering = improve_order(D, start, time_budget_s)
+    if nodes is None:
+        return order, ordering, [None] * max(0, len(order) - 1)
+
+    legs = []
+    for a, b in zip(order[:-1], order[1:]):
+        n_a, n_b = int(nodes[a]), int(nodes[b])
+        node_path = None
+        if n_a >= 0 and n_b >= 0:
+            try:
+                if paths is not None:
+                    node_path = paths.node_path(n_a, n_b)
+                else:
+                    with span("routing.alt_query"):
+                        node_path, _ = alt_shortest_path(G, landmarks, n_a, n_b)
+            except Exception as e:
+                logger.warning("Leg %d -> %d failed, using a straight segment: %s", n_a, n_b, e)
+        legs.append(None if node_path is None else np.asarray(node_path, dtype=np.int64))
+    return order, ordering, legs
+
+
+def _assemble(G, ordered, ordered_nodes, legs):
+    """
+    (road_path, nodes, stop_pos) from a group's legs: nodes[k] is the graph
+    node of road_path[k], -1 where a stop stands in for a straight segment,
+    and stop_pos the path index of each stop.
+    """
+    road_path, nodes, stop_pos = [], [], []
+    for stop, node_path in zip(ordered, legs):
+        stop_pos.append(len(road_path))
+        if node_path is None:
+            road_path.append(stop)
+            nodes.append(-1)
+            continue
+        steps = node_path[:-1]
+        road_path.extend({"lat": lat, "lng": lng} for lat, lng in zip(G.y[steps].tolist(), G.x[steps].tolist()))
+        nodes.extend(steps.tolist())
+
+    if ordered:
+        n_last = int(ordered_nodes[-1])
+        stop_pos.append(len(road_path))
+        if n_last < 0:
+            road_path.append(ordered[-1])
+        else:
+            road_path.append({"lat": float(G.y[n_last]), "lng": float(G.x[n_last])})
+        nodes.append(n_last)
+    return road_path, nodes, stop_pos
+
+
+def build_routes(stops, route_count=4, G=None, landmarks=None, time_budget_s=DEFAULT_TIME_BUDGET_S,
+                 max_snap_distance_m=math.inf, workers=0):
     """
     Advanced route builder:
       1. Spectral clustering to discover natural geographic clusters
-      2. Nearest-Neighbor TSP ordering within each cluster
-      3. OSMnx graph path snapping for realistic road geometry
+      2. Nearest-Neighbor + 2-opt/Or-opt ordering within each cluster, on
+         road distances when available (time_budget_s per route)
+      3. Road-network path snapping for realistic road geometry
+
+    G may be a CompactGraph or an OSMnx graph. All legs are read from one
+    batched Dijkstra sweep over the stops' snapped nodes, or answered by ALT
+    A* queries when a LandmarkIndex for G is passed. Stops farther than
+    max_snap_distance_m from every road node are left off the graph: legs
+    to and from them are straight lines. With workers > 1, groups are
+    ordered and snapped in a process pool instead (see parallel_routes),
+    each with its own sweep.
+
+    Each route is {"stops", "path", "ordering", "cum_km", "leg_km"}: road
+    lengths along the path and between stops, from the graph's edge lengths
+    (see add_road_lengths).
     """
     if not stops:
         return []
 
-    # 1. Pre-compute OSMnx node cache (vectorized)
+    if G is not None and not isinstance(G, CompactGraph):
+        G = build_graph(G)
+
+    # 1. Snap every stop to its nearest road node
     node_cache = {}
-    if G is not None:
-        try:
-            import osmnx as ox
-            X = [float(s["lng"]) for s in stops]
-            Y = [float(s["lat"]) for s in stops]
-            nearest = ox.distance.nearest_nodes(G, X, Y)
-            if hasattr(nearest, 'tolist'):
-                nearest = nearest.tolist()
-            elif not isinstance(nearest, (list, tuple)):
-                nearest = [nearest]
-            for i, s in enumerate(stops):
-                node_cache[s["id"]] = nearest[i]
-        except Exception as e:
-            print("node_cache fallback:", e)
+    if G is not None and G.num_nodes > 0:
+        nearest = nearest_nodes(
+            G,
+            [float(s["lng"]) for s in stops],
+            [float(s["lat"]) for s in stops],
+            max_snap_distance_m,
+        )
+        node_cache = {s["id"]: int(n) for s, n in zip(stops, nearest)}
+        unsnapped = int((nearest < 0).sum())
+        if unsnapped:
+            logger.info("%d of %d stops beyond %.0f m of the road graph", unsnapped, len(stops), max_snap_distance_m)
 
     # 2. Spectral clustering to form route groups
     groups = cluster_stops_spectral(stops, route_count)
+    group_nodes = [[node_cache[s["id"]] for s in group] if node_cache else None for group in groups]
+
+    # 3. Order stops within each group (NN start, then bounded local search)
+    #    and snap each leg to real road geometry
+    if node_cache and workers > 1 and len(groups) > 1:
+        with span("routing.parallel_groups"):
+            results = parallel_group_legs(G, groups, group_nodes, time_budget_s, landmarks, workers)
+    else:
+        # One sweep from every snapped stop serves all groups; its trees
+        # only keep the legs within each group
+        snapped_nodes = [n for n in node_cache.values() if n >= 0]
+        paths = None
+        if snapped_nodes and landmarks is None:
+            paths = stop_paths(G, snapped_nodes, groups=[[n for n in nodes if n >= 0] for nodes in group_nodes])
+        results = [
+            group_legs(G, group, nodes, time_budget_s, paths=paths, landmarks=landmarks)
+            for group, nodes in zip(groups, group_nodes)
+        ]
 
-    # 3. Order stops within each group via Nearest Neighbor
-    import networkx as nx
     final_routes = []
-    for group in groups:
-        ordered = order_route_nn(group)
-
-        # 4. Snap to real road geometry using the OSMnx graph
-        if G is not None and node_cache:
-            road_path = []
-            for i in range(len(ordered) - 1):
-                try:
-                    n_a = node_cache[ordered[i]["id"]]
-                    n_b = node_cache[ordered[i + 1]["id"]]
-                    node_path = nx.shortest_path(G, n_a, n_b, weight='length')
-                    for node_id in node_path[:-1]:
-                        road_path.append({
-                            "lat": float(G.nodes[node_id]["y"]),
-                            "lng": float(G.nodes[node_id]["x"])
-                        })
-                except Exception:
-                    road_path.append(ordered[i])
-
-            if ordered:
-                try:
-                    n_last = node_cache[ordered[-1]["id"]]
-                    road_path.append({
-                        "lat": float(G.nodes[n_last]["y"]),
-                        "lng": float(G.nodes[n_last]["x"])
-                    })
-                except Exception:
-                    road_path.append(ordered[-1])
-
-            final_routes.append({"stops": ordered, "path": road_path})
+    snapped = []  # (route, graph node per path vertex, path index of each stop)
+    for group, nodes, (order, ordering, legs) in zip(groups, group_nodes, results):
+        ordered = [group[i] for i in order]
+        if nodes is not None:
+            road_path, path_nodes, stop_pos = _assemble(G, ordered, [nodes[i] for i in order], legs)
+            final_routes.append({"stops": ordered, "path": road_path, "ordering": ordering})
+            snapped.append((final_routes[-1], path_nodes, stop_pos))
         else:
-            final_routes.append({"stops": ordered, "path": ordered})
+            final_routes.append({"stops": ordered, "path": ordered, "ordering": ordering})
+            snapped.append((final_routes[-1], [-1] * len(ordered), list(range(len(ordered)))))
 
-    return final_routes
\ No newline at end of file
+    with span("routing.road_lengths"):
+        add_road_lengths(G, snapped)
+    return final_routes
@@ -0,0 +1,124 @@
+"""Stop ordering within a route: nearest neighbour + 2-opt / Or-opt local search.
+
+Routes are open paths (the bus turns around at the last stop), which are
+handled as tours through a dummy node at distance 0 from every stop. The
+local search works on a precomputed distance matrix and stops at a
+per-route time budget, so latency stays bounded however many stops a
+corridor has.
+"""
+import time
+
+import numpy as np
+
+DEFAULT_TIME_BUDGET_S = 0.05
+OR_OPT_MAX_SEGMENT = 3
+_EPS = 1e-9
+
+
+def path_length(D, order) -> float:
+    """Length of the open path visiting `order` under matrix D."""
+    if len(order) < 2:
+        return 0.0
+    order = np.asarray(order)
+    return float(D[order[:-1], order[1:]].sum())
+
+
+def nearest_neighbor_order(D, start: int):
+    n = len(D)
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    order = [start]
+    current = start
+    for _ in range(n - 1):
+        current = int(np.argmin(np.where(visited, np.inf, D[current])))
+        visited[current] = True
+        order.append(current)
+    return order
+
+
+def _two_opt_pass(C, tour) -> bool:
+    """One first-improvement sweep of 2-opt on a cyclic tour with tour[0] fixed."""
+    m = len(tour)
+    for i in range(1, m - 1):
+        a, b = tour[i - 1], tour[i]
+        js = np.arange(i + 1, m)
+        c = tour[js]
+        d = tour[(js + 1) % m]
+        delta = C[a, c] + C[b, d] - C[a, b] - C[c, d]
+        k = int(np.argmin(delta))
+        if delta[k] < -_EPS:
+            j = int(js[k])
+            tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+            return True
+    return False
+
+
+def _or_opt_pass(C, tour) -> bool:
+    """Move one segment of 1..OR_OPT_MAX_SEGMENT stops to its best position (maybe reversed)."""
+    m = len(tour)
+    for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+        for i in range(1, m - length + 1):
+            seg = tour[i:i + length]
+            prev, nxt = tour[i - 1], tour[(i + length) % m]
+            s0, s1 = seg[0], seg[-1]
+            gain = C[prev, s0] + C[s1, nxt] - C[prev, nxt]
+
+            rest = np.concatenate([tour[:i], tour[i + length:]])
+            u = rest
+            v = np.roll(rest, -1)
+            fwd = C[u, s0] + C[s1, v] - C[u, v]
+            rev = C[u, s1] + C[s0, v] - C[u, v]
+            cost = np.minimum(fwd, rev)
+            p = int(np.argmin(cost))
+            if cost[p] - gain < -_EPS:
+                piece = seg if fwd[p] <= rev[p] else seg[::-1]
+                tour[:] = np.concatenate([rest[:p + 1], piece, rest[p + 1:]])
+                # Keep the dummy node at position 0
+                tour[:] = np.roll(tour, -int(np.flatnonzero(tour == m - 1)[0]))
+                return True
+    return False
+
+
+def improve_order(D, start: int = 0, time_budget_s: float = DEFAULT_TIME_BUDGET_S):
+    """
+    Order the n points of distance matrix D as an open path.
+
+    Starts from nearest neighbour at `start`, then alternates 2-opt and
+    Or-opt moves until no move improves or the time budget runs out.
+    Asymmetric (road) matrices are searched on their symmetric part and
+    reported on the true directed lengths.
+
+    Returns (order, stats) with stats = {initial_km, final_km, improvement_pct, time_ms}.
+    """
+    t0 = time.perf_counter()
+    D = np.asarray(D, dtype=np.float64)
+    n = len(D)
+    order = nearest_neighbor_order(D, start) if n else []
+    initial = path_length(D, order)
+
+    if n > 3:
+        deadline = t0 + time_budget_s
+        # Tour over n stops plus dummy node n with zero-cost edges
+        C = np.zeros((n + 1, n + 1))
+        C[:n, :n] = (D + D.T) / 2
+        tour = np.array([n] + order)
+        while time.perf_counter() < deadline:
+            if _two_opt_pass(C, tour):
+                continue
+            if not _or_opt_pass(C, tour):
+                break
+        order = [int(x) for x in tour[1:]]
+        # Run the path in whichever direction is shorter on directed costs
+        if path_length(D, order[::-1]) < path_length(D, order):
+            order.reverse()
+
+    final = path_length(D, order)
+    if final > initial:
+        order, final = nearest_neighbor_order(D, start), initial
+
+    return order, {
+        "initial_km": round(initial, 3),
+        "final_km": round(final, 3),
+        "improvement_pct": round(100.0 * (initial - final) / initial, 2) if initial > 0 else 0.0,
+        "time_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
@@ -0,0 +1,219 @@
+"""KD-tree snapping index over a road graph's nodes and edges.
+
+Coordinates are projected once to local equirectangular meters around the
+graph's mean latitude. Two cKDTrees are built: one over the nodes, and
+one over sample points along every road segment. Each segment is cut into
+pieces of at most EDGE_SAMPLE_M, with one sample at the middle of each
+piece, so every point of a segment is within half_piece meters of one of
+its samples.
+
+Edge snapping is exact. For a query point, let d be the distance to its
+nearest sample. The nearest segment is then within d, and one of its
+samples is within d + half_piece. Only segments owning a sample inside
+that ball are projected onto. The ball is usually covered by a k-nearest
+query (SNAP_CANDIDATES); only crowded points fall back to a ball query.
+
+An index is built once per graph object and attached to it (index_for).
+The graph store also persists its arrays beside the stored graph (only
+arrays: the trees are rebuilt on load), and clips of that graph take a
+subset of it (see osm_loader.load_snap_index).
+"""
+import math
+
+import numpy as np
+
+from app.clustering.stop_index import M_PER_DEG
+from app.core.telemetry import span
+
+# Max spacing of the edge sample points (meters)
+EDGE_SAMPLE_M = 100.0
+# Nearest samples checked per point before falling back to a ball query
+SNAP_CANDIDATES = 8
+# Bumped when the persisted layout changes
+INDEX_VERSION = 2
+
+
+class SnapIndex:
+    def __init__(self, lat0, node_xy, edge_u, edge_v, sample_edge, samples, half_piece):
+        self.lat0 = float(lat0)
+        self.cos0 = math.cos(math.radians(self.lat0))
+        self.node_xy = node_xy          # (N, 2) projected node coordinates
+        self.edge_u = edge_u            # (E,) road segments, one per node pair
+        self.edge_v = edge_v
+        self.sample_edge = sample_edge  # segment of each sample point
+        self.samples = samples          # (S, 2) projected sample points
+        self.half_piece = float(half_piece)
+
+        from scipy.spatial import cKDTree
+
+        with span("graph.build_snap_index"):
+            # Unbalanced trees build several times faster and query about as fast
+            self.node_tree = cKDTree(node_xy, balanced_tree=False, compact_nodes=False)
+            self.sample_tree = cKDTree(
+                samples if len(samples) else np.empty((0, 2)), balanced_tree=False, compact_nodes=False,
+            )
+
+    @classmethod
+    def build(cls, graph) -> "SnapIndex":
+        lat0 = float(graph.y.mean()) if graph.num_nodes else 0.0
+        cos0 = math.cos(math.radians(lat0))
+        node_xy = np.column_stack([graph.x * cos0, graph.y]) * M_PER_DEG
+
+        # One segment per node pair: u < v, or a one-way edge with no reverse
+        src = np.repeat(np.arange(graph.num_nodes, dtype=np.int64), np.diff(graph.indptr))
+        dst = graph.indices.astype(np.int64)
+        keep = (src < dst) | ((src > dst) & np.isnan(graph.edge_length_m(dst, src)))
+        edge_u, edge_v = src[keep], dst[keep]
+
+        a, b = node_xy[edge_u], node_xy[edge_v]
+        seg_len = np.hypot(*(b - a).T)
+        pieces = np.maximum(1, np.ceil(seg_len / EDGE_SAMPLE_M)).astype(np.int64)
+        sample_edge = np.repeat(np.arange(len(edge_u)), pieces)
+        first = np.cumsum(pieces) - pieces
+        t = (np.arange(len(sample_edge)) - first[sample_edge] + 0.5) / pieces[sample_edge]
+        samples = a[sample_edge] + (b - a)[sample_edge] * t[:, None]
+        half_piece = float((seg_len / pieces).max()) / 2 if len(seg_len) else 0.0
+        return cls(lat0, node_xy, edge_u, edge_v, sample_edge, samples, half_piece)
+
+    def subset(self, idx) -> "SnapIndex":
+        """
+        Index of the subgraph on node indices idx (sorted, as CompactGraph.clip
+        keeps them): its nodes and the segments with both ends kept, in the
+        subgraph's numbering. Only the trees are rebuilt.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        remap = np.full(self.num_nodes, -1, dtype=np.int64)
+        remap[idx] = np.arange(len(idx))
+        u, v = remap[self.edge_u], remap[self.edge_v]
+        keep = (u >= 0) & (v >= 0)
+        edge_id = np.cumsum(keep) - 1
+        sample_keep = keep[self.sample_edge]
+        return SnapIndex(
+            self.lat0, self.node_xy[idx], u[keep], v[keep],
+            edge_id[self.sample_edge[sample_keep]], self.samples[sample_keep], self.half_piece,
+        )
+
+    def arrays(self) -> dict:
+        """Arrays for GraphStore.put_aux (no trees: they are rebuilt on load)."""
+        return {
+            "version": np.int64(INDEX_VERSION),
+            "lat0": np.float64(self.lat0),
+            "half_piece": np.float64(self.half_piece),
+            "node_xy": self.node_xy,
+            "edge_u": self.edge_u,
+            "edge_v": self.edge_v,
+            "sample_edge": self.sample_edge,
+            "samples": self.samples,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: dict) -> "SnapIndex":
+        if int(arrays["version"]) != INDEX_VERSION:
+            raise ValueError("snap index version mismatch")
+        return cls(
+            float(arrays["lat0"]), arrays["node_xy"], arrays["edge_u"], arrays["edge_v"],
+            arrays["sample_edge"], arrays["samples"], float(arrays["half_piece"]),
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_xy)
+
+    def project(self, lng, lat) -> np.ndarray:
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        return np.column_stack([lng * self.cos0, lat]) * M_PER_DEG
+
+    def snap_nodes(self, lng, lat, max_distance_m: float = math.inf):
+        """(node index, distance in meters) per point; node -1 where none is within max_distance_m."""
+        xy = self.project(lng, lat)
+        if self.num_nodes == 0:
+            raise ValueError("graph has no nodes")
+        with span("routing.snap_nodes"):
+            dist, node = self.node_tree.query(xy, k=1, distance_upper_bound=max_distance_m)
+        node = np.where(np.isfinite(dist), node, -1).astype(np.int64)
+        return node, dist
+
+    def snap_edges(self, lng, lat, max_distance_m: float = math.inf) -> dict:
+        """
+        Nearest point on a road segment per point: {"u", "v" (segment end
+        nodes, -1 where nothing is within max_distance_m), "t" (position
+        along u -> v, 0..1), "distance_m", "lng", "lat" (snapped point, or
+        the input point when unsnapped)}.
+        """
+        xy = self.project(lng, lat)
+        n = len(xy)
+        out = {
+            "u": np.full(n, -1, dtype=np.int64), "v": np.full(n, -1, dtype=np.int64),
+            "t": np.zeros(n), "distance_m": np.full(n, np.inf),
+            "lng": np.asarray(lng, dtype=np.float64).copy(), "lat": np.asarray(lat, dtype=np.float64).copy(),
+        }
+        if n == 0 or len(self.edge_u) == 0:
+            return out
+
+        with span("routing.snap_edges"):
+            k = min(SNAP_CANDIDATES, len(self.sample_edge))
+            dist, idx = self.sample_tree.query(xy, k=k)
+            dist, idx = dist.reshape(n, k), idx.reshape(n, k)
+            radius = np.minimum(dist[:, 0], max_distance_m) + self.half_piece
+            query = np.repeat(np.arange(n), k)
+            sample = idx.ravel()
+            # Points whose ball holds more than k samples: ask for all of them
+            crowded = np.flatnonzero(dist[:, -1] <= radius) if k < len(self.sample_edge) else []
+            if len(crowded):
+                within = self.sample_tree.query_ball_point(xy[crowded], radius[crowded], return_sorted=False)
+                counts = np.fromiter((len(w) for w in within), dtype=np.int64, count=len(crowded))
+                query = np.concatenate([query, np.repeat(crowded, counts)])
+                sample = np.concatenate([sample, np.concatenate([np.asarray(w, dtype=np.int64) for w in within])])
+            # Candidates may repeat a segment; that does not change the minimum
+            edge = self.sample_edge[sample]
+            a, b, p = self.node_xy[self.edge_u[edge]], self.node_xy[self.edge_v[edge]], xy[query]
+            ab = b - a
+            seg2 = (ab * ab).sum(axis=1)
+            t = np.clip(np.divide(((p - a) * ab).sum(axis=1), seg2, out=np.zeros(len(seg2)), where=seg2 > 0), 0, 1)
+            foot = a + ab * t[:, None]
+            dist = np.hypot(*(p - foot).T)
+
+            # Best of the k nearest per point, then of the extra ball candidates
+            best = np.arange(n) * k + np.argmin(dist[:n * k].reshape(n, k), axis=1)
+            if len(query) > n * k:
+                extra = n * k + np.lexsort((dist[n * k:], query[n * k:]))
+                extra = extra[np.r_[True, query[extra][1:] != query[extra][:-1]]]
+                better = dist[extra] < dist[best[query[extra]]]
+                best[query[extra][better]] = extra[better]
+            best = best[dist[best] <= max_distance_m]
+
+        q = query[best]
+        out["u"][q] = self.edge_u[edge[best]]
+        out["v"][q] = self.edge_v[edge[best]]
+        out["t"][q] = t[best]
+        out["distance_m"][q] = dist[best]
+        out["lng"][q] = foot[best, 0] / (M_PER_DEG * self.cos0)
+        out["lat"][q] = foot[best, 1] / M_PER_DEG
+        return out
+
+
+def index_for(graph) -> SnapIndex:
+    """The SnapIndex attached to this graph object, built on first use."""
+    index = getattr(graph, "_snap_index", None)
+    if index is None or index.num_nodes != graph.num_nodes:
+        index = SnapIndex.build(graph)
+        attach(graph, index)
+    return index
+
+
+def attach(graph, index: SnapIndex):
+    graph._snap_index = index
+
+
+def snap_demand(index: SnapIndex, demand, max_distance_m: float):
+    """
+    Copy of a DEMAND_DTYPE array with points moved onto the nearest road
+    segment when one is within max_distance_m; other points are unchanged.
+    """
+    snapped = demand.copy()
+    hit = index.snap_edges(demand["lng"], demand["lat"], max_distance_m)
+    ok = hit["u"] >= 0
+    snapped["lng"][ok] = hit["lng"][ok]
+    snapped["lat"][ok] = hit["lat"][ok]
+    return snapped
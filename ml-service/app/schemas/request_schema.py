@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional, Union
 
 class Coordinate(BaseModel):
     lat: float
@@ -11,4 +11,33 @@ class OptimizeRequest(BaseModel):
     num_buses: int
     operating_hours: int
     avg_speed_kmph: float
-    parameters: Dict = {}
\ No newline at end of file
+    parameters: Dict = {}
+
+class Stop(BaseModel):
+    lat: float
+    lng: float
+    id: Optional[int] = None
+
+class AddStopRequest(BaseModel):
+    stops: List[Stop] = []
+    point: Coordinate
+    min_stop_distance_m: float = 300
+    merge: bool = False
+
+class ScenarioUpdate(BaseModel):
+    num_buses: Optional[int] = None
+    avg_speed_kmph: Optional[float] = None
+    parameters: Dict = {}
+
+class SweepRange(BaseModel):
+    start: float
+    stop: float  # inclusive
+    step: float = 1
+
+class SweepSpec(BaseModel):
+    num_buses: Optional[Union[List[int], SweepRange]] = None
+    avg_speed_kmph: Optional[Union[List[float], SweepRange]] = None
+    parameters: Dict = {}
+
+class OptimizeSweepRequest(OptimizeRequest):
+    sweep: SweepSpec
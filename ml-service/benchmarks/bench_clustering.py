@@ -0,0 +1,73 @@
+"""Stop clustering benchmark: wall time and peak RSS against input size.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_clustering
+    python -m benchmarks.bench_clustering --sizes 100000 1000000 5000000 --modes minibatch
+
+Each case runs in a fresh subprocess so ru_maxrss reflects that case alone.
+"Input MB" is the RSS after the weighted demand array has been built;
+"Peak MB" is the high-water mark after clustering.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Exact KMeans is skipped above this size unless requested explicitly
+EXACT_LIMIT = 200_000
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_case(n: int, mode: str) -> dict:
+    from app.clustering.stop_generator import generate_bus_stops
+    from app.preprocessing.demand_simulator import simulate_demand
+
+    rng = np.random.default_rng(0)
+    pts = np.column_stack([18.9 + rng.random(n) * 0.1, 72.8 + rng.random(n) * 0.1])
+    demand = simulate_demand(pts)
+    del pts
+    input_mb = _rss_mb()
+
+    t0 = time.perf_counter()
+    stops = generate_bus_stops(demand, area_km2=100, mode=mode)
+    return {
+        "n": n, "mode": mode, "seconds": time.perf_counter() - t0,
+        "input_mb": input_mb, "peak_mb": _rss_mb(), "stops": len(stops),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--modes", nargs="+", default=["kmeans", "minibatch"])
+    parser.add_argument("--case", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(int(args.case[0]), args.case[1])))
+        return
+
+    print(f"{'points':>10}  {'mode':<10}{'seconds':>10}{'input MB':>10}{'peak MB':>10}{'stops':>7}")
+    for n in args.sizes:
+        for mode in args.modes:
+            if mode == "kmeans" and n > EXACT_LIMIT and args.modes != ["kmeans"]:
+                continue
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_clustering", "--case", str(n), mode],
+                capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['n']:>10,}  {r['mode']:<10}{r['seconds']:>10.2f}"
+                  f"{r['input_mb']:>10.0f}{r['peak_mb']:>10.0f}{r['stops']:>7}")
+
+
+if __name__ == "__main__":
+    main()
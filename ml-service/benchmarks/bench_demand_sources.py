@@ -0,0 +1,58 @@
+"""Raster demand-source benchmark: read time and peak memory vs raster size.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_demand_sources
+    python -m benchmarks.bench_demand_sources --side 40000 --max-cells 200000
+
+Writes a sparse side x side float32 raster (0.001° cells, mostly zero) to a
+temporary file and reads a city-sized and a whole-raster window through
+preprocessing.demand_sources.raster_demand. Peak RSS should stay flat while
+the window grows; only the output cells (at most --max-cells) are kept.
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+from shapely.geometry import box
+
+from app.preprocessing.demand_sources import raster_demand
+
+WEST, NORTH, CELL = 68.0, 36.0, 0.001
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--side", type=int, default=20000)
+    parser.add_argument("--max-cells", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pop.bin")
+        raster = np.memmap(path, dtype="<f4", mode="w+", shape=(args.side, args.side))
+        raster[::97, ::89] = 5.0
+        raster.flush()
+        del raster
+        header = {
+            "path": path, "format": "raw", "dtype": "<f4", "shape": [args.side, args.side],
+            "geotransform": [WEST, CELL, 0, NORTH, 0, -CELL],
+        }
+        span_deg = args.side * CELL
+        windows = {
+            "city": box(WEST + span_deg / 2, NORTH - span_deg / 2 - 0.3, WEST + span_deg / 2 + 0.2, NORTH - span_deg / 2),
+            "whole": box(WEST, NORTH - span_deg, WEST + span_deg, NORTH),
+        }
+        print(f"{args.side:,} x {args.side:,} raster ({os.path.getsize(path) / 1e9:.1f} GB)")
+        print(f"{'window':<8}{'cells':>10}{'seconds':>10}{'peak RSS MB':>13}")
+        for name, polygon in windows.items():
+            t0 = time.perf_counter()
+            demand = raster_demand(header, polygon, args.max_cells)
+            elapsed = time.perf_counter() - t0
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{name:<8}{len(demand):>10,}{elapsed:>10.2f}{peak_mb:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Haversine kernel benchmark: per-pair Python loops vs the NumPy kernel.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_geo
+    python -m benchmarks.bench_geo --sizes 50 500 5000
+
+Times the three shapes the pipeline uses: the NxN stop matrix
+(build_distance_matrix), nearest-neighbour ordering (order_route_nn) and the
+cumulative length along a path (route_distance).
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from app.optimization.frequency_calculator import route_distance
+from app.routing.route_builder import build_distance_matrix, order_route_nn
+
+
+def _legacy_dist(a, b):
+    R = 6371.0
+    lat1, lat2 = math.radians(a["lat"]), math.radians(b["lat"])
+    dlat = lat2 - lat1
+    dlng = math.radians(b["lng"] - a["lng"])
+    h = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng/2)**2
+    return R * 2 * math.asin(math.sqrt(min(1.0, h)))
+
+
+def _legacy_matrix(stops):
+    n = len(stops)
+    D = np.zeros((n, n))
+    for i in range(n):
+        for j in range(i+1, n):
+            D[i][j] = D[j][i] = _legacy_dist(stops[i], stops[j])
+    return D
+
+
+def _legacy_nn(stops):
+    remaining = list(stops)
+    start = max(remaining, key=lambda s: s["lat"])
+    remaining.remove(start)
+    ordered = [start]
+    while remaining:
+        nxt = min(remaining, key=lambda s: _legacy_dist(ordered[-1], s))
+        ordered.append(nxt)
+        remaining.remove(nxt)
+    return ordered
+
+
+def _legacy_path(route):
+    return sum(_legacy_dist(route[i], route[i + 1]) for i in range(len(route) - 1))
+
+
+def _time(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'stops':>6}  {'kernel':<14}{'loop ms':>12}{'numpy ms':>12}{'speedup':>10}")
+    for n in args.sizes:
+        stops = [
+            {"id": i, "lat": 18.9 + rng.uniform(0, 0.2), "lng": 72.8 + rng.uniform(0, 0.1)}
+            for i in range(n)
+        ]
+        cases = [
+            ("matrix", _legacy_matrix, build_distance_matrix),
+            ("nn-order", _legacy_nn, order_route_nn),
+            ("path-length", _legacy_path, route_distance),
+        ]
+        for name, old, new in cases:
+            t_old, r_old = _time(old, stops)
+            t_new, r_new = _time(new, stops)
+            if name == "nn-order":
+                assert [s["id"] for s in r_old] == [s["id"] for s in r_new]
+            else:
+                assert np.allclose(r_old, r_new)
+            print(f"{n:>6}  {name:<14}{t_old * 1e3:>12.2f}{t_new * 1e3:>12.2f}{t_old / t_new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
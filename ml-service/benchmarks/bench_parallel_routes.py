@@ -0,0 +1,52 @@
+"""Route ordering + snapping benchmark: in-process vs the route worker pool.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_parallel_routes
+    python -m benchmarks.bench_parallel_routes --side 320 --stops 2000 --routes 32 --workers 1 4 8 16
+
+Builds routes over a synthetic grid city (benchmarks.bench_routing) with
+build_routes(workers=N) for each N. The pool is warmed up (processes
+spawned, graph mapped) before timing, as it is on a long-running service.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.routing.parallel_routes import get_route_pool
+from app.routing.route_builder import build_routes
+from benchmarks.bench_routing import synthetic_city
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--side", type=int, default=160)
+    parser.add_argument("--stops", type=int, default=800)
+    parser.add_argument("--routes", type=int, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--budget-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    graph = synthetic_city(args.side)
+    rng = np.random.default_rng(0)
+    span_deg = args.side * 0.001
+    stops = [
+        {"id": i + 1, "lat": float(19.0 + rng.uniform(0, span_deg)), "lng": float(72.8 + rng.uniform(0, span_deg))}
+        for i in range(args.stops)
+    ]
+    print(f"{graph.num_nodes:,} nodes, {args.stops} stops, {args.routes} routes")
+    print(f"{'workers':>8}{'seconds':>10}{'speed-up':>10}")
+    base = None
+    for workers in args.workers:
+        if workers > 1:
+            list(get_route_pool(workers).map(int, range(workers)))
+            build_routes(stops, args.routes, G=graph, time_budget_s=args.budget_ms / 1000, workers=workers)
+        t0 = time.perf_counter()
+        build_routes(stops, args.routes, G=graph, time_budget_s=args.budget_ms / 1000, workers=workers)
+        elapsed = time.perf_counter() - t0
+        base = base or elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{base / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
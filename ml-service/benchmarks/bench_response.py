@@ -0,0 +1,85 @@
+"""Response encoding benchmark: payload size and encode time per format.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_response
+    python -m benchmarks.bench_response --routes 16 --path-nodes 200 2000 --stops 1000
+
+Builds synthetic optimize results (routes with road-node paths sharing a
+stop table) and encodes them with FastAPI's jsonable_encoder + json (how
+the default response used to be produced) and with each
+core.response_format encoding. Sizes are also reported gzip-compressed.
+"""
+import argparse
+import gzip
+import json
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from app.core.response_format import encode_result, msgpack, orjson
+
+
+def synthetic_result(n_routes: int, path_nodes: int, n_stops: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    stops = [
+        {"id": i + 1, "lat": float(18.9 + rng.uniform(0, 0.12)), "lng": float(72.8 + rng.uniform(0, 0.06))}
+        for i in range(n_stops)
+    ]
+    routes = []
+    for r in range(n_routes):
+        walk = np.cumsum(rng.normal(0, 0.0004, (path_nodes, 2)), axis=0) + [18.95, 72.83]
+        members = rng.choice(n_stops, size=min(n_stops, max(2, n_stops // n_routes)), replace=False)
+        routes.append({
+            "route_id": f"R{r + 1}",
+            "stops": len(members),
+            "stops_list": [stops[i] for i in members],
+            "distance_km": 12.3,
+            "travel_time_min": 36.9,
+            "buses_assigned": 4,
+            "frequency_min": 18.5,
+            "avg_wait_time_min": 9.2,
+            "demand_score": 51.0,
+            "path": [{"lat": float(a), "lng": float(b)} for a, b in walk],
+        })
+    return {
+        "status": "completed",
+        "city": "Synthetic",
+        "stops": stops,
+        "routes": routes,
+        "metrics": {"coverage": 0.91, "total_routes": n_routes},
+    }
+
+
+def _encode(result, fmt):
+    if fmt == "jsonable_encoder":
+        return json.dumps(jsonable_encoder(result)).encode()
+    body, _ = encode_result(result, fmt)
+    return body if isinstance(body, bytes) else b"".join(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=16)
+    parser.add_argument("--path-nodes", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--stops", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    formats = ["jsonable_encoder", "json", "compact", "geojson"] + (["msgpack"] if msgpack is not None else [])
+    print(f"orjson: {'yes' if orjson is not None else 'no (stdlib json)'}, msgpack: {'yes' if msgpack is not None else 'no'}")
+    for nodes in args.path_nodes:
+        result = synthetic_result(args.routes, nodes, args.stops)
+        print(f"\n{args.routes} routes x {nodes} path nodes, {args.stops} stops")
+        print(f"{'format':<16}{'bytes':>12}{'gzip bytes':>12}{'encode ms':>12}")
+        for fmt in formats:
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                body = _encode(result, fmt)
+                best = min(best, time.perf_counter() - t0)
+            print(f"{fmt:<16}{len(body):>12,}{len(gzip.compress(body, 6)):>12,}{best * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Point-to-point routing benchmark: nx.shortest_path vs CSR Dijkstra vs ALT A*.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_routing
+    python -m benchmarks.bench_routing --graph /data/graphs/<key>.npz --queries 200
+
+Without --graph, perturbed grid road networks at typical city sizes are used
+(about 5k, 25k and 100k nodes). Stored graphs from the graph store can be
+passed with --graph to measure on real city networks.
+"""
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from app.routing.graph_builder import CompactGraph, from_edge_arrays
+from app.routing.path_solver import alt_shortest_path, build_landmarks
+
+CITY_SIZES = {"town": 70, "city": 160, "metro": 320}  # grid side -> ~5k / 25k / 100k nodes
+
+
+def synthetic_city(side: int, seed: int = 0) -> CompactGraph:
+    """Grid street network with 15% of streets removed and jittered block lengths."""
+    rng = np.random.default_rng(seed)
+    idx = np.arange(side * side).reshape(side, side)
+    u = np.concatenate([idx[:, :-1].ravel(), idx[:-1, :].ravel()])
+    v = np.concatenate([idx[:, 1:].ravel(), idx[1:, :].ravel()])
+    keep = rng.random(len(u)) > 0.15
+    u, v = u[keep], v[keep]
+    w = rng.uniform(60, 180, len(u))
+    ys, xs = np.divmod(np.arange(side * side), side)
+    return from_edge_arrays(
+        np.arange(side * side),
+        72.8 + xs * 0.001,
+        19.0 + ys * 0.001,
+        np.concatenate([u, v]),
+        np.concatenate([v, u]),
+        np.concatenate([w, w]),
+    )
+
+
+def _timeit(fn, pairs):
+    t0 = time.perf_counter()
+    for a, b in pairs:
+        fn(a, b)
+    return (time.perf_counter() - t0) / len(pairs)
+
+
+def bench(name: str, graph: CompactGraph, queries: int, landmarks: int):
+    rng = np.random.default_rng(1)
+    pairs = [tuple(p) for p in rng.integers(0, graph.num_nodes, (queries, 2)).tolist()]
+
+    G = graph.to_networkx()
+    ids = graph.node_ids.tolist()
+    csr = graph.to_csr()
+
+    t0 = time.perf_counter()
+    index = build_landmarks(graph, landmarks)
+    alt_pre = time.perf_counter() - t0
+
+    def nx_query(a, b):
+        try:
+            nx.shortest_path(G, ids[a], ids[b], weight="length")
+        except nx.NetworkXNoPath:
+            pass
+
+    t_nx = _timeit(nx_query, pairs)
+    t_csr = _timeit(lambda a, b: dijkstra(csr, indices=a, return_predecessors=True), pairs)
+    t_alt = _timeit(lambda a, b: alt_shortest_path(graph, index, a, b), pairs)
+
+    print(
+        f"{name:<10}{graph.num_nodes:>9,}{graph.num_edges:>10,}"
+        f"{alt_pre * 1e3:>12.1f}{t_nx * 1e3:>12.2f}{t_csr * 1e3:>12.2f}{t_alt * 1e3:>12.2f}"
+        f"{t_nx / t_alt:>9.1f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--graph", action="append", default=[], help="stored CompactGraph .npz")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--landmarks", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'graph':<10}{'nodes':>9}{'edges':>10}{'ALT pre ms':>12}"
+          f"{'nx ms/q':>12}{'csr ms/q':>12}{'ALT ms/q':>12}{'vs nx':>10}")
+    if args.graph:
+        for path in args.graph:
+            with np.load(path) as data:
+                graph = CompactGraph(**{k: data[k] for k in data.files})
+            bench(path.rsplit("/", 1)[-1][:10], graph, args.queries, args.landmarks)
+    else:
+        for name, side in CITY_SIZES.items():
+            bench(name, synthetic_city(side), args.queries, args.landmarks)
+
+
+if __name__ == "__main__":
+    main()
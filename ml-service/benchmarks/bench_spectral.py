@@ -0,0 +1,73 @@
+"""Corridor clustering benchmark: dense RBF vs sparse kNN affinity.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_spectral
+    python -m benchmarks.bench_spectral --sizes 100 1000 10000 --routes 16
+
+Each case runs in a fresh subprocess so ru_maxrss is per case. "Base MB" is
+the RSS before clustering, "Peak MB" the high-water mark after it. Dense
+affinity is skipped above --dense-limit stops (10k stops need ~2.4 GB).
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_case(n: int, mode: str, routes: int) -> dict:
+    from app.routing.route_builder import _eigen_solver, cluster_stops_spectral
+
+    rng = np.random.default_rng(0)
+    stops = [
+        {"id": i, "lat": 18.9 + rng.random() * 0.2, "lng": 72.8 + rng.random() * 0.1}
+        for i in range(n)
+    ]
+    base_mb = _rss_mb()
+    t0 = time.perf_counter()
+    groups = cluster_stops_spectral(stops, routes, affinity_mode=mode)
+    return {
+        "n": n, "mode": mode, "seconds": time.perf_counter() - t0,
+        "base_mb": base_mb, "peak_mb": _rss_mb(), "groups": len(groups),
+        "solver": _eigen_solver() if mode == "knn" else "arpack",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--routes", type=int, default=16)
+    parser.add_argument("--dense-limit", type=int, default=5000)
+    parser.add_argument("--case", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        n, mode, routes = args.case
+        print(json.dumps(run_case(int(n), mode, int(routes))))
+        return
+
+    print(f"{'stops':>7}  {'affinity':<9}{'solver':<8}{'seconds':>9}{'base MB':>9}{'peak MB':>9}{'groups':>8}")
+    for n in args.sizes:
+        for mode in ("dense", "knn"):
+            if mode == "dense" and n > args.dense_limit:
+                print(f"{n:>7,}  {mode:<9}{'-':<8}{'skipped':>9}")
+                continue
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_spectral", "--case", str(n), mode, str(args.routes)],
+                capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['n']:>7,}  {r['mode']:<9}{r['solver']:<8}{r['seconds']:>9.2f}"
+                  f"{r['base_mb']:>9.0f}{r['peak_mb']:>9.0f}{r['groups']:>8}")
+
+
+if __name__ == "__main__":
+    main()
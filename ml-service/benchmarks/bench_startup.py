@@ -0,0 +1,99 @@
+"""Cold-start benchmark: import time and first-request latency.
+
+Usage (from ml-service/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 5 --side 160
+
+Every measurement runs in a fresh interpreter:
+  import    seconds to `import app.main`
+  cold      first and second POST /optimize right after import
+  warm      the same after core.warmup.warm_up() (its time reported too)
+
+The road graph is a synthetic grid city (benchmarks.bench_routing) put in a
+temporary graph store, so no download is involved and the numbers isolate
+import, first-call and pipeline costs. Requests bypass the result cache.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BOUNDARY = [(19.02, 72.82), (19.02, 72.90), (19.10, 72.90), (19.10, 72.82)]
+
+
+def _payload() -> dict:
+    return {
+        "city_name": "Synthetic",
+        "boundary": [{"lat": lat, "lng": lng} for lat, lng in BOUNDARY],
+        "num_buses": 30,
+        "operating_hours": 16,
+        "avg_speed_kmph": 20.0,
+        "parameters": {"cache": False},
+    }
+
+
+def _child(mode: str):
+    t0 = time.perf_counter()
+    import app.main  # noqa: F401
+    out = {"import_s": time.perf_counter() - t0}
+
+    if mode != "import":
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        if mode == "warm":
+            from app.core.warmup import warm_up
+
+            t0 = time.perf_counter()
+            warm_up(bboxes=[(72.82, 19.02, 72.90, 19.10)], pools=False)
+            out["warmup_s"] = time.perf_counter() - t0
+        client = TestClient(app)
+        for key in ("first_s", "second_s"):
+            t0 = time.perf_counter()
+            response = client.post("/optimize", json=_payload())
+            out[key] = time.perf_counter() - t0
+            assert response.status_code == 200, response.text
+    print(json.dumps(out))
+
+
+def _run(mode: str, data_dir: str) -> dict:
+    env = {**os.environ, "ML_DATA_DIR": data_dir, "ML_WARMUP": "0"}
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", mode],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--side", type=int, default=160, help="synthetic city grid side")
+    parser.add_argument("--child", choices=["import", "cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["ML_DATA_DIR"] = data_dir
+        from app.routing.osm_loader import get_graph_store
+        from benchmarks.bench_routing import synthetic_city
+
+        graph = synthetic_city(args.side)
+        get_graph_store().put(graph.bounds, graph)
+
+        print(f"{'run':<8}{'import s':>10}{'warm-up s':>11}{'1st req s':>11}{'2nd req s':>11}")
+        for mode in ("import", "cold", "warm"):
+            runs = [_run(mode, data_dir) for _ in range(args.repeat)]
+            best = {k: min(r[k] for r in runs) for k in runs[0]}
+            cells = [best.get(k) for k in ("import_s", "warmup_s", "first_s", "second_s")]
+            print(f"{mode:<8}" + "".join(f"{'-' if c is None else f'{c:.3f}':>{w}}" for c, w in zip(cells, (10, 11, 11, 11))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from app.routing.graph_builder import from_edge_arrays
+
+
+def _grid_graph(n=10, step=0.001):
+    """n x n street grid at (72.8, 19.0), 100 m two-way edges."""
+    xs, ys = np.meshgrid(72.8 + np.arange(n) * step, 19.0 + np.arange(n) * step)
+    u, v = [], []
+    for i in range(n):
+        for j in range(n):
+            k = i * n + j
+            if j < n - 1:
+                u += [k, k + 1]
+                v += [k + 1, k]
+            if i < n - 1:
+                u += [k, k + n]
+                v += [k + n, k]
+    return from_edge_arrays(np.arange(n * n) + 1000, xs.ravel(), ys.ravel(), u, v, np.full(len(u), 100.0))
+
+
+@pytest.fixture
+def grid_graph():
+    """Factory: grid_graph(n=10, step=0.001) builds a fresh grid CompactGraph."""
+    return _grid_graph
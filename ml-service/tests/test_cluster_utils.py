@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.clustering.cluster_utils import MINIBATCH_THRESHOLD, choose_mode, cluster_points, weighted_kmeans
+
+CENTRES = np.array([[19.00, 72.80], [19.00, 72.95], [19.12, 72.88]])
+
+
+def _blobs(n_per, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.concatenate([c + rng.normal(0, 0.005, (n_per, 2)) for c in CENTRES])
+
+
+def _sorted(centers):
+    return centers[np.lexsort(centers.T[::-1])]
+
+
+def test_choose_mode():
+    assert choose_mode(MINIBATCH_THRESHOLD) == "kmeans"
+    assert choose_mode(MINIBATCH_THRESHOLD + 1) == "minibatch"
+    assert choose_mode(10, "minibatch") == "minibatch"
+    with pytest.raises(ValueError):
+        weighted_kmeans(_blobs(5), np.ones(15), 2, mode="lloyd")
+
+
+@pytest.mark.parametrize("mode", ["kmeans", "minibatch"])
+def test_single_center_is_weighted_mean(mode):
+    points = _blobs(2000)
+    weights = np.random.default_rng(1).uniform(0.1, 5.0, len(points))
+    center = weighted_kmeans(points, weights, 1, mode=mode)[0]
+    expected = np.average(points, axis=0, weights=weights)
+    assert np.abs(center - expected).max() < (1e-9 if mode == "kmeans" else 2e-3)
+
+
+def test_minibatch_matches_exact_and_is_seeded(tmp_path):
+    points = _blobs(20_000)
+    weights = np.ones(len(points))
+    exact = _sorted(weighted_kmeans(points, weights, 3, mode="kmeans"))
+    mini = _sorted(weighted_kmeans(points, weights, 3, mode="minibatch"))
+    assert np.abs(mini - exact).max() < 1e-3
+    assert np.allclose(mini, _sorted(weighted_kmeans(points, weights, 3, mode="minibatch")))
+
+    # Memmapped input gives the same centers
+    mm = np.memmap(tmp_path / "points.bin", dtype=np.float64, mode="w+", shape=points.shape)
+    mm[:] = points
+    assert np.allclose(mini, _sorted(weighted_kmeans(mm, weights, 3, mode="minibatch")))
+
+
+def test_cluster_points_partitions_input():
+    points = [tuple(p) for p in _blobs(50)]
+    groups = cluster_points(points, k=3)
+    assert sorted(len(g) for g in groups) == [50, 50, 50]
+    assert sorted(p for g in groups for p in g) == sorted(points)
+    assert cluster_points([], k=3) == []
+    assert len(cluster_points(points[:2], k=8)) == 2
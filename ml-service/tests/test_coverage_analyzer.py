@@ -0,0 +1,58 @@
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from app.analytics.coverage_analyzer import (
+    _transformer,
+    corridor_coverage,
+    project,
+    project_geometry,
+    stop_coverage,
+    utm_epsg,
+    voronoi_cells,
+    walk_circles,
+)
+
+AREA = Polygon([(72.80, 18.90), (72.86, 18.905), (72.87, 19.02), (72.79, 19.03)])
+
+
+def _union_reference(lng, lat, radius_m):
+    epsg = utm_epsg(72.83, 18.96)
+    x, y = project(lng, lat, epsg)
+    area_m = project_geometry(AREA, epsg)
+    return shapely.intersection(shapely.union_all(walk_circles(x, y, radius_m)), area_m).area / area_m.area
+
+
+def test_stop_coverage_matches_union_of_circles():
+    rng = np.random.default_rng(3)
+    for n, radius in ((2, 400), (300, 500), (1500, 150)):
+        lng = rng.uniform(72.78, 72.88, n)
+        lat = rng.uniform(18.89, 19.04, n)
+        assert abs(stop_coverage(AREA, lng, lat, radius) - _union_reference(lng, lat, radius)) < 1e-5
+
+
+
+def test_voronoi_cells_without_ordered_support(monkeypatch):
+    rng = np.random.default_rng(4)
+    points = shapely.points(rng.uniform(0, 1000, (200, 2)))
+    extent = shapely.box(-100, -100, 1100, 1100)
+    ordered = voronoi_cells(points, extent)
+
+    voronoi = shapely.voronoi_polygons
+
+    def old_voronoi(geometry, ordered=None, **kwargs):
+        if ordered is not None:
+            raise TypeError("voronoi_polygons() got an unexpected keyword argument 'ordered'")
+        return voronoi(geometry, **kwargs)
+
+    monkeypatch.setattr(shapely, "voronoi_polygons", old_voronoi)
+    matched = voronoi_cells(points, extent)
+    assert shapely.equals(matched, ordered).all()
+    assert shapely.within(points, matched).all()
+
+def test_corridor_coverage_and_cached_transformer():
+    path = [(72.83, 18.91), (72.83, 19.02)]
+    frac = corridor_coverage(AREA, [path], 200)
+    # ~12 km x 400 m corridor in a ~8 km x 13 km polygon
+    assert 0.03 < frac < 0.06
+    assert _transformer(utm_epsg(72.83, 18.96)) is _transformer(utm_epsg(72.83, 18.96))
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from app.preprocessing.demand_sources import (
+    DemandSourceError,
+    list_sources,
+    load_demand,
+    raster_demand,
+    sampling_options,
+)
+from app.preprocessing.polygon_processor import coords_to_polygon
+
+# 200 x 300 cells of 0.01°, north-west corner at (72.0, 20.0)
+GEOTRANSFORM = [72.0, 0.01, 0, 20.0, 0, -0.01]
+
+
+def _raw_raster(tmp_path):
+    values = np.ones((200, 300), dtype="<f4")
+    values[:10] = -1.0  # nodata rows
+    values.tofile(tmp_path / "pop.bin")
+    return {"path": tmp_path / "pop.bin", "format": "raw", "dtype": "<f4", "shape": [200, 300],
+            "geotransform": GEOTRANSFORM, "nodata": -1.0}
+
+
+def test_crops_to_polygon(tmp_path):
+    header = _raw_raster(tmp_path)
+    demand = raster_demand(header, box(72.5, 19.0, 72.6, 19.2), max_cells=10_000)
+    assert len(demand) == 10 * 20 and np.all(demand["weight"] == 1.0)
+    assert demand["lng"].min() > 72.5 and demand["lat"].max() < 19.2
+
+    # Partly off the raster and over nodata rows
+    assert len(raster_demand(header, box(71.0, 19.85, 72.05, 21.0), max_cells=10_000)) == 5 * 5
+    assert len(raster_demand(header, box(80.0, 10.0, 81.0, 11.0), max_cells=10_000)) == 0
+
+
+def test_block_sums_large_windows(tmp_path):
+    header = _raw_raster(tmp_path)
+    area = box(72.0, 18.0, 75.0, 19.9)  # 190 x 300 valid cells
+    demand = raster_demand(header, area, max_cells=1_000)
+    assert len(demand) <= 1_000
+    assert demand["weight"].sum() == pytest.approx(190 * 300)
+
+
+def test_named_sources(tmp_path, monkeypatch):
+    monkeypatch.setenv("ML_DATA_DIR", str(tmp_path))
+    (tmp_path / "demand").mkdir()
+    np.save(tmp_path / "demand" / "pop.npy", np.full((200, 300), 2.0))
+    (tmp_path / "demand" / "pop.json").write_text(json.dumps({"path": "pop.npy", "geotransform": GEOTRANSFORM}))
+    assert list_sources() == ["synthetic", "pop"]
+
+    boundary = [{"lat": lat, "lng": lng} for lat, lng in [(19.0, 72.5), (19.0, 72.6), (19.1, 72.6)]]
+    demand = load_demand("pop", boundary, coords_to_polygon(boundary))
+    assert 0 < len(demand) < 100 and np.all(demand["weight"] == 2.0)
+    with pytest.raises(DemandSourceError):
+        load_demand("../pop", boundary, coords_to_polygon(boundary))
+    with pytest.raises(DemandSourceError):
+        load_demand("missing", boundary, coords_to_polygon(boundary))
+
+
+@pytest.mark.parametrize("header", ["{not json", json.dumps({"format": "npy"}), json.dumps([1, 2])])
+def test_bad_headers_are_source_errors(tmp_path, monkeypatch, header):
+    monkeypatch.setenv("ML_DATA_DIR", str(tmp_path))
+    (tmp_path / "demand").mkdir()
+    (tmp_path / "demand" / "bad.json").write_text(header)
+    boundary = [{"lat": lat, "lng": lng} for lat, lng in [(19.0, 72.5), (19.0, 72.6), (19.1, 72.6)]]
+    with pytest.raises(DemandSourceError):
+        load_demand("bad", boundary, coords_to_polygon(boundary))
+
+
+def test_sampling_options_validation():
+    assert sampling_options({}) == {"samples": None, "method": "halton", "seed": 0}
+    assert sampling_options({"demand_samples": "500", "sampling_seed": 7.0}) == {"samples": 500, "method": "halton", "seed": 7}
+    for params in ({"demand_samples": "many"}, {"demand_samples": 2.5}, {"demand_samples": 0},
+                   {"sampling_seed": [1]}, {"sampling_seed": -1}, {"sampling_seed": True},
+                   {"sampling_method": "lattice"}):
+        with pytest.raises(DemandSourceError):
+            sampling_options(params)
@@ -0,0 +1,44 @@
+from app.routing.graph_builder import from_edge_arrays
+from app.routing.graph_store import GraphStore, snap_bbox
+
+
+def test_parallel_edges_keep_shortest():
+    g = from_edge_arrays([1, 2], [0.0, 1.0], [0.0, 0.0], [0, 0, 1], [1, 1, 0], [50.0, 20.0, 30.0])
+    assert g.indptr.tolist() == [0, 1, 2]
+    assert g.length_m.tolist() == [20.0, 30.0]
+
+
+def test_covering_entry_is_clipped_and_persisted(tmp_path, grid_graph):
+    g = grid_graph()
+    GraphStore(tmp_path, max_bytes=10**7).put(g.bounds, g)
+
+    store = GraphStore(tmp_path, max_bytes=10**7)
+    sub = store.get((72.8, 19.0, 72.8045, 19.0045))
+    assert sub.num_nodes == 25
+    assert sub.num_edges == 80
+    assert store.get((72.0, 19.0, 72.1, 19.1)) is None
+
+
+def test_lru_eviction_respects_size_budget(tmp_path, grid_graph):
+    g = grid_graph()
+    store = GraphStore(tmp_path, max_bytes=1, memory_items=0)
+    store.put(g.bounds, g)
+    store.put((0.0, 0.0, 1.0, 1.0), g)
+    assert len(store._index) == 1
+    assert store.get(g.bounds) is None
+
+
+def test_snap_bbox_expands_outward():
+    assert snap_bbox((72.8251, 18.9221, 72.8349, 19.0176)) == (72.82, 18.92, 72.84, 19.02)
+
+
+def test_cache_hits_batch_index_writes(tmp_path, grid_graph):
+    g = grid_graph()
+    store = GraphStore(tmp_path, max_bytes=10**7, memory_items=0)
+    store.put(g.bounds, g)
+    index = tmp_path / "index.json"
+    before = index.read_text()
+    store.get(g.bounds)
+    assert index.read_text() == before
+    store.flush()
+    assert index.read_text() != before
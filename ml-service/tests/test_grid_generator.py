@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import shapely
+
+from app.preprocessing.grid_generator import METHODS, generate_grid
+from app.preprocessing.polygon_processor import coords_to_polygon
+
+# An L-shaped boundary: the bounding box is a third empty
+L_SHAPE = [
+    {"lat": 19.00, "lng": 72.80}, {"lat": 19.00, "lng": 72.90}, {"lat": 19.05, "lng": 72.90},
+    {"lat": 19.05, "lng": 72.85}, {"lat": 19.10, "lng": 72.85}, {"lat": 19.10, "lng": 72.80},
+]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_points_inside_polygon(method):
+    points = generate_grid(L_SHAPE, samples=1000, method=method)
+    assert 850 <= len(points) <= 1150
+    assert shapely.contains_xy(coords_to_polygon(L_SHAPE), points[:, 1], points[:, 0]).all()
+
+
+def test_seeded_and_adaptive():
+    assert np.array_equal(generate_grid(L_SHAPE, seed=3), generate_grid(L_SHAPE, seed=3))
+    assert not np.array_equal(generate_grid(L_SHAPE, seed=3), generate_grid(L_SHAPE, seed=4))
+    # ~87 km² at 25 points per km²
+    assert 1600 <= len(generate_grid(L_SHAPE)) <= 2200
+    with pytest.raises(ValueError):
+        generate_grid(L_SHAPE, method="lattice")
@@ -0,0 +1,118 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from app.analytics.heatmap_generator import (
+    TILE_SIZE,
+    density_grid,
+    encode_png,
+    lnglat_to_pixels,
+    make_heatmap,
+    tile_bounds,
+)
+from app.analytics.heatmap_store import HeatmapStore
+
+
+def _tile_of(lng, lat, z):
+    px, py = lnglat_to_pixels(lng, lat, z)
+    return int(px // TILE_SIZE), int(py // TILE_SIZE)
+
+
+def test_tile_bounds_contain_point():
+    x, y = _tile_of(72.83, 18.96, 13)
+    west, south, east, north = tile_bounds(13, x, y)
+    assert west <= 72.83 <= east and south <= 18.96 <= north
+
+
+def test_density_integrates_to_total_weight():
+    rng = np.random.default_rng(0)
+    px, py = rng.uniform(400, 600, 50), rng.uniform(400, 600, 50)
+    w = rng.uniform(0.5, 2.0, 50)
+    for m_per_px in (20.0, 2.0):  # fine kernel, then coarse-grid kernel
+        grid = density_grid(px, py, w, (0, 0), (1000, 1000), m_per_px, 250.0)
+        mass = grid.sum() * (m_per_px / 1000.0) ** 2
+        assert abs(mass - w.sum()) / w.sum() < 0.02
+
+
+def test_coarse_density_keeps_the_peak():
+    rng = np.random.default_rng(3)
+    px, py = rng.uniform(400, 600, 50), rng.uniform(400, 600, 50)
+    w = rng.uniform(0.5, 2.0, 50)
+    fine = density_grid(px, py, w, (0, 0), (1000, 1000), 2.0, 250.0)
+    coarse = density_grid(px, py, w, (0, 0), (1000, 1000), 2.0, 250.0, upsample=False)
+    assert coarse.size < fine.size / 100
+    assert abs(coarse.max() - fine.max()) / fine.max() < 0.02
+    capped = density_grid(px, py, w, (0, 0), (1000, 1000), 2.0, 250.0, upsample=False, max_cells=100)
+    assert capped.size <= 100 and capped.max() > 0
+
+
+def test_encode_png_roundtrip():
+    levels = np.arange(256 * 4, dtype=np.uint32).reshape(4, 256).astype(np.uint8)
+    data = encode_png(levels)
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    pos, idat = 8, b""
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos:pos + 4])
+        kind = data[pos + 4:pos + 8]
+        if kind == b"IDAT":
+            idat += data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+    raw = np.frombuffer(zlib.decompress(idat), np.uint8).reshape(4, 257)
+    assert (raw[:, 0] == 0).all() and (raw[:, 1:] == levels).all()
+
+
+def test_layers_split_demand_by_walk_distance():
+    points = [(18.960, 72.830), (18.990, 72.830)]
+    heatmap = make_heatmap(points, [1.0, 3.0], stops=[{"lat": 18.9605, "lng": 72.8305}])
+    assert heatmap.layer_weights("served", 500).tolist() == [1.0, 0.0]
+    assert heatmap.layer_weights("unserved", 500).tolist() == [0.0, 3.0]
+
+    x, y = _tile_of(72.83, 18.96, 14)
+    demand = heatmap.tile("demand", 14, x, y)
+    unserved = heatmap.tile("unserved", 14, x, y)
+    assert demand.shape == (TILE_SIZE, TILE_SIZE) and demand.dtype == np.uint8
+    assert demand.max() > 0 and unserved.max() == 0
+
+
+def test_store_caches_tiles(tmp_path):
+    store = HeatmapStore(tmp_path)
+    rng = np.random.default_rng(1)
+    points = np.column_stack([rng.uniform(18.9, 19.0, 200), rng.uniform(72.8, 72.9, 200)])
+    assert store.put("abc123", make_heatmap(points))
+
+    x, y = _tile_of(72.85, 18.95, 12)
+    png = store.tile("abc123", "demand", 12, x, y, "png")
+    assert (tmp_path / "abc123" / "demand" / "12" / str(x) / f"{y}.png").read_bytes() == png
+    assert len(store.tile("abc123", "demand", 12, x, y, "bin")) == TILE_SIZE * TILE_SIZE
+
+    # A fresh store (another worker) renders from the saved source
+    assert HeatmapStore(tmp_path).tile("abc123", "demand", 12, x + 1, y, "png") is not None
+    assert store.tile("missing", "demand", 12, x, y) is None
+    for walk_m in (float("inf"), float("nan"), 0.0):
+        with pytest.raises(ValueError):
+            store.tile("abc123", "served", 12, x, y, walk_m=walk_m)
+
+
+def test_store_drops_stale_tiles_and_evicts_on_tile_writes(tmp_path):
+    rng = np.random.default_rng(2)
+    points = np.column_stack([rng.uniform(18.9, 19.0, 200), rng.uniform(72.8, 72.9, 200)])
+    x, y = _tile_of(72.85, 18.95, 12)
+    store = HeatmapStore(tmp_path)
+    store.put("old", make_heatmap(points))
+    store.tile("old", "demand", 12, x, y, "bin")
+    # Replacing the source drops tiles rendered from the previous one
+    store.put("old", make_heatmap(points[:10]))
+    assert not (tmp_path / "old" / "demand").exists()
+
+    source = (tmp_path / "old" / "source.npz").stat().st_size
+    store = HeatmapStore(tmp_path, max_bytes=2 * source + TILE_SIZE * TILE_SIZE)
+    store.put("new", make_heatmap(points[:10]))
+    os.utime(tmp_path / "old" / "source.npz", (0, 0))
+    store.tile("new", "demand", 12, x, y, "bin")
+    assert (tmp_path / "old").exists()
+    # One more tile goes over budget: the least recently used heatmap goes
+    store.tile("new", "demand", 12, x + 1, y, "bin")
+    assert not (tmp_path / "old").exists() and store.exists("new")
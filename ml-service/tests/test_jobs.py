@@ -0,0 +1,136 @@
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import jobs
+from app.core.telemetry import span
+from app.pipeline import STAGES, PipelineCancelled
+
+REQUEST = {
+    "city_name": "Testville", "num_buses": 4, "operating_hours": 12, "avg_speed_kmph": 20,
+    "boundary": [{"lat": 19.0, "lng": 72.8}, {"lat": 19.0, "lng": 72.9}, {"lat": 19.1, "lng": 72.9}],
+}
+
+
+def fake_optimize(req, progress=None, should_cancel=None):
+    """Stands in for run_optimize: walks the stages, waiting delay_s in each."""
+    params = req.get("parameters", {})
+    delay = params.get("delay_s", 0.0)
+    if params.get("crash"):
+        os._exit(1)
+    for stage in STAGES:
+        progress(stage, "running", 0.0)
+        with span("fake.stage"):
+            pass
+        deadline = time.monotonic() + delay
+        while time.monotonic() < deadline:
+            if should_cancel():
+                raise PipelineCancelled(stage)
+            time.sleep(0.01)
+        progress(stage, "done", delay)
+    return {"city": req["city_name"], "routes": [], "timings": {}}
+
+
+@pytest.fixture(scope="module")
+def client():
+    from app.main import app
+
+    manager = jobs.JobManager(1, max_pending=1, run=fake_optimize)
+    previous, jobs._job_manager = jobs._job_manager, manager
+    try:
+        yield TestClient(app)
+    finally:
+        manager.shutdown()
+        jobs._job_manager = previous
+
+
+def _wait(client, job_id, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snap = client.get(f"/optimize/jobs/{job_id}").json()
+        if snap["status"] in jobs.FINISHED:
+            return snap
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {snap['status']}")
+
+
+def test_submit_status_and_stream(client):
+    resp = client.post("/optimize/jobs", json=REQUEST)
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+
+    events = []
+    with client.stream("GET", f"/optimize/jobs/{job_id}/events") as stream:
+        for line in stream.iter_lines():
+            if line.startswith("event: "):
+                events.append(line[len("event: "):])
+            elif line.startswith("data: ") and events[-1] == "done":
+                done = json.loads(line[len("data: "):])
+                break
+    assert events[-1] == "done" and set(events[:-1]) <= {"progress"}
+    assert done["status"] == jobs.COMPLETED and done["result"]["city"] == "Testville"
+
+    snap = _wait(client, job_id)
+    assert snap["result"]["city"] == "Testville"
+    # Worker spans reach this process's /metrics one observation per call
+    assert f'ml_span_duration_seconds_count{{span="fake.stage"}} {len(STAGES)}' in client.get("/metrics").text
+    assert client.get("/optimize/jobs/missing").status_code == 404
+
+
+def test_queue_full_and_cancel(client):
+    slow = {**REQUEST, "parameters": {"delay_s": 30.0}}
+    job_id = client.post("/optimize/jobs", json=slow).json()["job_id"]
+    # max_pending=1: the second job is refused while the first is unfinished
+    resp = client.post("/optimize/jobs", json=REQUEST)
+    assert resp.status_code == 429
+
+    assert client.delete(f"/optimize/jobs/{job_id}").status_code == 200
+    assert _wait(client, job_id)["status"] == jobs.CANCELLED
+    assert client.post("/optimize/jobs", json=REQUEST).status_code == 202
+
+
+def route_workers_setting():
+    from app.core.config import get_config
+
+    return get_config().route_workers
+
+
+def test_job_workers_get_a_share_of_route_workers(monkeypatch):
+    monkeypatch.setenv("ML_ROUTE_WORKERS", "5")
+    manager = jobs.JobManager(2)
+    try:
+        manager._ensure_started()
+        assert manager._executor.submit(route_workers_setting).result() == 2
+    finally:
+        manager.shutdown()
+
+
+def _wait_job(manager, job, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while job.status not in jobs.FINISHED and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return job.status
+
+
+def test_crashed_worker_pool_is_replaced():
+    manager = jobs.JobManager(1, max_pending=1, run=fake_optimize, max_finished=2)
+    try:
+        crashed = manager.submit({**REQUEST, "parameters": {"crash": True}})
+        assert _wait_job(manager, crashed) == jobs.FAILED and "died" in crashed.error
+        assert _wait_job(manager, manager.submit(REQUEST)) == jobs.COMPLETED
+
+        # A broken pool found only at submit time fails that job instead of leaving it queued
+        crashed = manager.submit({**REQUEST, "parameters": {"crash": True}})
+        _wait_job(manager, crashed)
+        manager._broken = False
+        failed = manager.submit(REQUEST)
+        assert failed.status == jobs.FAILED and failed.future is None
+        assert _wait_job(manager, manager.submit(REQUEST)) == jobs.COMPLETED
+        # Only the max_finished most recent finished jobs are kept
+        manager.submit(REQUEST)
+        assert len(manager._jobs) <= 3
+    finally:
+        manager.shutdown()
@@ -0,0 +1,53 @@
+import numpy as np
+
+from app.routing.parallel_routes import SharedArrays, _attach, share_graph
+from app.routing.path_solver import build_landmarks
+from app.routing.route_builder import build_routes
+
+
+def _stops(n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": i + 1, "lat": float(19.0 + rng.uniform(0, 0.009)), "lng": float(72.8 + rng.uniform(0, 0.009))}
+        for i in range(n)
+    ]
+
+
+def test_shared_graph_roundtrip(grid_graph):
+    g = grid_graph()
+    handle = share_graph(g)
+    assert share_graph(g) == handle
+    attached, landmarks = _attach(handle)
+    assert landmarks is None
+    assert np.array_equal(attached.indices, g.indices) and np.array_equal(attached.x, g.x)
+    shared = SharedArrays({"a": np.arange(5)})
+    shared.close()
+    shared.close()
+
+
+def test_parallel_routes_match_serial(grid_graph):
+    g = grid_graph()
+    stops = _stops()
+    serial = build_routes(stops, route_count=3, G=g, time_budget_s=5.0)
+    parallel = build_routes(stops, route_count=3, G=g, time_budget_s=5.0, workers=2)
+    assert [[s["id"] for s in r["stops"]] for r in parallel] == [[s["id"] for s in r["stops"]] for r in serial]
+    assert [r["path"] for r in parallel] == [r["path"] for r in serial]
+    assert [r["leg_km"] for r in parallel] == [r["leg_km"] for r in serial]
+
+
+def test_clips_share_their_source_graph(grid_graph):
+    g = grid_graph(20)
+    landmarks = build_landmarks(g, 4)
+    handles = []
+    for bbox in [(72.8, 19.0, 72.8105, 19.0105), (72.803, 19.004, 72.8155, 19.0165)]:
+        clip = g.clip(bbox)
+        clip_landmarks = landmarks.subset(clip.clip_source[1])
+        handle = share_graph(clip, clip_landmarks)
+        handles.append(handle)
+        attached, attached_landmarks = _attach(handle)
+        assert np.array_equal(attached.indptr, clip.indptr) and np.array_equal(attached.indices, clip.indices)
+        assert np.array_equal(attached_landmarks.from_lm, clip_landmarks.from_lm)
+        assert np.array_equal(attached_landmarks.landmarks, clip_landmarks.landmarks)
+    # One copy of the source graph and its landmarks; only the node indices differ
+    shared = [{k: v for k, v in h.items() if k != "clip.idx"} for h in handles]
+    assert shared[0] == shared[1] and handles[0]["clip.idx"] != handles[1]["clip.idx"]
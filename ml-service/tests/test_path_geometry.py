@@ -0,0 +1,92 @@
+import numpy as np
+
+from app.core.response_format import decode_polyline, encode_polyline, encode_polylines
+from app.optimization.frequency_calculator import route_distance
+from app.routing.path_geometry import douglas_peucker, dp_importance, simplify_network
+
+
+def _dp_reference(x, y, tol):
+    keep = {0, len(x) - 1}
+
+    def rec(i, j):
+        if j - i < 2:
+            return
+        a, b = np.array([x[i], y[i]]), np.array([x[j], y[j]])
+        d = b - a
+        best, k = -1.0, None
+        for m in range(i + 1, j):
+            p = np.array([x[m], y[m]]) - a
+            t = np.clip(p @ d / (d @ d), 0, 1) if d @ d > 0 else 0.0
+            dist = np.hypot(*(p - t * d))
+            if dist > best:
+                best, k = dist, m
+        if best > tol:
+            keep.add(k)
+            rec(i, k)
+            rec(k, j)
+
+    rec(0, len(x) - 1)
+    return sorted(keep)
+
+
+def test_douglas_peucker_matches_recursive_reference():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.normal(0, 10, 300))
+    y = np.cumsum(rng.normal(0, 10, 300))
+    for tol in (1.0, 5.0, 25.0):
+        assert douglas_peucker(x, y, tol).tolist() == _dp_reference(x, y, tol)
+
+
+def test_importance_threshold_equals_simplification():
+    rng = np.random.default_rng(1)
+    x, y = np.cumsum(rng.normal(0, 10, 400)), np.cumsum(rng.normal(0, 10, 400))
+    imp = dp_importance(x, y, [0, 200], [199, 399], 2.0)
+    for tol in (2.0, 10.0, 40.0):
+        kept = np.flatnonzero(imp > tol)
+        first = kept[kept <= 199]
+        assert first.tolist() == douglas_peucker(x[:200], y[:200], tol).tolist()
+
+
+def test_encode_polylines_matches_single_encodes():
+    rng = np.random.default_rng(2)
+    lat, lng = rng.uniform(18, 19, 30), rng.uniform(72, 73, 30)
+    lengths = [10, 0, 1, 19]
+    bounds = np.cumsum([0] + lengths)
+    expected = [encode_polyline(lat[a:b], lng[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+    assert encode_polylines(lat, lng, lengths) == expected
+
+
+def _line(lat0, lng0, lat1, lng1, n):
+    return [{"lat": float(a), "lng": float(b)} for a, b in zip(np.linspace(lat0, lat1, n), np.linspace(lng0, lng1, n))]
+
+
+def test_shared_corridor_is_stored_once():
+    # Both routes run along the same straight corridor, then split
+    corridor = _line(18.90, 72.80, 18.90, 72.82, 21)
+    north = _line(18.90, 72.82, 18.92, 72.82, 11)[1:]
+    south = _line(18.90, 72.82, 18.88, 72.83, 11)[1:]
+    routes = [
+        {"stops": [], "path": corridor + north},
+        {"stops": [], "path": (corridor + south)[::-1]},
+    ]
+    out, geometry = simplify_network(routes, tolerance_m=1.0)
+
+    shared = set(map(abs, out[0]["segments"])) & set(map(abs, out[1]["segments"]))
+    assert len(shared) == 1
+    assert len(geometry["edges"]) == 3
+    (edge,) = [e for e in geometry["edges"] if e["id"] in shared]
+    assert len(decode_polyline(edge["path"])) == 2  # straight corridor collapses to its ends
+    assert len(edge["lod"]) == len(geometry["zooms"])
+
+    for r, o in zip(routes, out):
+        assert o["length_km"] == route_distance(r["path"])
+        assert o["path"][0] == r["path"][0] and o["path"][-1] == r["path"][-1]
+        assert len(o["path"]) == 3
+
+
+def test_road_lengths_survive_simplification():
+    path = _line(18.90, 72.80, 18.90, 72.82, 21) + _line(18.90, 72.82, 18.92, 72.82, 11)[1:]
+    cum = np.linspace(0.0, 5.0, len(path)).tolist()  # road km, longer than the straight line
+    (out,), _ = simplify_network([{"stops": [], "path": path, "cum_km": cum}], tolerance_m=1.0)
+    assert out["length_km"] == 5.0
+    assert out["cum_km"] == [0.0, cum[20], 5.0]
@@ -0,0 +1,112 @@
+import networkx as nx
+import numpy as np
+
+from app.routing.path_solver import (
+    alt_shortest_path,
+    build_landmarks,
+    nearest_nodes,
+    shortest_path,
+    stop_paths,
+)
+
+
+def test_stop_paths_match_networkx(grid_graph):
+    g = grid_graph()
+    rng = np.random.default_rng(0)
+    g.length_m[:] = rng.uniform(50, 150, g.num_edges).astype(np.float32)
+    G = nx.DiGraph()
+    src = np.repeat(np.arange(g.num_nodes), np.diff(g.indptr))
+    G.add_weighted_edges_from(zip(src.tolist(), g.indices.tolist(), g.length_m.astype(float).tolist()))
+
+    nodes = [0, 17, 55, 99]
+    paths = stop_paths(g, nodes)
+    D = paths.distance_matrix_km(nodes)
+    for i, a in enumerate(nodes):
+        for j, b in enumerate(nodes):
+            expected = nx.shortest_path_length(G, a, b, weight="weight")
+            assert np.isclose(D[i, j] * 1000, expected, rtol=1e-5)
+            path = paths.node_path(a, b)
+            assert path[0] == a and path[-1] == b
+            assert np.isclose(nx.path_weight(G, path, "weight"), expected, rtol=1e-5)
+
+
+def test_unreachable_leg_returns_none(grid_graph):
+    g = grid_graph()
+    g.indptr[:] = 0  # drop every edge
+    g.indices = g.indices[:0]
+    g.length_m = g.length_m[:0]
+    assert shortest_path(g, 0, 5) is None
+
+
+def test_nearest_nodes(grid_graph):
+    g = grid_graph()
+    idx = nearest_nodes(g, [72.8001, 72.8089], [19.0001, 19.0091])
+    assert idx.tolist() == [0, 99]
+
+
+def test_alt_matches_dijkstra(grid_graph):
+    g = grid_graph(20)
+    rng = np.random.default_rng(3)
+    g.length_m[:] = rng.uniform(50, 150, g.num_edges).astype(np.float32)
+    index = build_landmarks(g, count=4)
+    for a, b in rng.integers(0, g.num_nodes, (25, 2)).tolist():
+        path, length = alt_shortest_path(g, index, a, b)
+        expected = stop_paths(g, [a, b]).distance_matrix_km([a, b])[0, 1] * 1000
+        assert path[0] == a and path[-1] == b
+        assert np.isclose(length, expected, rtol=1e-5)
+
+
+def test_edge_length_lookup(grid_graph):
+    g = grid_graph()
+    src = np.repeat(np.arange(g.num_nodes), np.diff(g.indptr))
+    pick = np.arange(0, g.num_edges, 7)
+    assert np.array_equal(g.edge_length_m(src[pick], g.indices[pick]), g.length_m[pick])
+    assert np.isnan(g.edge_length_m([0, -1], [0, 3])).all()
+
+
+def test_route_road_lengths_follow_dijkstra(grid_graph):
+    from app.routing.route_builder import build_routes
+
+    g = grid_graph()
+    rng = np.random.default_rng(1)
+    g.length_m[:] = rng.uniform(50, 150, g.num_edges).astype(np.float32)
+    stops = [{"id": i, "lat": float(g.y[n]), "lng": float(g.x[n])} for i, n in enumerate([3, 27, 48, 71, 95])]
+    (route,) = build_routes(stops, 1, G=g)
+
+    nodes = nearest_nodes(g, [s["lng"] for s in route["stops"]], [s["lat"] for s in route["stops"]])
+    D = stop_paths(g, nodes).distance_matrix_km(nodes)
+    legs = [D[i, i + 1] for i in range(len(nodes) - 1)]
+    assert np.allclose(route["leg_km"], legs, atol=1e-4)
+    assert len(route["cum_km"]) == len(route["path"])
+    assert np.isclose(route["cum_km"][-1], sum(legs), atol=1e-3)
+
+
+def test_grouped_sweep_keeps_only_group_legs(grid_graph):
+    g = grid_graph()
+    paths = stop_paths(g, [0, 9, 90, 99], groups=[[0, 9], [90, 99]])
+    assert paths.node_path(0, 9) == list(range(10))
+    assert paths.node_path(9, 90) is None
+    assert len(paths._tree_keys) < 4 * g.num_nodes // 2
+
+
+def test_landmarks_built_once_per_stored_graph(tmp_path, monkeypatch, grid_graph):
+    from shapely.geometry import box
+
+    from app.routing import osm_loader
+    from app.routing.graph_store import GraphStore
+
+    store = GraphStore(tmp_path, max_bytes=10**8)
+    monkeypatch.setattr(osm_loader, "_store", store)
+    g = grid_graph(20)
+    rng = np.random.default_rng(5)
+    g.length_m[:] = rng.uniform(50, 150, g.num_edges).astype(np.float32)
+    store.put(g.bounds, g)
+
+    for bbox in [(72.8, 19.0, 72.8105, 19.0105), (72.803, 19.004, 72.8155, 19.0165)]:
+        clip = store.get(bbox)
+        index = osm_loader.load_landmarks(box(*bbox), clip, 4)
+        assert index.from_lm.shape[1] == clip.num_nodes
+        for a, b in rng.integers(0, clip.num_nodes, (10, 2)).tolist():
+            _, length = alt_shortest_path(clip, index, a, b)
+            assert np.isclose(length, stop_paths(clip, [a, b]).distance_matrix_km([a, b])[0, 1] * 1000, rtol=1e-5)
+    assert sum(e.get("kind") == "alt4" for e in store._index.values()) == 1
@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.core.response_format import (
+    NotAcceptable,
+    UnknownFormat,
+    compact_result,
+    decode_polyline,
+    encode_polyline,
+    encode_result,
+    geojson_chunks,
+    negotiate,
+)
+from app.schemas.response_schema import GeoFeature
+
+RESULT = {
+    "status": "completed",
+    "city": "Test",
+    "stops": [{"id": 1, "lat": 18.95, "lng": 72.83}, {"id": 2, "lat": 18.96, "lng": 72.84}],
+    "routes": [{
+        "route_id": "R1",
+        "stops": 2,
+        "stops_list": [{"id": 2, "lat": 18.96, "lng": 72.84}, {"id": 1, "lat": 18.95, "lng": 72.83}],
+        "distance_km": 1.5,
+        "path": [{"lat": 18.96, "lng": 72.84}, {"lat": 18.955, "lng": 72.8351}, {"lat": 18.95, "lng": 72.83}],
+    }],
+    "metrics": {"coverage": 0.5},
+}
+
+
+def test_polyline_matches_reference_encoding():
+    # Example from the polyline algorithm documentation (precision 5)
+    lat, lng = np.array([38.5, 40.7, 43.252]), np.array([-120.2, -120.95, -126.453])
+    assert encode_polyline(lat, lng, precision=5) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_polyline_roundtrip():
+    rng = np.random.default_rng(0)
+    lat, lng = rng.uniform(-80, 80, 500), rng.uniform(-179, 179, 500)
+    decoded = np.array(decode_polyline(encode_polyline(lat, lng)))
+    assert np.abs(decoded - np.column_stack([lat, lng])).max() <= 5e-7 + 1e-12
+    assert encode_polyline([], []) == ""
+
+
+def test_compact_references_stops_by_id():
+    compact = compact_result(RESULT)
+    assert compact["stops"] == {"id": [1, 2], "lat": [18.95, 18.96], "lng": [72.83, 72.84]}
+    route = compact["routes"][0]
+    assert route["stop_ids"] == [2, 1] and "stops_list" not in route
+    assert decode_polyline(route["path"]) == [(18.96, 72.84), (18.955, 72.8351), (18.95, 72.83)]
+    assert compact["metrics"] == RESULT["metrics"]
+
+
+def test_geojson_stream_is_a_feature_collection():
+    doc = json.loads(b"".join(geojson_chunks(RESULT)))
+    assert doc["type"] == "FeatureCollection" and doc["properties"]["city"] == "Test"
+    features = [GeoFeature(**f) for f in doc["features"]]
+    assert [f.geometry["type"] for f in features] == ["Point", "Point", "LineString"]
+    assert features[2].geometry["coordinates"][0] == [72.84, 18.96]
+    assert features[2].properties["stop_ids"] == [2, 1]
+
+
+def test_negotiate():
+    assert negotiate(None, None) == "json"
+    assert negotiate(None, "application/geo+json, */*") == "geojson"
+    assert negotiate("compact", "application/geo+json") == "compact"
+    with pytest.raises(UnknownFormat):
+        negotiate("xml")
+
+
+def test_negotiate_weighs_accept_quality():
+    # q=0 refuses a type; matching is on whole media types, not substrings
+    assert negotiate(None, "application/geo+json;q=0, */*") == "json"
+    assert negotiate(None, "application/json;q=0.5, application/geo+json;q=0.9") == "geojson"
+    assert negotiate(None, "application/geo+json;q=0.2, application/*") == "json"
+    assert negotiate(None, "application/vnd.smarttransit.compact+json") == "compact"
+    assert negotiate(None, "application/geo+json+extra, application/json") == "json"
+    with pytest.raises(NotAcceptable):
+        negotiate(None, "text/html")
+    with pytest.raises(NotAcceptable):
+        negotiate(None, "application/json;q=0, */*;q=0")
+
+
+def test_format_errors_map_to_400_and_406():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    request = {"city_name": "T", "num_buses": 1, "operating_hours": 1, "avg_speed_kmph": 20, "boundary": []}
+    assert client.post("/optimize?format=xml", json=request).status_code == 400
+    assert client.post("/optimize", json=request, headers={"Accept": "text/html"}).status_code == 406
+
+
+def test_msgpack_roundtrip():
+    msgpack = pytest.importorskip("msgpack")
+    assert negotiate(None, "application/x-msgpack") == "msgpack"
+    body, media_type = encode_result(RESULT, "msgpack")
+    assert media_type == "application/x-msgpack"
+    doc = msgpack.unpackb(body, raw=False)
+    assert doc["encoding"] == "float32" and doc["city"] == "Test"
+    stops = np.frombuffer(doc["stops"]["coords_f32"], dtype="<f4").reshape(-1, 2)
+    assert doc["stops"]["id"] == [1, 2] and np.allclose(stops, [[18.95, 72.83], [18.96, 72.84]], atol=1e-5)
+    path = np.frombuffer(doc["routes"][0]["path_f32"], dtype="<f4").reshape(-1, 2)
+    assert np.allclose(path, [[p["lat"], p["lng"]] for p in RESULT["routes"][0]["path"]], atol=1e-5)
+    assert doc["routes"][0]["stop_ids"] == [2, 1] and doc["metrics"] == RESULT["metrics"]
@@ -0,0 +1,80 @@
+import threading
+
+from app.core.result_cache import ResultCache, request_keys
+
+SQUARE = [
+    {"lat": 19.0, "lng": 72.8}, {"lat": 19.0, "lng": 72.9},
+    {"lat": 19.1, "lng": 72.9}, {"lat": 19.1, "lng": 72.8},
+]
+
+
+def test_keys_ignore_ring_rotation_orientation_and_noise():
+    base = request_keys(SQUARE, 20, 18.0, {"min_stop_distance_m": 300})
+    rotated = SQUARE[2:] + SQUARE[:2]
+    reversed_noisy = [{"lat": p["lat"] + 1e-9, "lng": p["lng"]} for p in reversed(rotated)]
+    closed = reversed_noisy + reversed_noisy[:1]
+    other = request_keys(closed, 20, 18.0, {"min_stop_distance_m": 300, "profile": True})
+    assert other == base
+
+
+def test_fleet_change_keeps_stops_and_routes_keys():
+    a = request_keys(SQUARE, 20, 18.0, {}, route_count=5)
+    b = request_keys(SQUARE, 40, 25.0, {}, route_count=5)
+    assert a["result"] != b["result"]
+    assert a["stops"] == b["stops"] and a["routes"] == b["routes"]
+    assert request_keys(SQUARE, 20, 18.0, {"min_stop_distance_m": 400})["stops"] != a["stops"]
+
+
+def test_disk_tier_survives_new_instance_and_evicts(tmp_path):
+    cache = ResultCache(max_items=1, root=tmp_path, max_disk_bytes=10_000)
+    cache.put("stops", "k1", [{"id": 1, "lat": 19.0, "lng": 72.8}])
+    cache.put("stops", "k2", [])
+    assert ResultCache(root=tmp_path, max_disk_bytes=10_000).get("stops", "k1")[0]["id"] == 1
+
+    small = ResultCache(root=tmp_path, max_disk_bytes=1)
+    small.put("result", "big", {"x": "y" * 100})
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_key_locks_are_per_key_and_released():
+    cache = ResultCache()
+    entered = {"k1": threading.Event(), "k2": threading.Event()}
+
+    def take(key):
+        with cache.key_lock(key):
+            entered[key].set()
+
+    with cache.key_lock("k1"):
+        same, other = threading.Thread(target=take, args=("k1",)), threading.Thread(target=take, args=("k2",))
+        same.start()
+        other.start()
+        # Another key is not held up by k1; the same key waits for it
+        assert entered["k2"].wait(5)
+        assert not entered["k1"].wait(0.1)
+    same.join(5)
+    other.join(5)
+    assert entered["k1"].is_set()
+    assert cache._key_locks == {}
+
+
+def test_keys_cover_config_that_changes_results(monkeypatch):
+    base = request_keys(SQUARE, 20, 18.0, {}, route_count=5)
+    monkeypatch.setenv("ML_ALT_LANDMARKS", "8")
+    alt = request_keys(SQUARE, 20, 18.0, {}, route_count=5)
+    assert alt["stops"] == base["stops"] and alt["routes"] != base["routes"] and alt["result"] != base["result"]
+    monkeypatch.setenv("ML_DEMAND_MAX_CELLS", "1000")
+    assert request_keys(SQUARE, 20, 18.0, {}, route_count=5)["stops"] != base["stops"]
+
+
+def test_disk_size_is_tracked_between_rescans(tmp_path, monkeypatch):
+    cache = ResultCache(root=tmp_path, max_disk_bytes=10_000)
+    cache.put("stops", "k1", [])
+    scans = []
+    monkeypatch.setattr(cache, "_rescan_disk", lambda: scans.append(1) or 0)
+    for i in range(10):
+        cache.put("stops", f"k{i}", {"x": "y" * 100})
+    assert scans == [] and 0 < cache._disk_bytes < 10_000
+
+    cache.put("result", "big", {"x": "y" * 12_000})
+    # Over budget: the oldest entries go until back under EVICT_TO of it
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.json")) == cache._disk_bytes
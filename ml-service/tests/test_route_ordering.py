@@ -0,0 +1,28 @@
+import itertools
+
+import numpy as np
+
+from app.routing.route_ordering import improve_order, nearest_neighbor_order, path_length
+
+
+def test_local_search_is_near_optimal_on_small_routes():
+    # 2-opt / Or-opt is a heuristic: never worse than nearest neighbour,
+    # and close to the brute-force optimum on small random routes
+    rng = np.random.default_rng(0)
+    for n in (6, 7, 8):
+        for _ in range(5):
+            pts = rng.random((n, 2))
+            D = np.linalg.norm(pts[:, None] - pts[None, :], axis=2)
+            order, stats = improve_order(D, start=0, time_budget_s=1.0)
+            best = min(path_length(D, p) for p in itertools.permutations(range(n)))
+            assert sorted(order) == list(range(n))
+            assert np.isclose(stats["final_km"], path_length(D, order), atol=1e-3)
+            assert stats["final_km"] <= round(path_length(D, nearest_neighbor_order(D, 0)), 3)
+            assert stats["final_km"] <= best * 1.10 + 1e-3
+
+
+def test_zero_budget_keeps_nearest_neighbour_order():
+    D = np.array([[0, 1, 5], [1, 0, 2], [5, 2, 0]], dtype=float)
+    order, stats = improve_order(D, start=0, time_budget_s=0.0)
+    assert order == [0, 1, 2]
+    assert stats["improvement_pct"] == 0.0
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from app.analytics.metrics_engine import compute_metrics
+from app.optimization.frequency_calculator import calculate_frequency
+from app.optimization.scenario_sweep import MAX_SWEEP_POINTS, expand_values, sweep_scenarios, sweep_values
+
+ROUTES = [
+    [{"id": i, "lat": 19.0 + 0.004 * i, "lng": 72.80 + 0.001 * (i % 3)} for i in range(6)],
+    [{"id": i, "lat": 19.01, "lng": 72.82 + 0.005 * i} for i in range(6, 10)],
+    [{"id": 10, "lat": 19.05, "lng": 72.9}],
+]
+
+
+def test_sweep_rows_match_single_scenario_pipeline():
+    params = {"population_density": "metro"}
+    rows = sweep_scenarios(ROUTES, [3, 8, 25, 60], [12.0, 19.5, 30.0], params)
+    assert len(rows) == 12
+    for row in rows:
+        metrics = compute_metrics(calculate_frequency(ROUTES, row["num_buses"], row["avg_speed_kmph"]), params)
+        assert row["total_buses"] == metrics["total_buses"]
+        assert row["avg_headway_min"] == metrics["avg_frequency_min"]
+        assert row["avg_wait_time"] == metrics["avg_wait_time"]
+        assert row["los_score"] == metrics["los_score"]
+        assert row["co2_saved_kg_day"] == metrics["co2_saved_kg_day"]
+
+
+def test_expand_values_range_is_inclusive():
+    assert expand_values({"start": 10, "stop": 20, "step": 5}, 1) == [10, 15, 20]
+    assert expand_values(None, 7) == [7]
+
+
+
+def test_oversized_sweeps_rejected_before_expanding():
+    huge = {"start": 0, "stop": 1e12, "step": 1}
+    with pytest.raises(ValueError):
+        expand_values(huge, 1)
+    with pytest.raises(ValueError):
+        sweep_values({"start": 1, "stop": 1000}, {"start": 10, "stop": 1000}, 1, 20.0)
+    with pytest.raises(ValueError):
+        sweep_values({"start": 1, "stop": float("inf")}, None, 1, 20.0)
+    fleet, speeds = sweep_values({"start": 1, "stop": MAX_SWEEP_POINTS}, None, 1, 20.0)
+    assert len(fleet) == MAX_SWEEP_POINTS and speeds == [20.0]
+
+
+def test_sweep_endpoint_validates_before_building(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    def build_network(*args, **kwargs):
+        raise AssertionError("network built for an invalid sweep")
+
+    monkeypatch.setattr(main, "build_network", build_network)
+    request = {
+        "city_name": "T", "num_buses": 10, "operating_hours": 12, "avg_speed_kmph": 20, "boundary": [],
+        "sweep": {"num_buses": {"start": 0, "stop": 1e9}},
+    }
+    resp = TestClient(main.app).post("/optimize/sweep", json=request)
+    assert resp.status_code == 400 and "limit" in resp.json()["detail"]
+
+    # 1e999 parses as infinity
+    request["sweep"] = {"num_buses": [5], "parameters": {"max_walk_distance_m": "WALK"}}
+    body = json.dumps(request).replace('"WALK"', "1e999")
+    resp = TestClient(main.app).post("/optimize/sweep", content=body, headers={"content-type": "application/json"})
+    assert resp.status_code == 400 and "max_walk_distance_m" in resp.json()["detail"]
@@ -0,0 +1,33 @@
+import time
+
+import pytest
+
+from app.core.sessions import NetworkParameterChange, SessionStore
+
+STOPS = [{"id": i, "lat": 19.0 + 0.01 * i, "lng": 72.8} for i in range(1, 7)]
+ROUTES = [{"stops": STOPS[:3], "path": STOPS[:3]}, {"stops": STOPS[3:], "path": STOPS[3:]}]
+
+
+def test_scenario_updates_reuse_network():
+    session = SessionStore().create("X", STOPS, ROUTES, 10, 18.0, {})
+    routes, metrics = session.scenario(num_buses=20)
+    assert metrics["total_buses"] == 20 and "path" not in routes[0]
+    _, slower = session.scenario(avg_speed_kmph=9.0)
+    assert session.num_buses == 20 and slower["avg_frequency_min"] > metrics["avg_frequency_min"]
+    with pytest.raises(NetworkParameterChange):
+        session.scenario(parameters={"min_stop_distance_m": 50})
+
+
+def test_store_limits_count_bytes_and_ttl():
+    store = SessionStore(max_items=2)
+    ids = [store.create("X", STOPS, ROUTES, 10, 18.0, {}).id for _ in range(3)]
+    assert store.get(ids[0]) is None and store.get(ids[2]) is not None
+
+    one = store.create("X", STOPS, ROUTES, 10, 18.0, {})
+    store.max_bytes = one.nbytes
+    newest = store.create("X", STOPS, ROUTES, 10, 18.0, {})
+    assert store.get(one.id) is None and store.get(newest.id) is newest
+
+    store.ttl_s = 0.01
+    time.sleep(0.02)
+    assert store.get(newest.id) is None
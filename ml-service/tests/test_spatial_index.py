@@ -0,0 +1,89 @@
+import numpy as np
+
+from app.routing.graph_store import GraphStore
+from app.routing.route_builder import build_routes
+from app.routing.spatial_index import SnapIndex, index_for
+
+
+def _brute_force_edges(index, xy):
+    a, b = index.node_xy[index.edge_u], index.node_xy[index.edge_v]
+    ab = b - a
+    best = []
+    for p in xy:
+        t = np.clip(((p - a) * ab).sum(axis=1) / (ab * ab).sum(axis=1), 0, 1)
+        best.append(np.hypot(*(p - (a + ab * t[:, None])).T).min())
+    return np.array(best)
+
+
+def test_snap_nodes_and_max_distance(grid_graph):
+    g = grid_graph()
+    index = index_for(g)
+    assert index_for(g) is index
+    nodes, dist = index.snap_nodes([72.8001, 72.809, 73.5], [19.0001, 19.009, 19.0], max_distance_m=500)
+    assert nodes.tolist() == [0, 99, -1]
+    assert dist[0] < 20 and np.isinf(dist[2])
+
+
+def test_snap_edges_is_exact(grid_graph):
+    g = grid_graph()
+    index = SnapIndex.build(g)
+    rng = np.random.default_rng(0)
+    lng, lat = rng.uniform(72.79, 72.81, 300), rng.uniform(18.99, 19.01, 300)
+    hit = index.snap_edges(lng, lat)
+    assert (hit["u"] >= 0).all()
+    assert np.allclose(hit["distance_m"], _brute_force_edges(index, index.project(lng, lat)))
+    # The snapped point lies on the road: snapping it again moves it nowhere
+    again = index.snap_edges(hit["lng"], hit["lat"])
+    assert np.allclose(again["distance_m"], 0, atol=1e-3)
+
+    far = index.snap_edges([72.8045], [19.0005], max_distance_m=10)
+    assert far["u"][0] == -1 and far["lng"][0] == 72.8045
+
+
+def test_index_roundtrips_through_store(tmp_path, grid_graph):
+    g = grid_graph()
+    store = GraphStore(tmp_path, max_bytes=10**7)
+    store.put(g.bounds, g)
+    store.put_aux(g.bounds, "snap", SnapIndex.build(g).arrays())
+    loaded = SnapIndex.from_arrays(GraphStore(tmp_path, max_bytes=10**7).get_aux(g.bounds, "snap"))
+    nodes, _ = loaded.snap_nodes([72.8051], [19.0032])
+    assert nodes.tolist() == [35]
+
+
+def test_far_stop_gets_straight_legs(grid_graph):
+    g = grid_graph()
+    stops = [
+        {"id": 1, "lat": 19.0, "lng": 72.8},
+        {"id": 2, "lat": 19.009, "lng": 72.809},
+        {"id": 3, "lat": 19.2, "lng": 72.809},  # ~20 km off the grid
+    ]
+    (route,) = build_routes(stops, route_count=1, G=g, max_snap_distance_m=200)
+    far = [p for p in route["path"] if p["lat"] == 19.2]
+    assert len(far) == 1
+    # The on-graph leg is still routed along the grid
+    assert len(route["path"]) > 3
+
+
+def test_index_built_once_per_stored_graph(tmp_path, monkeypatch, grid_graph):
+    from shapely.geometry import box
+
+    from app.routing import osm_loader
+
+    store = GraphStore(tmp_path, max_bytes=10**8)
+    monkeypatch.setattr(osm_loader, "_store", store)
+    g = grid_graph(20)
+    store.put(g.bounds, g)
+    # A corrupt entry (here: an old pickled layout) is replaced, not fatal
+    store.put_aux(g.bounds, "snap", {"version": np.int64(1), "trees": np.zeros(8, np.uint8)})
+
+    rng = np.random.default_rng(2)
+    for bbox in [(72.8, 19.0, 72.8105, 19.0105), (72.803, 19.004, 72.8155, 19.0165)]:
+        clip = store.get(bbox)
+        index = osm_loader.load_snap_index(box(*bbox), clip)
+        fresh = SnapIndex.build(clip)
+        assert index.num_nodes == clip.num_nodes and len(index.edge_u) == len(fresh.edge_u)
+        lng, lat = rng.uniform(bbox[0], bbox[2], 100), rng.uniform(bbox[1], bbox[3], 100)
+        assert np.array_equal(index.snap_nodes(lng, lat)[0], fresh.snap_nodes(lng, lat)[0])
+        assert np.allclose(index.snap_edges(lng, lat)["distance_m"], fresh.snap_edges(lng, lat)["distance_m"], atol=1e-3)
+    assert sum(e.get("kind") == "snap" for e in store._index.values()) == 1
+    assert int(store.get_aux(g.bounds, "snap")["version"]) == 2
@@ -0,0 +1,26 @@
+import numpy as np
+
+from app.preprocessing.spatial_utils import (
+    haversine_one_to_many_km,
+    haversine_pairwise_km,
+    path_cumulative_km,
+)
+
+
+def test_kernels_agree():
+    rng = np.random.default_rng(0)
+    lat = 18.9 + rng.uniform(0, 0.2, 30)
+    lng = 72.8 + rng.uniform(0, 0.1, 30)
+
+    D = haversine_pairwise_km(lat, lng)
+    assert np.allclose(D, D.T)
+    assert np.allclose(np.diag(D), 0.0)
+    assert np.allclose(D[3], haversine_one_to_many_km(lat[3], lng[3], lat, lng))
+
+    cum = path_cumulative_km(lat, lng)
+    assert cum[0] == 0.0
+    assert np.isclose(cum[-1], sum(D[i, i + 1] for i in range(29)))
+
+
+def test_one_degree_of_latitude():
+    assert np.isclose(haversine_one_to_many_km(0.0, 0.0, [1.0], [0.0])[0], 111.19, atol=0.01)
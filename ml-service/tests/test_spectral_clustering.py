@@ -0,0 +1,34 @@
+import numpy as np
+
+from app.routing.route_builder import KNN_NEIGHBORS, build_knn_affinity, cluster_stops_spectral
+
+
+def _corridors(n_per=60, seed=0):
+    """Three 10 km east-west corridors 20 km apart; a longitude stripe split would cut across all of them."""
+    rng = np.random.default_rng(seed)
+    stops = []
+    for lat in (19.0, 19.18, 19.36):
+        for lng in rng.uniform(72.80, 72.90, n_per):
+            stops.append({"id": len(stops), "lat": lat + rng.normal(0, 0.001), "lng": lng})
+    return stops
+
+
+def _partition(groups):
+    return sorted(sorted(s["id"] for s in g) for g in groups)
+
+
+def test_knn_affinity_is_sparse_and_symmetric():
+    stops = _corridors()
+    A = build_knn_affinity(stops)
+    assert A.shape == (len(stops), len(stops))
+    assert abs(A - A.T).max() == 0
+    assert A.diagonal().max() == 0 and A.data.min() > 0 and A.data.max() <= 1
+    assert len(stops) * KNN_NEIGHBORS <= A.nnz <= 2 * len(stops) * KNN_NEIGHBORS
+
+
+def test_knn_labels_match_dense():
+    stops = _corridors()
+    dense = _partition(cluster_stops_spectral(stops, 3, affinity_mode="dense"))
+    knn = _partition(cluster_stops_spectral(stops, 3, affinity_mode="knn"))
+    assert knn == dense
+    assert dense == [list(range(0, 60)), list(range(60, 120)), list(range(120, 180))]
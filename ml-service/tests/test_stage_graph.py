@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from app.core.stage_graph import Task, run_graph
+from app.core.telemetry import span, trace_request
+
+
+def test_independent_branches_overlap():
+    def slow(value):
+        def fn(**_):
+            time.sleep(0.2)
+            return value
+        return fn
+
+    tasks = [
+        Task("graph", slow("G")),
+        Task("demand", slow("D")),
+        Task("stops", lambda demand: demand + "S", ("demand",)),
+        Task("routes", lambda stops, graph: stops + graph, ("stops", "graph")),
+    ]
+    t0 = time.perf_counter()
+    results = run_graph(tasks)
+    assert results["routes"] == "DSG"
+    assert time.perf_counter() - t0 < 0.35
+    assert run_graph(tasks, concurrent=False)["routes"] == "DSG"
+
+
+def test_spans_reach_the_callers_trace():
+    def work():
+        with span("inner"):
+            return threading.current_thread().name
+
+    with trace_request() as trace:
+        results = run_graph([Task("a", work), Task("b", work)])
+    assert results["a"] != threading.current_thread().name
+    assert trace.spans["inner"][1] == 2
+
+
+def test_errors_propagate_and_bad_graphs_are_rejected():
+    def boom():
+        raise RuntimeError("fetch failed")
+
+    with pytest.raises(RuntimeError):
+        run_graph([Task("graph", boom), Task("routes", lambda graph: graph, ("graph",))])
+    with pytest.raises(ValueError):
+        run_graph([Task("a", lambda b: b, ("b",)), Task("b", lambda a: a, ("a",))])
+    with pytest.raises(ValueError):
+        run_graph([Task("a", lambda missing: missing, ("missing",))])
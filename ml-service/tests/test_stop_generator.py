@@ -0,0 +1,48 @@
+import numpy as np
+
+from app.clustering.stop_generator import demand_arrays, generate_bus_stops
+from app.preprocessing.demand_simulator import DEMAND_DTYPE, simulate_demand
+
+
+def _blob(rng, lat, lng, n, spread=0.01):
+    return np.column_stack([lat + rng.normal(0, spread, n), lng + rng.normal(0, spread, n)])
+
+
+def test_simulate_demand_weights_by_distance_from_centroid():
+    rng = np.random.default_rng(0)
+    points = rng.uniform([19.0, 72.8], [19.1, 72.9], (400, 2))
+    demand = simulate_demand(points.tolist())
+    assert demand.dtype == DEMAND_DTYPE and len(demand) == 400
+    assert np.array_equal(demand["lat"], points[:, 0]) and np.array_equal(demand["lng"], points[:, 1])
+
+    dist = np.hypot(*(points - points.mean(axis=0)).T)
+    assert np.all(np.diff(demand["weight"][np.argsort(dist)]) <= 0)
+    assert demand["weight"].max() <= 1.0 and np.isclose(demand["weight"].min(), np.exp(-2.5))
+    assert len(simulate_demand([])) == 0
+
+
+def test_demand_arrays_views_and_uniform_weights():
+    demand = simulate_demand([[19.0, 72.8], [19.1, 72.9], [19.05, 72.85]])
+    points, weights = demand_arrays(demand)
+    assert points.shape == (3, 2) and np.shares_memory(weights, demand)
+
+    points, weights = demand_arrays([[19.0, 72.8], [19.1, 72.9]])
+    assert points.shape == (2, 2) and weights.tolist() == [1.0, 1.0]
+
+
+def test_stops_follow_demand_weight():
+    rng = np.random.default_rng(1)
+    heavy, light = _blob(rng, 19.00, 72.80, 300), _blob(rng, 19.10, 72.95, 300)
+    demand = np.zeros(600, dtype=DEMAND_DTYPE)
+    demand["lat"], demand["lng"] = np.concatenate([heavy, light]).T
+    demand["weight"] = np.r_[np.full(300, 50.0), np.full(300, 1.0)]
+
+    stops = generate_bus_stops(demand, area_km2=2.5, min_stop_distance_m=100)
+    near_heavy = sum(abs(s["lat"] - 19.0) < 0.05 for s in stops)
+    assert near_heavy > len(stops) - near_heavy
+
+    # Equal weights split the stops between the two blobs
+    demand["weight"] = 1.0
+    stops = generate_bus_stops(demand, area_km2=2.5, min_stop_distance_m=100)
+    near_heavy = sum(abs(s["lat"] - 19.0) < 0.05 for s in stops)
+    assert 0 < near_heavy < len(stops)
@@ -0,0 +1,84 @@
+import math
+
+from app.clustering.stop_index import M_PER_DEG, StopIndex, dedupe_stops
+
+
+def test_dedupe_drops_close_centers_in_order():
+    centers = [(19.0, 72.8), (19.001, 72.8), (19.01, 72.8)]  # second is ~111 m from first
+    stops = dedupe_stops(centers, min_distance_m=300)
+    assert [(s["id"], s["lat"]) for s in stops] == [(1, 19.0), (2, 19.01)]
+
+
+def test_merge_moves_stop_to_weighted_mean():
+    index = StopIndex(300, stops=[{"id": 7, "lat": 19.0, "lng": 72.8}])
+    out = index.add_stop(19.002, 72.8, weight=1.0, merge=True)
+    assert out["action"] == "merged"
+    assert abs(out["stop"]["lat"] - 19.001) < 1e-9
+    assert index.add_stop(19.02, 72.8)["stop"]["id"] == 8
+
+
+def _offset(dx_m, dy_m, lat0=19.0, lng0=72.8):
+    return lat0 + dy_m / M_PER_DEG, lng0 + dx_m / (M_PER_DEG * math.cos(math.radians(lat0)))
+
+
+def _min_spacing_m(stops):
+    index = StopIndex(1e6, stops=stops)
+    return min(
+        math.dist(index._xy[i], index._xy[j]) for i in range(len(stops)) for j in range(i + 1, len(stops))
+    )
+
+
+def test_merge_cascades_when_the_moved_stop_crowds_another():
+    a, b = _offset(0, 0), _offset(400, 0)
+    index = StopIndex(300, stops=[{"id": 1, "lat": a[0], "lng": a[1]}, {"id": 2, "lat": b[0], "lng": b[1]}])
+    # A heavy candidate 150 m from stop 1 pulls it to ~136 m, within 300 m of stop 2
+    out = index.add_stop(*_offset(150, 0), weight=10.0, merge=True)
+    assert out["action"] == "merged" and out["absorbed"] == [2]
+    assert [s["id"] for s in index.stops] == [1]
+    assert abs(out["stop"]["lat"] - a[0]) < 1e-9
+    assert abs(out["stop"]["lng"] - _offset(1900 / 12, 0)[1]) < 1e-9
+
+
+def test_dedupe_merge_uses_center_weights():
+    centers = [_offset(0, 0), _offset(200, 0)]
+    stops = dedupe_stops(centers, min_distance_m=300, weights=[1.0, 3.0], merge=True)
+    assert [s["id"] for s in stops] == [1]
+    assert abs(stops[0]["lng"] - _offset(150, 0)[1]) < 1e-9
+
+
+def test_add_stop_endpoint_keeps_minimum_spacing():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    stops = [dict(zip(("lat", "lng"), _offset(x, 0)), id=i) for i, x in ((1, 0), (2, 320))]
+    lat, lng = _offset(100, 200)  # nearest stop 1; the merged stop lands ~288 m from stop 2
+    resp = TestClient(app).post(
+        "/stops/add", json={"stops": stops, "point": {"lat": lat, "lng": lng}, "merge": True},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["action"] == "merged" and body["absorbed"] == [2]
+    assert len(body["stops"]) == 1
+
+    # Stops out of reach are kept and the spacing rule holds across the result
+    spread = [dict(zip(("lat", "lng"), _offset(x, 0)), id=i) for i, x in ((1, 0), (2, 320), (3, 1000))]
+    resp = TestClient(app).post(
+        "/stops/add", json={"stops": spread, "point": {"lat": lat, "lng": lng}, "merge": True},
+    )
+    assert _min_spacing_m(resp.json()["stops"]) >= 300
+
+
+def test_add_stop_endpoint_validates_stops():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    point = {"lat": 19.02, "lng": 72.8}
+    for bad in ({"lat": 19.0}, {"lat": 19.0, "lng": 72.8, "id": "a"}, {"lat": "north", "lng": 72.8}):
+        assert client.post("/stops/add", json={"stops": [bad], "point": point}).status_code == 422
+    # Stops without an id are numbered after the given ones
+    stops = [{"lat": 19.0, "lng": 72.8}, {"id": 4, "lat": 19.01, "lng": 72.8}]
+    resp = client.post("/stops/add", json={"stops": stops, "point": point})
+    assert [s["id"] for s in resp.json()["stops"]] == [5, 4, 6]
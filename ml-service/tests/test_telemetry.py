@@ -0,0 +1,41 @@
+from app.core.telemetry import Registry, profile_to, span, trace_request
+
+
+def test_spans_aggregate_into_trace():
+    with trace_request() as trace:
+        with span("stage.routes"):
+            for _ in range(3):
+                with span("routing.dijkstra"):
+                    pass
+    summary = trace.summary()
+    assert set(summary["stages"]) == {"routes"}
+    assert summary["spans"]["routing.dijkstra"]["calls"] == 3
+
+
+def test_registry_renders_cumulative_buckets():
+    reg = Registry()
+    reg.observe("x", 0.002)
+    reg.observe("x", 3.0)
+    text = reg.render()
+    assert 'ml_span_duration_seconds_bucket{span="x",le="0.005"} 1' in text
+    assert 'ml_span_duration_seconds_bucket{span="x",le="+Inf"} 2' in text
+    assert 'ml_span_duration_seconds_count{span="x"} 2' in text
+
+
+def test_profile_writes_file(tmp_path):
+    with profile_to(tmp_path, "t") as prof:
+        sum(range(1000))
+    assert prof["path"].endswith(".prof")
+    assert (tmp_path / prof["path"].rsplit("/", 1)[1]).exists()
+
+
+def test_registry_delta_merges_per_call():
+    worker, parent = Registry(), Registry()
+    worker.observe("x", 1.0)
+    before = worker.snapshot()
+    for _ in range(3):
+        worker.observe("x", 0.002)
+    parent.merge(worker.delta(before))
+    text = parent.render()
+    assert 'ml_span_duration_seconds_count{span="x"} 3' in text
+    assert 'ml_span_duration_seconds_bucket{span="x",le="0.005"} 3' in text
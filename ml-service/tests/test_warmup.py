@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+from app.core.warmup import HEAVY_MODULES, warm_up, warmup_state
+
+
+def test_app_import_defers_heavy_modules():
+    code = "import sys, app.main; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_warm_up_touches_hot_paths():
+    timings = warm_up(bboxes=[], pools=False)
+    assert set(timings) == {"imports", "hot_paths", "graphs"}
+    state = warmup_state()
+    assert state["status"] == "ready" and state["errors"] == []